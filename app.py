@@ -2,15 +2,33 @@
 #Importing Libraries
 
 import streamlit as st
-from langchain_ibm import WatsonxLLM
-from ibm_watson_machine_learning.metanames import GenTextParamsMetaNames as GenParams
 from datetime import datetime, timedelta
-from fpdf import FPDF
+import functools
+import hmac
 import json
 import os
 import random
-import plotly.express as px
-import pandas as pd
+import re
+import uuid
+from llm_pool import LLMClientPool
+from llm_providers import LlamaCppProvider, ProviderRegistry, Recorder, StubProvider, backend_model_id
+from llm_stream import TimedStream
+from llm_gateway import LLMGateway, QueueTimeout
+from llm_metrics import LLMMetrics
+from resilience import Fallback, ResilientCaller, ServiceUnavailable
+from response_cache import MemoryBackend, ResponseCache, SQLiteBackend, fingerprint
+from metric_store import EventLog, MetricStore
+from storage import HealthDatabase
+from charts import CHART_WIDTH_PX, FigureCache, line_chart
+from trend_stats import describe_trend
+from pdf_report import PDFExporter, report_record, summary_hash
+from conversation import ConversationManager, ConversationMemory, TokenCounter, format_turns
+from clinical_rules import classify_asthma, classify_bp, classify_glucose
+from prompts import PROMPTS, ProfileFragments
+from jobs import JobQueue, MemoryBroker, SQLiteBroker
+from report_pipeline import REPORT_METRICS, analyze_metrics, build_synthesis_prompt, fallback_summary
+from rerun_profile import ProfileLog, RerunProfile
+from theme import HtmlFragment, ThemeAssets, card_header, render_html
 
 
 
@@ -24,80 +42,96 @@ st.set_page_config(page_title="🩺 Health Assistant", layout="wide", page_icon=
 
 
 
-# Custom CSS - Violet and Pink Theme
-
-
-st.markdown("""
-   <style>
-* {box-sizing: border-box; margin: 0; padding: 0;}
-body {background: linear-gradient(to right bottom, #f5e6fa, #ffe5f5); font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; color: #2c3e50; line-height: 1.6; padding: 20px;}
-h1,h2,h3,h4,h5,h6 {color: #8e44ad; font-weight: 600; margin-bottom: 10px;}
-p {font-size: 16px; color: #34495e;}
-a {color: #8e44ad; text-decoration: none;} a:hover {text-decoration: underline;}
-.main {background-color: #ffffffcc; backdrop-filter: blur(10px); border-radius: 16px; padding: 30px; box-shadow: 0 8px 24px rgba(0,0,0,0.1); max-width: 1200px; margin: auto; animation: fadeIn 0.5s ease-in-out;}
-@keyframes fadeIn {from {opacity: 0; transform: translateY(10px);} to {opacity: 1; transform: translateY(0);}}
-.card {background-color: #fff; border-left: 6px solid #8e44ad; border-radius: 12px; padding: 25px; margin: 20px 0; box-shadow: 0 4px 12px rgba(0,0,0,0.05); transition: all 0.3s ease;} 
-.card:hover {transform: translateY(-3px); box-shadow: 0 8px 20px rgba(0,0,0,0.1);}
-.navbar {display: flex; justify-content: center; gap: 20px; padding: 15px 0; background: linear-gradient(to right, #8e44ad, #ec7063); border-radius: 12px; margin-bottom: 30px; box-shadow: 0 4px 16px rgba(0,0,0,0.15); position: sticky; top: 0; z-index: 999; transition: all 0.3s ease;}
-.nav-button {background-color: #ffffff; color: #8e44ad; border: none; width: 60px; height: 60px; font-size: 24px; border-radius: 50%; display: flex; align-items: center; justify-content: center; cursor: pointer; transition: all 0.3s ease; box-shadow: 0 4px 12px rgba(0,0,0,0.1);}
-.nav-button:hover {background-color: #f9ebf7; transform: scale(1.1);}
-.nav-button:disabled {opacity: 0.5; cursor: not-allowed;}
-label {font-weight: bold; color: #34495e; display: block; margin-top: 15px; margin-bottom: 6px;}
-input,select,textarea,.stTextInput input,.stNumberInput input,.stDateInput input {border-radius: 8px; border: 1px solid #ccc; padding: 12px 14px; width: 100%; font-size: 14px; outline: none; transition: all 0.3s ease;}
-input:focus,select:focus,textarea:focus,.stTextInput input:focus,.stNumberInput input:focus,.stDateInput input:focus {border-color: #8e44ad; box-shadow: 0 0 0 2px rgba(142,68,173,0.2);}
-button {background-color: #8e44ad; color: white; border: none; padding: 12px 20px; font-size: 14px; border-radius: 8px; cursor: pointer; transition: background-color 0.3s ease, transform 0.2s ease;}
-button:hover {background-color: #732d91; transform: translateY(-2px);}
-button:active {transform: translateY(0);}
-.chat-container {display: flex; flex-direction: column; gap: 10px; max-height: 400px; overflow-y: auto; padding-right: 10px;}
-.user-bubble,.bot-bubble {padding: 12px 18px; border-radius: 16px; max-width: 75%; font-size: 14px; word-wrap: break-word; line-height: 1.5;}
-.user-bubble {align-self: flex-end; background-color: #dcd6f7; border-radius: 16px 8px 8px 16px;}
-.bot-bubble {align-self: flex-start; background-color: #f2d7d5; border-radius: 8px 16px 16px 8px;}
-.metric-card {background-color: #f8f9fa; padding: 18px; border-radius: 10px; border-left: 4px solid #8e44ad; margin: 12px 0; box-shadow: 0 2px 6px rgba(0,0,0,0.05); transition: transform 0.2s ease;}
-.metric-card:hover {transform: translateX(5px);}
-.trend-up {color: #27ae60; font-weight: bold;}
-.trend-down {color: #e74c3c; font-weight: bold;}
-.icon-button {display: inline-flex; align-items: center; gap: 8px; background-color: #8e44ad; color: white; padding: 10px 16px; border-radius: 8px; font-size: 14px; cursor: pointer; transition: all 0.3s ease;}
-.icon-button:hover {background-color: #732d91; transform: scale(1.02);}
-::-webkit-scrollbar {width: 8px;}
-::-webkit-scrollbar-track {background: #f1f1f1; border-radius: 4px;}
-::-webkit-scrollbar-thumb {background: #ddd; border-radius: 4px;}
-::-webkit-scrollbar-thumb:hover {background: #bbb;}
-@media (max-width: 768px) {.navbar {flex-wrap: wrap;} .nav-button {width: 50px; height: 50px; font-size: 20px;} .main {padding: 20px;} .card {padding: 20px;}}
-.stAlert {border-radius: 10px; padding: 12px 16px; margin: 10px 0; font-size: 14px; box-shadow: 0 2px 8px rgba(0,0,0,0.05);}
-.st-success {background-color: #dff0d8; color: #3c763d; border-left: 4px solid #3c763d;}
-.st-warning {background-color: #fcf8e3; color: #8a6d3b; border-left: 4px solid #8a6d3b;}
-.st-error {background-color: #f2dede; color: #a94442; border-left: 4px solid #a94442;}
-footer {text-align: center; margin-top: 40px; font-size: 14px; color: #555; padding: 20px; border-top: 1px solid #eee;}
-.plotly-graph-div {background-color: #fff !important; border-radius: 10px; padding: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.05);}
-.stTabs > div > div {background-color: transparent; border-bottom: 2px solid #ddd;}
-.stTabs > div > div > button {color: #8e44ad; font-weight: 600;}
-.stTabs > div > div > button[aria-selected="true"] {color: #732d91; border-bottom: 2px solid #732d91;}
-.stDownloadButton > button {background-color: #2ecc71 !important; border-color: #2ecc71 !important;}
-.stDownloadButton > button:hover {background-color: #27ae60 !important;}
-.ai-analysis {background-color: #fefefe; padding: 16px; border-left: 4px solid #8e44ad; border-radius: 8px; box-shadow: 0 2px 6px rgba(0,0,0,0.05); font-size: 14px; white-space: pre-wrap;}
-.stDateInput input {padding: 10px;}
-.tooltip-label {display: flex; align-items: center; gap: 6px; font-weight: bold; color: #34495e; cursor: help;}
-.tooltip-text {visibility: hidden; width: 200px; background: #333; color: #fff; text-align: center; border-radius: 4px; padding: 5px; position: absolute; z-index: 1; bottom: 125%; left: 50%; margin-left: -100px; opacity: 0; transition: opacity 0.3s;}
-.tooltip-label:hover .tooltip-text {visibility: visible; opacity: 1;}
-.floating-btn {position: fixed; bottom: 20px; right: 20px; z-index: 999; background-color: #8e44ad; color: white; border: none; border-radius: 50%; width: 60px; height: 60px; font-size: 24px; box-shadow: 0 4px 12px rgba(0,0,0,0.2); transition: all 0.3s ease;}
-.floating-btn:hover {background-color: #732d91; transform: scale(1.1);}
-table {width: 100%; border-collapse: collapse; margin: 15px 0;}
-th,td {padding: 12px; text-align: left; border-bottom: 1px solid #ddd;}
-th {background-color: #f2f2f2; color: #333;}
-tr:hover {background-color: #f9f9f9;}
-.progress-bar {height: 12px; background-color: #eee; border-radius: 6px; overflow: hidden; margin: 10px 0;}
-.progress-fill {height: 100%; background-color: #8e44ad; border-radius: 6px; transition: width 0.5s ease-in-out;}
-.custom-checkbox {display: flex; align-items: center; gap: 10px; margin: 10px 0;}
-.custom-checkbox input[type="checkbox"] {appearance: none; width: 20px; height: 20px; border: 2px solid #aaa; border-radius: 4px; cursor: pointer;}
-.custom-checkbox input[type="checkbox"]:checked {background-color: #8e44ad; border-color: #732d91;}
-.custom-checkbox input[type="checkbox"]:checked::after {content: "✔"; color: white; display: block; text-align: center; font-size: 14px;}
-.toast {position: fixed; bottom: 20px; right: 20px; background-color: #2ecc71; color: white; padding: 12px 20px; border-radius: 8px; box-shadow: 0 4px 12px rgba(0,0,0,0.2); animation: toastIn 0.3s ease-in-out forwards; z-index: 1000;}
-@keyframes toastIn {from {transform: translateY(20px); opacity: 0;} to {transform: translateY(0); opacity: 1;}}
-.js-plotly-plot .plotly .hoverlayer .xtitle, .js-plotly-plot .plotly .hoverlayer .ytitle {fill: #8e44ad !important;}
-.js-plotly-plot .plotly .modebar {background-color: #ffffffee !important; border: 1px solid #ddd; border-radius: 6px;}
-.js-plotly-plot .plotly .modebar button:hover svg path {fill: #8e44ad !important;}
-</style>
-""", unsafe_allow_html=True)
+# Rerun profiling (opt-in): PROFILE_RERUNS = true in secrets or ?profile=1 in
+# the URL times every phase of the script run; PROFILE_ALLOCATIONS = true also
+# traces allocations. Reruns over RENDER_BUDGET_MS (or a phase over its entry
+# in RENDER_PHASE_BUDGETS_MS) are logged and shown as warnings.
+
+@st.cache_resource
+def get_profile_log():
+    return ProfileLog(
+        budget_ms=float(st.secrets.get("RENDER_BUDGET_MS", 500)),
+        phase_budgets_ms=st.secrets.get("RENDER_PHASE_BUDGETS_MS"),
+    )
+
+
+rerun_profile = RerunProfile(
+    enabled=bool(st.secrets.get("PROFILE_RERUNS", False)) or st.query_params.get("profile") == "1",
+    trace_allocations=bool(st.secrets.get("PROFILE_ALLOCATIONS", False)),
+)
+
+
+def finish_rerun_profile():
+    report = rerun_profile.finish()
+    if report is None:
+        return
+    for warning in get_profile_log().add(report, section=st.session_state.get("current_section")):
+        st.toast(f"⏱️ {warning}")
+
+
+def plot_chart(fig):
+    with rerun_profile.phase("charts"):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+def section_fragment(fn):
+    """st.fragment: widget changes inside ``fn`` rerun only ``fn``.
+
+    Arguments are the fragment's data dependencies; fragment reruns reuse the
+    ones from the last full run. Anything other parts of the page depend on
+    (profile, preferences, metrics) is followed by a full st.rerun().
+    """
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        global rerun_profile, fragment_rerun
+        if not rerun_profile.finished:
+            return fn(*args, **kwargs)
+        # Fragment rerun: the script body (and its profile) didn't run
+        fragment_rerun = True
+        rerun_profile = RerunProfile(enabled=rerun_profile.enabled,
+                                     trace_allocations=rerun_profile.trace_allocations)
+        rerun_profile.lap(f"fragment:{fn.__name__}")
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            finish_rerun_profile()
+    return st.fragment(run)
+
+
+fragment_rerun = False
+
+
+def rerun_section():
+    """Rerun just the current section (st.rerun(scope="fragment") is only
+    allowed while a fragment reruns on its own)."""
+    st.rerun(scope="fragment" if fragment_rerun else "app")
+
+
+def show_notice(slot):
+    """Show (once) a message stored before a full st.rerun()."""
+    notice = st.session_state.notices.pop(slot, None)
+    if notice:
+        getattr(st, notice[0])(notice[1])
+
+
+
+
+
+# Custom CSS - Violet and Pink Theme (static/theme.css). With static serving
+# enabled each rerun only sends a <link>; the browser caches the stylesheet.
+
+@st.cache_resource
+def get_theme():
+    return ThemeAssets("theme")
+
+
+rerun_profile.lap("css")
+
+
+theme = get_theme()
+st.markdown(theme.markup(st.get_option("server.enableStaticServing")), unsafe_allow_html=True)
+
+rerun_profile.lap("setup")
 
 
 
@@ -178,57 +212,215 @@ if "health_data" not in st.session_state:
 if "language" not in st.session_state:
     st.session_state.language = "en"
 if "glucose_log" not in st.session_state:
-    st.session_state.glucose_log = []
+    st.session_state.glucose_log = EventLog()
 if "bp_log" not in st.session_state:
-    st.session_state.bp_log = []
+    st.session_state.bp_log = EventLog()
 if "asthma_log" not in st.session_state:
-    st.session_state.asthma_log = []
-if "analytics_data" not in st.session_state:
-    st.session_state.analytics_data = {
-        "heart_rates": [72],
-        "glucose_levels": [90],
-        "dates": [datetime.now().strftime("%Y-%m-%d")]
-    }
-
-
-
-
-
-# Load Watsonx credentials
+    st.session_state.asthma_log = EventLog()
+if "stream_responses" not in st.session_state:
+    st.session_state.stream_responses = True
+if "stream_timings" not in st.session_state:
+    st.session_state.stream_timings = []
+if "metric_store" not in st.session_state:
+    st.session_state.metric_store = MetricStore()
+    st.session_state.metric_store.append(datetime.now(), heart_rates=72, glucose_levels=90)
+if "profile_version" not in st.session_state:
+    st.session_state.profile_version = 0
+if "ai_summary" not in st.session_state:
+    st.session_state.ai_summary = ""
+if "chat_memory" not in st.session_state:
+    st.session_state.chat_memory = ConversationMemory()
+if "chat_pages" not in st.session_state:
+    st.session_state.chat_pages = 1
+if "disease_advice" not in st.session_state:
+    st.session_state.disease_advice = {}
+if "profile_fragments" not in st.session_state:
+    st.session_state.profile_fragments = ProfileFragments(st.session_state.profile_data)
+if "jobs" not in st.session_state:
+    st.session_state.jobs = {}
+if "jobs_consumed" not in st.session_state:
+    st.session_state.jobs_consumed = {}
+if "notices" not in st.session_state:
+    st.session_state.notices = {}  # slot -> (st method, message), see show_notice
+if "confirm_reset" not in st.session_state:
+    st.session_state.confirm_reset = False
+
+
+
+
+
+# Load LLM backends and Watsonx credentials
 
 
 
 try:
-    credentials = {
-        "url": st.secrets["WATSONX_URL"],
-        "apikey": st.secrets["WATSONX_APIKEY"]
+    # Each section runs on LLM_BACKEND ("watsonx", "local" or "stub") unless
+    # LLM_BACKENDS overrides it, e.g. LLM_BACKENDS = {diseases = "local"}.
+    # Watsonx credentials are only required when a section uses Watsonx.
+    default_backend = st.secrets.get("LLM_BACKEND", "watsonx")
+    section_backends = st.secrets.get("LLM_BACKENDS", {})
+    llm_backends = {
+        section: section_backends.get(section, default_backend)
+        for section in ("chat", "symptoms", "treatment", "diseases", "reports")
     }
-    project_id = st.secrets["WATSONX_PROJECT_ID"]
+    if "watsonx" in llm_backends.values():
+        credentials = {
+            "url": st.secrets["WATSONX_URL"],
+            "apikey": st.secrets["WATSONX_APIKEY"]
+        }
+        project_id = st.secrets["WATSONX_PROJECT_ID"]
+    # A small GGUF model (e.g. a quantized Granite) served on the CPU by llama.cpp
+    local_model_path = st.secrets["LOCAL_MODEL_PATH"] if "local" in llm_backends.values() else None
     
-    model_map = {
+    INVALID_RESPONSES = ["online", "none", "no result"]
+
+    # Served instead of a model answer while the AI service is failing
+    FALLBACK_RESPONSES = {
+        "chat": "⚠️ The AI assistant is temporarily unavailable. Please try again in a few minutes. "
+                "If you have severe or sudden symptoms, contact a doctor or your local emergency number.",
+        "symptoms": "⚠️ AI symptom analysis is temporarily unavailable. Rest, stay hydrated and monitor your symptoms. "
+                    "Seek urgent care for chest pain, difficulty breathing, confusion, fainting or a high fever that won't come down.",
+        "treatment": "⚠️ AI treatment planning is temporarily unavailable. Keep following your current prescriptions "
+                     "and discuss any changes with your doctor or pharmacist.",
+        "diseases": "🤖 AI advice unavailable at the moment. Keep logging your readings and share them with your doctor, "
+                    "especially if they stay outside your usual range.",
+        "reports": "⚠️ AI analysis is temporarily unavailable. Your charts and trend statistics above are still up to date.",
+    }
+
+    model_ids = {
         "chat": "ibm/granite-13b-instruct-v2",
         "symptoms": "ibm/granite-13b-instruct-v2",
         "treatment": "ibm/granite-13b-instruct-v2",
         "diseases": "ibm/granite-13b-instruct-v2",
         "reports": "ibm/granite-13b-instruct-v2"
     }
+    # Cached responses and metrics are keyed by model id, so every backend gets its own
+    model_map = {
+        section: backend_model_id(llm_backends[section], model_id, local_model_path)
+        for section, model_id in model_ids.items()
+    }
     
+    # Watsonx generation parameters (GenTextParamsMetaNames values, spelled out
+    # so startup doesn't import ibm_watson_machine_learning just for the names)
+    llm_params = {
+        "decoding_method": "greedy",
+        "temperature": 0.7,
+        "min_new_tokens": 5,
+        "max_new_tokens": 300,
+        "stop_sequences": ["Human:", "Observation"],
+    }
+
+    # One set of backends per server process (shared by all sessions). The
+    # Watsonx pool reuses clients, IAM tokens and HTTP connections across
+    # clicks and users; the local model is loaded once on first use.
+    # LLM_RECORD_PATH records every response for replay by the stub backend.
+    @st.cache_resource
+    def get_llm_providers():
+        record_path = st.secrets.get("LLM_RECORD_PATH")
+        return ProviderRegistry({
+            "watsonx": lambda: LLMClientPool(credentials, project_id),
+            "local": lambda: LlamaCppProvider(
+                local_model_path,
+                n_ctx=int(st.secrets.get("LOCAL_MODEL_CONTEXT", 4096)),
+                n_threads=st.secrets.get("LOCAL_MODEL_THREADS"),
+            ),
+            "stub": lambda: StubProvider(
+                replay_path=st.secrets.get("STUB_REPLAY_PATH"),
+                latency=st.secrets.get("STUB_LATENCY_S", 0),
+            ),
+        }, recorder=Recorder(record_path) if record_path else None)
+
     def get_llm(model_name):
-        return WatsonxLLM(
-            model_id=model_map[model_name],
-            url=credentials.get("url"),
-            apikey=credentials.get("apikey"),
-            project_id=project_id,
-            params={
-                GenParams.DECODING_METHOD: "greedy",
-                GenParams.TEMPERATURE: 0.7,
-                GenParams.MIN_NEW_TOKENS: 5,
-                GenParams.MAX_NEW_TOKENS: 300,
-                GenParams.STOP_SEQUENCES: ["Human:", "Observation"],
-            },
+        return get_llm_providers().get(llm_backends[model_name], model_map[model_name], llm_params)
+
+    # All model calls are admitted through one gateway per process: identical
+    # in-flight prompts are coalesced, users and the process are rate limited
+    # and concurrent provider requests are bounded.
+    @st.cache_resource
+    def get_llm_gateway():
+        return LLMGateway(
+            max_concurrency=int(st.secrets.get("LLM_MAX_CONCURRENCY", 8)),
+            global_rate=float(st.secrets.get("LLM_GLOBAL_RATE", 10)),
+            user_rate=float(st.secrets.get("LLM_USER_RATE", 1)),
+        )
+
+    # Deadlines, retries with backoff and a circuit breaker around every call.
+    # While the provider is failing, callers get their fallback immediately.
+    # Streams get LLM_FIRST_CHUNK_TIMEOUT for their first token, LLM_TIMEOUT overall.
+    @st.cache_resource
+    def get_llm_guard():
+        return ResilientCaller(
+            timeout=float(st.secrets.get("LLM_TIMEOUT", 45)),
+            first_chunk_timeout=float(st.secrets.get("LLM_FIRST_CHUNK_TIMEOUT", 15)),
+            passthrough=(QueueTimeout,),
+        )
+
+    # Latency, tokens, outcomes and cache hits per section (model_map key).
+    # LLM_METRICS_PATH gets one JSON line per call ("none" disables it), rotated
+    # at LLM_METRICS_MAX_MB; LLM_METRICS_PORT serves Prometheus text at
+    # http://127.0.0.1:<port>/metrics.
+    @st.cache_resource
+    def get_llm_metrics():
+        path = st.secrets.get("LLM_METRICS_PATH", ".cache/llm_metrics.jsonl")
+        metrics = LLMMetrics(
+            jsonl_path=None if path == "none" else path,
+            count_tokens=get_conversation_manager().counter.count,
+            max_bytes=int(float(st.secrets.get("LLM_METRICS_MAX_MB", 50)) * 1024 * 1024),
+        )
+        port = st.secrets.get("LLM_METRICS_PORT")
+        if port:
+            metrics.serve(int(port))
+        return metrics
+
+    def llm_invoke(model_name, prompt, user_id=None, fallback=None):
+        # user_id must be passed explicitly from worker threads (no session state there)
+        user_id = user_id or st.session_state.user_id
+        gateway, llm, model_id = get_llm_gateway(), get_llm(model_name), model_map[model_name]
+        return get_llm_metrics().timed(
+            model_name,
+            prompt,
+            lambda: get_llm_guard().call(
+                lambda: gateway.invoke(llm, prompt, model_id=model_id, user=user_id),
+                fallback=fallback,
+            ),
+            is_fallback=lambda response: isinstance(response, Fallback),
         )
-except KeyError:
-    st.warning("⚠️ Watsonx credentials missing.")
+
+    def stream_llm(model_name, prompt, user_id=None):
+        user_id = user_id or st.session_state.user_id
+        chunks = get_llm_gateway().stream(get_llm(model_name), prompt, user=user_id)
+        chunks = get_llm_metrics().track_stream(model_name, prompt, get_llm_guard().guard_stream(chunks))
+        return TimedStream(chunks, section=model_name)
+
+    # Greedy decoding makes answers deterministic, so repeated prompts are served
+    # from a process-wide cache. RESPONSE_CACHE_PATH="memory" keeps it in RAM.
+    # Only exact prompt matches are served: a near match on symptoms or a
+    # condition can be a different medical question.
+    @st.cache_resource
+    def get_response_cache():
+        path = st.secrets.get("RESPONSE_CACHE_PATH", ".cache/responses.sqlite3")
+        backend = MemoryBackend() if path == "memory" else SQLiteBackend(path)
+        return ResponseCache(backend)
+
+    def cached_invoke(model_name, prompt, user_id=None, fallback=True):
+        cache = get_response_cache()
+        model_id = model_map[model_name]
+        response = cache.get(prompt, model_id, llm_params)
+        get_llm_metrics().record_cache(model_name, hit=response is not None)
+        if response is None:
+            # Never an answer generated for other input, only the safety template
+            def degraded():
+                return Fallback(FALLBACK_RESPONSES[model_name])
+
+            response = llm_invoke(model_name, prompt, user_id=user_id, fallback=degraded if fallback else None)
+            if isinstance(response, Fallback):
+                return response
+            response = response.strip()
+            if response and response.lower() not in INVALID_RESPONSES:
+                cache.put(prompt, response, model_id, llm_params)
+        return response
+except KeyError as e:
+    st.warning("⚠️ Watsonx credentials missing." if "WATSONX" in str(e) else f"⚠️ LLM backend setting missing: {e}")
     st.stop()
 except Exception as e:
     st.error(f"🚨 Error initializing LLM: {str(e)}")
@@ -238,89 +430,310 @@ except Exception as e:
 
 
 
+# Persistent storage
 
-# Function to export data as PDF including user profile
 
 
+# Session state only holds this much history; everything lives in the database
+METRIC_WORKING_SET_DAYS = 365
+LOG_WORKING_SET = 500
+MESSAGE_WORKING_SET = 100
 
-def export_health_report(ai_summary=""):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.set_font("Arial", size=12)
 
-    # Title with border and background
-    pdf.set_fill_color(200, 220, 255)
-    pdf.cell(0, 15, txt="Health Report Summary", ln=True, align='C', fill=True)
-    pdf.ln(10)
+@st.cache_resource
+def get_health_db():
+    return HealthDatabase(st.secrets.get("HEALTH_DB_PATH", ".data/healthai.sqlite3"))
 
-    # --------------------------
-    # Patient Profile Section
-    # --------------------------
-    pdf.set_font("Arial", 'B', 14)
-    pdf.set_text_color(0, 51, 102)
-    pdf.cell(0, 10, "👤 Patient Profile", ln=True)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_draw_color(180, 180, 180)
-    pdf.rect(x=10, y=pdf.get_y() - 5, w=190, h=40, style='D')
-    pdf.ln(5)
-
-    pdf.set_font("Arial", size=12)
-    for k, v in st.session_state.profile_data.items():
-        if v:  # Skip empty fields
-            pdf.cell(0, 8, txt=f"• {k.capitalize()}: {v}", ln=True)
-    pdf.ln(10)
 
-    # --------------------------
-    # Latest Metrics Section
-    # --------------------------
-    pdf.set_font("Arial", 'B', 14)
-    pdf.set_text_color(0, 51, 102)
-    pdf.cell(0, 10, "📊 Latest Metrics", ln=True)
-    pdf.set_text_color(0, 0, 0)
-    pdf.rect(x=10, y=pdf.get_y() - 5, w=190, h=50, style='D')
-    pdf.ln(5)
-
-    dates = st.session_state.analytics_data.get("dates", [])
-    heart_rates = st.session_state.analytics_data.get("heart_rates", [])
-    glucose_levels = st.session_state.analytics_data.get("glucose_levels", [])
-    peak_flow = st.session_state.analytics_data.get("peak_flow", [])
-    hba1c = st.session_state.analytics_data.get("hba1c", [])
-
-    pdf.set_font("Arial", size=12)
-    pdf.cell(0, 8, txt=f"• Date: {dates[-1] if len(dates) > 0 else 'N/A'}", ln=True)
-    pdf.cell(0, 8, txt=f"• Heart Rate: {heart_rates[-1] if len(heart_rates) > 0 else 'N/A'} bpm", ln=True)
-    pdf.cell(0, 8, txt=f"• Blood Glucose: {glucose_levels[-1] if len(glucose_levels) > 0 else 'N/A'} mg/dL", ln=True)
-    pdf.cell(0, 8, txt=f"• Peak Flow: {peak_flow[-1] if len(peak_flow) > 0 else 'N/A'} L/min", ln=True)
-    pdf.cell(0, 8, txt=f"• HbA1c: {hba1c[-1] if len(hba1c) > 0 else 'N/A'} %", ln=True)
-    pdf.ln(10)
+def load_user_data(user_id):
+    db = get_health_db()
+    profile = db.load_profile(user_id)
+    if profile:
+        st.session_state.profile_data = profile
+        st.session_state.profile_fragments = ProfileFragments(profile)
+        st.session_state.profile_complete = True
 
-    # --------------------------
-    # AI Summary Section (if available)
-    # --------------------------
-    if ai_summary:
-        pdf.set_font("Arial", 'B', 14)
-        pdf.set_text_color(0, 51, 102)
-        pdf.cell(0, 10, "🧠 AI Report Summary", ln=True)
-        pdf.set_text_color(0, 0, 0)
-        pdf.rect(x=10, y=pdf.get_y() - 5, w=190, h=60, style='D')  # Border around summary
-        pdf.ln(5)
-
-        pdf.set_font("Arial", size=12)
-        for line in ai_summary.split('\n'):
-            if line.strip():
-                pdf.multi_cell(0, 8, txt=line.strip())
-        pdf.ln(10)
+    since = (datetime.now() - timedelta(days=METRIC_WORKING_SET_DAYS)).strftime("%Y-%m-%d")
+    dates, columns = db.load_metric_rows(user_id, since=since)
+    if dates:
+        store = MetricStore()
+        store.extend(dates, **columns)
+        st.session_state.metric_store = store
+
+    st.session_state.glucose_log = EventLog(db.load_log(user_id, "glucose", limit=LOG_WORKING_SET))
+    st.session_state.bp_log = EventLog(db.load_log(user_id, "bp", limit=LOG_WORKING_SET))
+    st.session_state.asthma_log = EventLog(db.load_log(user_id, "asthma", limit=LOG_WORKING_SET))
+    st.session_state.messages = db.load_messages(user_id, limit=MESSAGE_WORKING_SET)
+
+
+def persist_metrics_since(start):
+    dates, columns = st.session_state.metric_store.rows_since(start)
+    get_health_db().add_metric_rows(st.session_state.user_id, dates, columns)
+
+
+def add_log_entry(kind, entry):
+    log = st.session_state[f"{kind}_log"]
+    log.append(entry)
+    del log[:-LOG_WORKING_SET]
+    get_health_db().add_log_entry(st.session_state.user_id, kind, entry)
+
+
+# Figures are rebuilt only when the data they were drawn from changes
+
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+
+def cached_figure(source, name, build):
+    key = (source.uid, source.version, name, CHART_WIDTH_PX)
+    with rerun_profile.phase("charts"):
+        return get_figure_cache().get_or_build(key, build)
+
+
+# Chat prompts stay under a token budget; older turns are summarized in the
+# background. CHAT_TOKENIZER names a Hugging Face tokenizer matching the model
+# (used only if transformers is installed), otherwise counts are estimated.
+CHAT_PAGE_SIZE = 20
+
+
+@st.cache_resource
+def get_conversation_manager():
+    counter = TokenCounter(st.secrets.get("CHAT_TOKENIZER"))
+    PROMPTS.count_tokens = counter.count
+    return ConversationManager(
+        counter,
+        summary_prompt=lambda summary, turns: PROMPTS.render(
+            "chat_summary", summary=summary or "None", turns=format_turns(turns)),
+        budget=int(st.secrets.get("CHAT_CONTEXT_TOKENS", 1024)),
+        summarize_every=int(st.secrets.get("CHAT_SUMMARY_EVERY", 4)),
+    )
+
+
+def profile_fragment(name):
+    """Profile text for prompts, built once per saved profile (see prompts.ProfileFragments)."""
+    return st.session_state.profile_fragments[name]
+
+
+def add_message(role, content):
+    st.session_state.messages.append((role, content))
+    get_conversation_manager().trim(st.session_state.chat_memory, st.session_state.messages, MESSAGE_WORKING_SET)
+    get_health_db().add_messages(st.session_state.user_id, [(role, content)])
+
+
+# The user id lives in the URL, so bookmarking the page brings the same data back.
+# There are no accounts: the ?uid= link is a bearer credential, and anyone who
+# has it can read and delete that user's health data. Only random ids are
+# accepted, so links can't be guessed from names.
+USER_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+if "user_id" not in st.session_state:
+    user_id = st.query_params.get("uid")
+    if not user_id or not USER_ID_RE.fullmatch(user_id):
+        user_id = uuid.uuid4().hex
+        st.query_params["uid"] = user_id
+    st.session_state.user_id = user_id
+    load_user_data(user_id)
+
+
+
+
+
+
+TREND_ARROWS = {"Increasing": "↑", "Decreasing": "↓", "Stable": "→"}
+
+
+
+
+# PDF reports are built on demand in a shared worker pool and cached by data version
+
+@st.cache_resource
+def get_pdf_exporter():
+    return PDFExporter(max_workers=2, max_entries=64)
+
+
+def pdf_report_key():
+    store = st.session_state.metric_store
+    return (
+        st.session_state.user_id,
+        st.session_state.profile_version,
+        store.uid,
+        store.version,
+        summary_hash(st.session_state.ai_summary),
+    )
+
+
+
+
+# Keep the last streamed calls' time-to-first-token for the debug panel
+
+def record_stream_timing(timing, limit=50):
+    st.session_state.stream_timings.append(timing)
+    del st.session_state.stream_timings[:-limit]
+
+
+
+
+# Generation runs as background jobs. Session state only keeps job ids per
+# "slot" (section), so reruns poll the same job instead of blocking or starting
+# it again. JOB_BROKER_PATH keeps the queue in SQLite instead of memory.
+
+@st.cache_resource
+def get_job_queue():
+    path = st.secrets.get("JOB_BROKER_PATH", "memory")
+    broker = MemoryBroker() if path == "memory" else SQLiteBroker(path)
+    return JobQueue(broker, max_workers=int(st.secrets.get("JOB_WORKERS", 8)))
+
+
+def run_llm_job(payload, progress):
+    response = cached_invoke(payload["section"], payload["prompt"], user_id=payload["user_id"])
+    return {"text": response, "fallback": isinstance(response, Fallback)}
+
+
+def run_chat_job(payload, progress):
+    prompt, user_id = payload["prompt"], payload["user_id"]
+    try:
+        if payload["stream"]:
+            stream = stream_llm("chat", prompt, user_id=user_id)
+            for partial in stream.iter_text():
+                progress(partial)
+            return {"text": stream.text.strip(), "timing": stream.timing()}
+        return {"text": llm_invoke("chat", prompt, user_id=user_id).strip()}
+    except ServiceUnavailable:
+        return {"text": FALLBACK_RESPONSES["chat"], "fallback": True}
+
+
+def run_report_job(payload, progress):
+    user_id = payload["user_id"]
+    profile_info, series = payload["profile_info"], payload["series"]
+    # One request per metric in parallel, then a short synthesis step
+    analyses, errors, timings = analyze_metrics(
+        lambda p: cached_invoke("reports", p, user_id=user_id, fallback=False), profile_info, series
+    )
+    result = {"summary": "", "errors": errors, "timings": timings, "error": None, "unavailable": False}
+    prompt = build_synthesis_prompt(profile_info, analyses, series)
+    try:
+        if payload["stream"]:
+            stream = stream_llm("reports", prompt, user_id=user_id)
+            for partial in stream.iter_text():
+                progress(partial)
+            result["summary"] = stream.text.strip()
+            result["timing"] = stream.timing()
+        else:
+            result["summary"] = llm_invoke("reports", prompt, user_id=user_id).strip()
+    except Exception as e:
+        if analyses:
+            result["summary"] = fallback_summary(analyses)
+        result["error"] = str(e)
+        result["unavailable"] = isinstance(e, ServiceUnavailable)
+    return result
+
+
+def usable_text(result):
+    text = result.get("text")
+    return bool(text) and not result.get("fallback") and text.lower() not in INVALID_RESPONSES
+
+
+def complete_report(result):
+    return not (result["error"] or result["errors"])
+
+
+def submit_job(slot, task, payload):
+    user_id = st.session_state.user_id
+    queue = get_job_queue()
+    # Fallbacks and failed generations aren't reused, so a retry reaches the model
+    queue.register("llm", run_llm_job, reusable=usable_text)
+    queue.register("chat", run_chat_job, reusable=usable_text)
+    queue.register("report", run_report_job, reusable=complete_report)
+    payload = dict(payload, user_id=user_id)
+    # Identical requests (double clicks, reruns) map to the same job
+    key = fingerprint(user_id, task, json.dumps(payload, sort_keys=True, default=str))
+    st.session_state.jobs[slot] = queue.submit(task, payload, owner=user_id, key=key)
+
+
+def current_job(slot):
+    job_id = st.session_state.jobs.get(slot)
+    return get_job_queue().get(job_id) if job_id else None
 
-    # --------------------------
-    # Footer
-    # --------------------------
-    pdf.set_y(-30)
-    pdf.set_font("Arial", 'I', 10)
-    pdf.set_text_color(128, 128, 128)
-    pdf.cell(0, 10, txt="Generated by Health Analytics Dashboard © All rights reserved", align='C')
 
-    return pdf.output(dest='S').encode('latin-1')
+def finished_job(slot):
+    """The slot's job the first time it is seen finished, for one-off side effects."""
+    job = current_job(slot)
+    if job is None or job.active or st.session_state.jobs_consumed.get(slot) == job.id:
+        return None
+    st.session_state.jobs_consumed[slot] = job.id
+    return job
+
+
+def job_text(job):
+    text = (job.result or {}).get("text") if job.status == "done" else None
+    return text if text and text.lower() not in INVALID_RESPONSES else None
+
+
+# Streamed jobs are polled fast enough to keep the first tokens on screen early
+JOB_POLL_INTERVAL = 1.0
+STREAM_POLL_INTERVAL = 0.15
+
+
+def show_job(slot, render_done, render_pending=None):
+    job = current_job(slot)
+    if job is None:
+        return
+    # Poll only while the job runs; one full rerun once it finishes stops the timer
+    interval = STREAM_POLL_INTERVAL if job.payload.get("stream") else JOB_POLL_INTERVAL
+    st.fragment(render_job, run_every=interval if job.active else None)(slot, job.active, render_done, render_pending)
+
+
+def render_job(slot, polling, render_done, render_pending):
+    job = current_job(slot)
+    if job is None:
+        return
+    if job.active:
+        if render_pending is not None:
+            render_pending(job, get_job_queue().progress(job.id))
+        else:
+            st.info("⏳ Working on it... you can keep using the app.")
+        return
+    if polling:
+        st.rerun()
+    render_done(job)
+
+
+
+
+# Disease-log readings are classified locally; AI advice runs as a background
+# job and only for borderline/abnormal readings or when the user asks for it
+
+def request_disease_advice(kind, advice):
+    submit_job(f"advice_{kind}", "llm", {"section": "diseases", "prompt": advice["prompt"]})
+
+
+def log_disease_reading(kind, reading, assessment, prompt):
+    advice = {"reading": reading, "assessment": assessment, "prompt": prompt}
+    st.session_state.disease_advice[kind] = advice
+    st.session_state.jobs.pop(f"advice_{kind}", None)
+    if assessment.needs_ai:
+        request_disease_advice(kind, advice)
+
+
+def render_disease_advice(job):
+    text = job_text(job) or "🤖 AI advice unavailable at the moment."
+    st.markdown(f"🧠 **AI Health Advice:**\n\n{text}")
+
+
+def show_disease_advice(kind):
+    advice = st.session_state.disease_advice.get(kind)
+    if not advice:
+        return
+    assessment = advice["assessment"]
+    st.markdown(f"{assessment.icon} **{advice['reading']}: {assessment.category}**\n\n{assessment.guidance}")
+
+    if f"advice_{kind}" not in st.session_state.jobs:
+        if st.button("🧠 Ask AI for detailed advice", key=f"ask_ai_{kind}"):
+            request_disease_advice(kind, advice)
+            rerun_section()
+        return
+    show_job(f"advice_{kind}", render_disease_advice)
 
 
 
@@ -354,7 +767,6 @@ def render_navbar():
     with col7:
         if st.button("⚙️", key="btn_settings", use_container_width=True):
             st.session_state.current_section = "settings"
-    st.markdown('</div>', unsafe_allow_html=True)
 
 
 
@@ -362,11 +774,13 @@ def render_navbar():
 
 # Header
 
-
+rerun_profile.lap("header")
 
 lang = st.session_state.language
-st.markdown(f'<h1 style="text-align:center;">{LANGUAGES[lang]["title"]}</h1>', unsafe_allow_html=True)
-st.markdown(f'<p style="text-align:center; font-size:16px;">{LANGUAGES[lang]["subtitle"]}</p>', unsafe_allow_html=True)
+render_html(
+    f'<h1 style="text-align:center;">{LANGUAGES[lang]["title"]}</h1>',
+    f'<p style="text-align:center; font-size:16px;">{LANGUAGES[lang]["subtitle"]}</p>',
+)
 
 
 
@@ -374,7 +788,7 @@ st.markdown(f'<p style="text-align:center; font-size:16px;">{LANGUAGES[lang]["su
 
 # Show navigation bar only if profile is complete
 
-
+rerun_profile.lap("navbar")
 render_navbar()
 
 
@@ -392,24 +806,34 @@ def save_profile(name, age, gender, height, weight):
         "weight": weight,
         "bmi": round(weight / ((height / 100) ** 2), 1)
     }
+    get_health_db().save_profile(st.session_state.user_id, st.session_state.profile_data)
+    # Prompt fragments are rebuilt only when the saved data actually changed
+    if not st.session_state.profile_fragments.matches(st.session_state.profile_data):
+        st.session_state.profile_fragments = ProfileFragments(st.session_state.profile_data)
+    st.session_state.profile_version += 1
     st.session_state.profile_complete = True
-    st.success("✅ Profile saved successfully!")
+    st.session_state.notices["profile"] = ("success", "✅ Profile saved successfully!")
 
 # Reset Pofile
 
 def reset_profile():
+    get_health_db().delete_user(st.session_state.user_id)
     st.session_state.profile_complete = False
     st.session_state.profile_data = {}
+    st.session_state.profile_fragments = ProfileFragments({})
+    st.session_state.profile_version += 1
+    st.session_state.ai_summary = ""
     st.session_state.messages = []
-    st.session_state.glucose_log = []
-    st.session_state.bp_log = []
-    st.session_state.asthma_log = []
+    st.session_state.chat_memory.reset()
+    st.session_state.chat_pages = 1
+    st.session_state.disease_advice = {}
+    st.session_state.jobs = {}
+    st.session_state.glucose_log = EventLog()
+    st.session_state.bp_log = EventLog()
+    st.session_state.asthma_log = EventLog()
     st.session_state.health_data = {}
-    st.session_state.analytics_data = {
-        "heart_rates": [72],
-        "glucose_levels": [90],
-        "dates": [datetime.now().strftime("%Y-%m-%d")]
-    }
+    st.session_state.metric_store = MetricStore()
+    st.session_state.metric_store.append(datetime.now(), heart_rates=72, glucose_levels=90)
     st.rerun()
 
 
@@ -419,12 +843,10 @@ def reset_profile():
 
 #                         ------------------------------ SETTINGS ------------------------------
 
-
-
-
-if st.session_state.current_section == "settings":
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown(f'<h2>⚙️ {LANGUAGES[lang]["settings"]}</h2>', unsafe_allow_html=True)
+@section_fragment
+def settings_section(lang):
+    render_html(card_header(f'⚙️ {LANGUAGES[lang]["settings"]}'))
+    show_notice("settings")
 
     st.markdown("### 🌍 Language & Localization")
     language = st.selectbox(
@@ -435,13 +857,20 @@ if st.session_state.current_section == "settings":
     )
 
     st.markdown("### 🎨 Theme Preferences")
-    theme = st.selectbox(
+    theme_choice = st.selectbox(
         "Color Theme",
         ["Light"],
         disabled=True,
         help="Currently only Light theme is available. More themes coming soon!"
     )
 
+    st.markdown("### ⚡ AI Responses")
+    stream_responses = st.checkbox(
+        "Stream AI responses as they are generated",
+        value=st.session_state.stream_responses,
+        help="Show the chatbot and report summary text word by word instead of waiting for the full answer."
+    )
+
     st.markdown("### 🔤 Text Display")
     font_size = st.slider(
         "Font Size (px)",
@@ -452,15 +881,16 @@ if st.session_state.current_section == "settings":
         help="Adjust the base font size for easier reading."
     )
 
-    # Save Button
+    # Save Button (header, footer and other sections read these, so rerun everything)
     if st.button("💾 Save Preferences"):
         st.session_state.language = language
         st.session_state.font_size = font_size
-        st.success("✅ Your preferences have been saved successfully!")
+        st.session_state.stream_responses = stream_responses
+        st.session_state.notices["settings"] = ("success", "✅ Your preferences have been saved successfully!")
+        st.rerun()
 
     st.markdown("#### Tip: Changes apply immediately to the app interface.")
 
-    st.markdown('</div>')
 
 
 
@@ -471,9 +901,10 @@ if st.session_state.current_section == "settings":
 
 
 
-elif st.session_state.current_section == "profile":
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h2>🧾 Complete Your Profile</h2>', unsafe_allow_html=True)
+@section_fragment
+def profile_section():
+    render_html(card_header("🧾 Complete Your Profile"))
+    show_notice("profile")
     name = st.text_input("Full Name")
     age = st.number_input("Age", min_value=0, max_value=120)
     gender = st.selectbox("Gender", ["Male", "Female", "Other"])
@@ -483,35 +914,73 @@ elif st.session_state.current_section == "profile":
     if st.button("Save Profile"):
         if name and age > 0 and height > 0 and weight > 0:
             save_profile(name, age, gender, height, weight)
+            # The navbar unlocks the other sections once the profile is complete
+            st.rerun()
         else:
             st.error("❌ Please fill in all fields.")
     
     if st.session_state.profile_complete:
+        st.caption("🔒 Your data is tied to this page's link. Anyone with the link can see and delete it, "
+                   "so don't share it.")
         st.markdown('<br>', unsafe_allow_html=True)
-        if st.button("🔄 Reset Profile"):
-            reset_profile()
+        if not st.session_state.confirm_reset:
+            if st.button("🔄 Reset Profile"):
+                st.session_state.confirm_reset = True
+                rerun_section()
+        else:
+            st.warning("⚠️ This permanently deletes your profile, readings, logs and chat history.")
+            confirm_col, cancel_col = st.columns(2)
+            if confirm_col.button("🗑️ Delete everything", type="primary"):
+                st.session_state.confirm_reset = False
+                reset_profile()
+            if cancel_col.button("Cancel"):
+                st.session_state.confirm_reset = False
+                rerun_section()
     
     st.markdown('Thanks')
 
-# If profile not completed, stop further access
-elif not st.session_state.profile_complete:
-    st.info("ℹ️ Please complete your profile before continuing.")
-    if st.button("Go to Profile"):
-        st.session_state.current_section = "profile"
-    st.stop()
 
 
 
 
 #                            ------------------------------ CHATBOT ------------------------------
-elif st.session_state.current_section == "chat":
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h2>🤖 Enhanced Health Assistant Chatbot</h2>', unsafe_allow_html=True)
-
-    # Display chat messages
-    for role, content in st.session_state.messages:
+@section_fragment
+def chat_section():
+    render_html(card_header("🤖 Enhanced Health Assistant Chatbot"))
+
+    # A reply that finished since the last run joins the history exactly once
+    job = finished_job("chat")
+    if job is not None:
+        if job.status == "failed":
+            response = f"🚨 Error processing request: {job.error}"
+        else:
+            response = job.result.get("text", "")
+            if job.result.get("timing"):
+                record_stream_timing(job.result["timing"])
+            if not response or "error" in response.lower():
+                response = "I'm unable to respond at this time due to technical issues. Please try again later."
+        add_message("assistant", response)
+
+    # Display chat messages, newest page first; older pages load on request
+    messages = st.session_state.messages
+    shown = st.session_state.chat_pages * CHAT_PAGE_SIZE
+    if len(messages) > shown:
+        if st.button(f"⬆️ Show earlier messages ({len(messages) - shown} more)"):
+            st.session_state.chat_pages += 1
+            rerun_section()
+    bubbles = HtmlFragment()
+    for role, content in messages[-shown:]:
         bubble_class = "user-bubble" if role == "user" else "bot-bubble"
-        st.markdown(f'<div class="{bubble_class}"><b>{role.capitalize()}:</b> {content}</div>', unsafe_allow_html=True)
+        bubbles.add(f'<div class="{bubble_class}"><b>{role.capitalize()}:</b> {content}</div>')
+    bubbles.render()
+
+    def render_reply_pending(job, partial):
+        if partial and st.session_state.stream_responses:
+            st.markdown(f'<div class="bot-bubble"><b>Assistant:</b> {partial}▌</div>', unsafe_allow_html=True)
+        else:
+            st.markdown('<div class="bot-bubble"><b>Assistant:</b> 🧠 Analyzing query...</div>', unsafe_allow_html=True)
+
+    show_job("chat", lambda job: None, render_reply_pending)
 
     # Input form
     with st.form(key='chat_form', clear_on_submit=True):
@@ -519,10 +988,10 @@ elif st.session_state.current_section == "chat":
         submit_button = st.form_submit_button(label="Send")
 
     if submit_button and user_input:
-        st.session_state.messages.append(("user", user_input))
+        add_message("user", user_input)
 
         # Build context from profile
-        profile_info = "\n".join([f"{k.capitalize()}: {v}" for k, v in st.session_state.profile_data.items()])
+        profile_info = profile_fragment("lines")
 
         # Categorize query type
         query_lower = user_input.lower()
@@ -537,42 +1006,24 @@ elif st.session_state.current_section == "chat":
         elif any(word in query_lower for word in ["ai", "report", "analyze", "summary"]):
             category = "reports"
 
-        # Prepare enhanced prompt
-        prompt = f"""
-You are a professional medical assistant AI helping a patient with their health queries.
-Use the following guidelines:
-- Be empathetic, informative, and clear.
-- Always mention that you're not a substitute for real medical advice.
-- If unsure, recommend consulting a physician.
 
-Patient Profile:
-{profile_info}
-
-Chat History:
-{''.join([f'{r.capitalize()}: {c}\n' for r, c in st.session_state.messages[-6:]])}
-
-User Question: "{user_input}"
-
-Based on the question category ("{category}"), provide a detailed response that includes:
-1. Medical interpretation of the query
-2. Possible causes or implications
-3. Suggested actions or precautions
-4. When to consult a doctor
-
-Answer:"""
+        # Fit summary + recent turns into the token budget left by the rest of the prompt
+        conversation = get_conversation_manager()
+        memory = st.session_state.chat_memory
+        fields = dict(profile_info=profile_info, user_input=user_input, category=category)
+        summary, chat_history, prompt_tokens = conversation.build_context(
+            memory,
+            st.session_state.messages[:-1],
+            PROMPTS.get("chat").render(conversation_summary="", chat_history="", **fields),
+        )
+        conversation_summary = f"\nConversation Summary:\n{summary}\n" if summary else ""
+        prompt = PROMPTS.render("chat", conversation_summary=conversation_summary, chat_history=chat_history, **fields)
+        st.session_state.chat_prompt_tokens = prompt_tokens
+        user_id = st.session_state.user_id
+        conversation.maybe_refresh(memory, st.session_state.messages, lambda p: llm_invoke("chat", p, user_id=user_id))
 
-        try:
-            llm = get_llm("chat")
-            with st.spinner("🧠 Analyzing query..."):
-                response = llm.invoke(prompt).strip()
-                if not response or "error" in response.lower():
-                    response = "I'm unable to respond at this time due to technical issues. Please try again later."
-                st.session_state.messages.append(("assistant", response))
-                st.rerun()
-
-        except Exception as e:
-            st.session_state.messages.append(("assistant", f"🚨 Error processing request: {str(e)}"))
-            st.rerun()
+        submit_job("chat", "chat", {"prompt": prompt, "stream": st.session_state.stream_responses})
+        rerun_section()
 
     st.markdown('Thanks')
 
@@ -588,9 +1039,9 @@ Answer:"""
 
 
 
-elif st.session_state.current_section == "symptoms":
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h2>🧠 Symptom Checker (Disease Identifier)</h2>', unsafe_allow_html=True)
+@section_fragment
+def symptoms_section():
+    render_html(card_header("🧠 Symptom Checker (Disease Identifier)"))
     
     symptom_description = st.text_area(
         "Describe your symptoms (e.g., headache, fever, fatigue):",
@@ -602,40 +1053,31 @@ elif st.session_state.current_section == "symptoms":
             st.warning("⚠️ Please describe your symptoms.")
         else:
             # Build prompt to ask for possible conditions
-            prompt = f"""
-You are a medical AI assistant. Based on the following symptoms, list the most likely conditions or diseases from most to least probable.
-
-Patient Profile:
-Name: {st.session_state.profile_data.get('name', 'Unknown')}
-Age: {st.session_state.profile_data.get('age', 'Unknown')}
-Gender: {st.session_state.profile_data.get('gender', 'Unknown')}
-
-Symptoms: {symptom_description}
-
-Provide a structured response with:
-1. Most likely condition with brief explanation
-2. Alternative possibilities
-3. Likelihood percentages
-4. Recommended next steps
-
-Keep it concise and professional.
-"""
-            try:
-                llm = get_llm("symptoms")
-                response = llm.invoke(prompt).strip()
-                
-                if not response or response.lower() in ["online", "none", "no result"]:
-                    st.error("🚨 Could not retrieve valid diagnosis from AI. Try again later.")
-                else:
-                    st.markdown(f"🩺 **Diagnosis Results:**\n\n{response}")
-                    
-                    # Store in health analytics
-                    st.session_state.analytics_data["dates"].append(datetime.now().strftime("%Y-%m-%d"))
-                    st.session_state.analytics_data["heart_rates"].append(random.randint(60, 100))
-                    st.session_state.analytics_data["glucose_levels"].append(random.randint(70, 130))
-                    
-            except Exception as e:
-                st.error(f"🚨 Error getting diagnosis: {str(e)}")
+            prompt = PROMPTS.render("symptoms", profile_basic=profile_fragment("basic"), symptoms=symptom_description)
+            submit_job("symptoms", "llm", {"section": "symptoms", "prompt": prompt})
+
+    # Store in health analytics once per finished diagnosis. These are demo
+    # readings, not measurements, so they stay in this session and are never
+    # saved to the database.
+    job = finished_job("symptoms")
+    if job is not None and job_text(job) and not job.result.get("fallback"):
+        st.session_state.metric_store.append(
+            datetime.now(),
+            heart_rates=random.randint(60, 100),
+            glucose_levels=random.randint(70, 130),
+        )
+
+    def render_diagnosis(job):
+        if job.status == "failed":
+            st.error(f"🚨 Error getting diagnosis: {job.error}")
+        elif not job_text(job):
+            st.error("🚨 Could not retrieve valid diagnosis from AI. Try again later.")
+        elif job.result.get("fallback"):
+            st.warning(job.result["text"])
+        else:
+            st.markdown(f"🩺 **Diagnosis Results:**\n\n{job.result['text']}")
+
+    show_job("symptoms", render_diagnosis)
     
     st.markdown('Thanks')
 
@@ -644,9 +1086,9 @@ Keep it concise and professional.
 
 
 #        ------------------------------ TREATMENT PLANNER ------------------------------
-elif st.session_state.current_section == "treatment":
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h2>💊 Personalized Treatment Suggestions</h2>', unsafe_allow_html=True)
+@section_fragment
+def treatment_section():
+    render_html(card_header("💊 Personalized Treatment Suggestions"))
     
     col1, col2 = st.columns(2)
     with col1:
@@ -666,35 +1108,21 @@ elif st.session_state.current_section == "treatment":
             st.warning("⚠️ Please enter a condition.")
         else:
             # Build treatment plan prompt
-            prompt = f"""
-Based on the following patient profile and condition, create a personalized treatment plan:
-
-Patient Profile:
-Name: {st.session_state.profile_data.get('name', 'Unknown')}
-Age: {st.session_state.profile_data.get('age', 'Unknown')}
-Gender: {st.session_state.profile_data.get('gender', 'Unknown')}
-BMI: {st.session_state.profile_data.get('bmi', 'Unknown')}
-
-Condition: {condition}
-Duration: {duration}
-
-Include:
-1. Medications (with dosages and frequency)
-2. Lifestyle modifications
-3. Follow-up care recommendations
-4. Potential complications to monitor
-"""
-            try:
-                llm = get_llm("treatment")
-                response = llm.invoke(prompt).strip()
-                
-                if not response or response.lower() in ["online", "none", "no result"]:
-                    st.error("🚨 Could not retrieve valid treatment plan.")
-                else:
-                    st.markdown(f"💡 **Personalized Treatment Plan:**\n\n{response}")
-                    
-            except Exception as e:
-                st.error(f"🚨 Error generating treatment plan: {str(e)}")
+            prompt = PROMPTS.render("treatment", profile_clinical=profile_fragment("clinical"),
+                                    condition=condition, duration=duration)
+            submit_job("treatment", "llm", {"section": "treatment", "prompt": prompt})
+
+    def render_treatment(job):
+        if job.status == "failed":
+            st.error(f"🚨 Error generating treatment plan: {job.error}")
+        elif not job_text(job):
+            st.error("🚨 Could not retrieve valid treatment plan.")
+        elif job.result.get("fallback"):
+            st.warning(job.result["text"])
+        else:
+            st.markdown(f"💡 **Personalized Treatment Plan:**\n\n{job.result['text']}")
+
+    show_job("treatment", render_treatment)
     
     st.markdown('Thanks')
 
@@ -710,9 +1138,9 @@ Include:
 
 
 
-elif st.session_state.current_section == "diseases":
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h2>🫀 Chronic Disease Management</h2>', unsafe_allow_html=True)
+@section_fragment
+def diseases_section():
+    render_html(card_header("🫀 Chronic Disease Management"))
 
     # Condition selector
     condition = st.selectbox("Select Chronic Condition", ["Diabetes", "Hypertension", "Asthma"])
@@ -729,23 +1157,17 @@ elif st.session_state.current_section == "diseases":
                 glucose_date = st.date_input("Date of Measurement", value=datetime.today(), key="glucose_date")
 
             if st.button("✅ Log Glucose Reading"):
-                st.session_state.glucose_log.append({
+                add_log_entry("glucose", {
                     "value": glucose,
                     "date": glucose_date.strftime("%Y-%m-%d")
                 })
                 st.success(f"✅ Logged: {glucose} mg/dL on {glucose_date.strftime('%Y-%m-%d')}")
 
-                # Generate AI Advice
-                prompt = f"""
-My blood sugar is {glucose} mg/dL. Is this normal? What should I do next?
-Patient Profile: {json.dumps(st.session_state.profile_data)}
-"""
-                try:
-                    llm = get_llm("diseases")
-                    advice = llm.invoke(prompt).strip()
-                except Exception as e:
-                    advice = "🤖 AI advice unavailable at the moment."
-                st.markdown(f"🧠 **AI Health Advice:**\n\n{advice}")
+                assessment = classify_glucose(glucose)
+                prompt = PROMPTS.render("glucose_advice", glucose=glucose, category=assessment.category,
+                                        profile_json=profile_fragment("json"))
+                log_disease_reading("glucose", f"{glucose} mg/dL", assessment, prompt)
+            show_disease_advice("glucose")
 
         elif condition == "Hypertension":
             col1, col2 = st.columns(2)
@@ -756,23 +1178,18 @@ Patient Profile: {json.dumps(st.session_state.profile_data)}
                 diastolic = st.number_input("Diastolic BP", min_value=60, max_value=130, value=80, key="dia")
             
             if st.button("✅ Log Blood Pressure"):
-                st.session_state.bp_log.append({
+                add_log_entry("bp", {
                     "systolic": systolic,
                     "diastolic": diastolic,
                     "date": sys_date.strftime("%Y-%m-%d")
                 })
                 st.success(f"✅ Logged: {systolic}/{diastolic} mmHg on {sys_date.strftime('%Y-%m-%d')}")
 
-                prompt = f"""
-My blood pressure is {systolic}/{diastolic} mmHg. What does that mean?
-Patient Profile: {json.dumps(st.session_state.profile_data)}
-"""
-                try:
-                    llm = get_llm("diseases")
-                    advice = llm.invoke(prompt).strip()
-                except Exception as e:
-                    advice = "🤖 AI advice unavailable at the moment."
-                st.markdown(f"🧠 **AI Health Advice:**\n\n{advice}")
+                assessment = classify_bp(systolic, diastolic)
+                prompt = PROMPTS.render("bp_advice", systolic=systolic, diastolic=diastolic,
+                                        category=assessment.category, profile_json=profile_fragment("json"))
+                log_disease_reading("bp", f"{systolic}/{diastolic} mmHg", assessment, prompt)
+            show_disease_advice("bp")
 
         elif condition == "Asthma":
             triggers = st.text_area("Triggers Today (e.g., pollen, dust, exercise)")
@@ -780,47 +1197,50 @@ Patient Profile: {json.dumps(st.session_state.profile_data)}
             episode_date = st.date_input("Date of Episode", value=datetime.today(), key="asthma_date")
 
             if st.button("✅ Log Asthma Episode"):
-                st.session_state.asthma_log.append({
+                add_log_entry("asthma", {
                     "triggers": triggers,
                     "severity": severity,
                     "date": episode_date.strftime("%Y-%m-%d")
                 })
                 st.success(f"✅ Episode logged on {episode_date.strftime('%Y-%m-%d')}")
 
-                prompt = f"""
-What are some ways to avoid asthma triggers like '{triggers}'?
-Also, how can I manage severity level {severity} episodes?
-Patient Profile: {json.dumps(st.session_state.profile_data)}
-"""
-                try:
-                    llm = get_llm("diseases")
-                    advice = llm.invoke(prompt).strip()
-                except Exception as e:
-                    advice = "🤖 AI advice unavailable at the moment."
-                st.markdown(f"🧠 **AI Health Advice:**\n\n{advice}")
+                assessment = classify_asthma(severity)
+                prompt = PROMPTS.render("asthma_advice", triggers=triggers, severity=severity,
+                                        category=assessment.category, profile_json=profile_fragment("json"))
+                log_disease_reading("asthma", f"Severity {severity}/10", assessment, prompt)
+            show_disease_advice("asthma")
 
     with tab2:
         st.markdown("### 📈 Historical Data Visualization")
 
-        if condition == "Diabetes" and st.session_state.glucose_log:
-            df_gluc = pd.DataFrame(st.session_state.glucose_log)
-            fig = px.line(df_gluc, x='date', y='value', title='Glucose Levels Over Time')
-            fig.update_layout(yaxis_title="Glucose (mg/dL)", xaxis_title="Date")
-            st.plotly_chart(fig, use_container_width=True)
+        glucose_log = st.session_state.glucose_log
+        bp_log = st.session_state.bp_log
+        asthma_log = st.session_state.asthma_log
 
-        elif condition == "Hypertension" and st.session_state.bp_log:
-            df_bp = pd.DataFrame(st.session_state.bp_log)
-            df_bp['bp_str'] = df_bp['systolic'].astype(str) + "/" + df_bp['diastolic'].astype(str)
-            fig = px.line(df_bp, x='date', y='systolic', title='Systolic Blood Pressure Trend')
-            st.plotly_chart(fig, use_container_width=True)
+        if condition == "Diabetes" and glucose_log:
+            fig = cached_figure(glucose_log, "glucose", lambda: line_chart(
+                [e['date'] for e in glucose_log], [e['value'] for e in glucose_log],
+                'Glucose Levels Over Time', "Glucose (mg/dL)"))
+            plot_chart(fig)
 
-            fig2 = px.line(df_bp, x='date', y='diastolic', title='Diastolic Blood Pressure Trend')
-            st.plotly_chart(fig2, use_container_width=True)
+        elif condition == "Hypertension" and bp_log:
+            fig = cached_figure(bp_log, "systolic", lambda: line_chart(
+                [e['date'] for e in bp_log], [e['systolic'] for e in bp_log],
+                'Systolic Blood Pressure Trend', 'systolic'))
+            plot_chart(fig)
 
-        elif condition == "Asthma" and st.session_state.asthma_log:
-            df_asthma = pd.DataFrame(st.session_state.asthma_log)
-            fig = px.bar(df_asthma, x='date', y='severity', color='triggers', title='Asthma Severity by Trigger')
-            st.plotly_chart(fig, use_container_width=True)
+            fig2 = cached_figure(bp_log, "diastolic", lambda: line_chart(
+                [e['date'] for e in bp_log], [e['diastolic'] for e in bp_log],
+                'Diastolic Blood Pressure Trend', 'diastolic'))
+            plot_chart(fig2)
+
+        elif condition == "Asthma" and asthma_log:
+            import pandas as pd
+            import plotly.express as px
+
+            fig = cached_figure(asthma_log, "asthma", lambda: px.bar(
+                pd.DataFrame(asthma_log), x='date', y='severity', color='triggers', title='Asthma Severity by Trigger'))
+            plot_chart(fig)
 
         else:
             st.info("ℹ️ No historical data available yet.")
@@ -837,19 +1257,15 @@ Patient Profile: {json.dumps(st.session_state.profile_data)}
 
 
 
-elif st.session_state.current_section == "reports":
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown('<h2>📈 Health Analytics Dashboard</h2>', unsafe_allow_html=True)
-
-    # Initialize session state analytics data if not exists
-    if 'analytics_data' not in st.session_state:
-        st.session_state.analytics_data = {
-            "dates": [],
-            "heart_rates": [],
-            "glucose_levels": [],
-            "peak_flow": [],
-            "hba1c": []
-        }
+# Bulk entry, AI summary and PDF export are fragments of their own: changing
+# the range type or typing into the data editor reruns only the entry form,
+# not the four charts, the trend card and the PDF export below.
+
+@section_fragment
+def bulk_metric_entry(store):
+    # Only this form needs pandas at render time (the bulk entry table)
+    import pandas as pd
+    from bulk_ingest import ingest_bulk_metrics
 
     # --------------------------
     # Bulk Metric Input Section
@@ -901,74 +1317,151 @@ elif st.session_state.current_section == "reports":
 
     edited_df = st.data_editor(default_data, use_container_width=True, num_rows="dynamic")
 
+    # Shown after the full rerun that adding rows triggers
+    report = st.session_state.pop("bulk_report", None)
     if st.button("➕ Add Bulk Metrics"):
-        success_count = 0
         try:
-            for index, row in edited_df.iterrows():
-                try:
-                    hr = int(row['Heart Rate (bpm)']) if not pd.isna(row['Heart Rate (bpm)']) else None
-                    gluc = int(row['Blood Glucose (mg/dL)']) if not pd.isna(row['Blood Glucose (mg/dL)']) else None
-                    peak_flow = float(row['Peak Flow (L/min)']) if not pd.isna(row['Peak Flow (L/min)']) else None
-                    hba1c = float(row['HbA1c (%)']) if not pd.isna(row['HbA1c (%)']) else None
-                    date = row['Date']
-                    valid = True
-                    if hr is not None and not (40 <= hr <= 140): valid = False
-                    if gluc is not None and not (50 <= gluc <= 200): valid = False
-                    if peak_flow is not None and not (100 <= peak_flow <= 800): valid = False
-                    if hba1c is not None and not (4 <= hba1c <= 12): valid = False
-                    if valid:
-                        st.session_state.analytics_data["dates"].append(date)
-                        st.session_state.analytics_data["heart_rates"].append(hr)
-                        st.session_state.analytics_data["glucose_levels"].append(gluc)
-                        st.session_state.analytics_data["peak_flow"].append(peak_flow)
-                        st.session_state.analytics_data["hba1c"].append(hba1c)
-                        success_count += 1
-                    else:
-                        st.warning(f"⚠️ Invalid values found on row {index+1}. Please enter valid ranges.")
-                except Exception as e:
-                    st.warning(f"⚠️ Error processing row {index}: {str(e)}")
-            if success_count > 0:
-                st.success(f"✅ Successfully added {success_count} metric(s)!")
+            start = len(store)
+            report = ingest_bulk_metrics(store, edited_df)
+            persist_metrics_since(start)
         except Exception as e:
             st.error(f"🚨 An unexpected error occurred: {str(e)}")
+        else:
+            if report.added > 0:
+                # Charts, trends and the PDF depend on the new rows
+                st.session_state.bulk_report = report
+                st.rerun()
+
+    if report is not None:
+        if report.added > 0:
+            st.success(f"✅ Successfully added {report.added} metric(s)!")
+        if len(report.rejected) > 0:
+            st.warning(f"⚠️ {len(report.rejected)} row(s) skipped because of invalid values. Please enter valid ranges.")
+            st.dataframe(report.rejected, use_container_width=True, hide_index=True)
+
+
+@section_fragment
+def report_summary(trends):
+    # Generate AI Insights (in the background; metrics can still be added meanwhile)
+    if st.button("🧠 Generate Enhanced AI Report Summary"):
+        series = {key: describe_trend(trends[key], unit) for key, _, unit in REPORT_METRICS}
+        profile_info = profile_fragment("lines")
+        submit_job("report", "report", {
+            "profile_info": profile_info, "series": series, "stream": st.session_state.stream_responses,
+        })
+
+    job = finished_job("report")
+    if job is not None and job.status == "done":
+        st.session_state.ai_summary = job.result["summary"]
+        st.session_state.report_timings = job.result["timings"]
+        if job.result.get("timing"):
+            record_stream_timing(job.result["timing"])
+
+    def render_summary_pending(job, partial):
+        if partial:
+            st.markdown("### 🧠 AI Report Summary")
+            st.markdown(partial + "▌")
+        else:
+            st.info("🧠 Analyzing each metric... you can keep adding data meanwhile.")
+
+    def render_summary(job):
+        if job.status == "failed":
+            st.error(f"🚨 Error generating AI summary: {job.error}")
+            return
+        result = job.result
+        for key, label, _ in REPORT_METRICS:
+            if key in result["errors"]:
+                st.warning(f"⚠️ {label} analysis unavailable: {result['errors'][key]}")
+        if result["summary"]:
+            st.markdown("### 🧠 AI Report Summary")
+            st.markdown(result["summary"])
+        elif result["unavailable"]:
+            st.warning(FALLBACK_RESPONSES["reports"])
+        elif result["error"]:
+            st.error(f"🚨 Error generating AI summary: {result['error']}")
+
+    show_job("report", render_summary, render_summary_pending)
+
+
+@section_fragment
+def pdf_export(store):
+    # Built only on request in the exporter's worker pool, then reused until
+    # the data changes
+    with rerun_profile.phase("pdf"):
+        if st.session_state.profile_complete:
+            exporter = get_pdf_exporter()
+            key = pdf_report_key()
+            job = exporter.peek(key)
+            if job is None and st.button("📄 Prepare PDF Report"):
+                job = exporter.submit(key, report_record(st.session_state.profile_data, store,
+                                                         st.session_state.ai_summary))
+            if job is not None:
+                # Poll while building instead of blocking the script thread on the result
+                building = not job.done()
+                st.fragment(render_pdf_job, run_every=JOB_POLL_INTERVAL if building else None)(
+                    key, building, store)
+
+
+def render_pdf_job(key, polling, store):
+    exporter = get_pdf_exporter()
+    job = exporter.peek(key)
+    if job is None:
+        return
+    if not job.done():
+        st.info("📄 Building PDF report...")
+        return
+    if polling:
+        st.rerun()
+    error = job.exception()
+    if error is not None:
+        st.error(f"🚨 Error building PDF report: {str(error)}")
+        if st.button("🔄 Retry PDF Report"):
+            # submit() replaces a failed build; the full rerun starts polling it
+            exporter.submit(key, report_record(st.session_state.profile_data, store,
+                                               st.session_state.ai_summary))
+            st.rerun()
+        return
+    st.download_button(
+        label="Export PDF",
+        data=job.result(),
+        file_name="health_report.pdf",
+        mime="application/pdf"
+    )
 
-    # Ensure all lists are the same length before creating DataFrame
-    dates = st.session_state.analytics_data.get("dates", [])
-    heart_rates = st.session_state.analytics_data.get("heart_rates", [])
-    glucose_levels = st.session_state.analytics_data.get("glucose_levels", [])
-    peak_flow = st.session_state.analytics_data.get("peak_flow", [])
-    hba1c = st.session_state.analytics_data.get("hba1c", [])
-
-    min_len = min(len(dates), len(heart_rates), len(glucose_levels), len(peak_flow), len(hba1c))
-
-    df = pd.DataFrame({
-        'Date': dates[:min_len],
-        'Heart Rate': heart_rates[:min_len],
-        'Blood Glucose': glucose_levels[:min_len],
-        'Peak Flow': peak_flow[:min_len],
-        'HbA1c': hba1c[:min_len]
-    })
+
+def reports_section():
+    render_html(card_header("📈 Health Analytics Dashboard"))
+
+    store = st.session_state.metric_store
+    bulk_metric_entry(store)
+
+    # Rolling trend statistics, updated incrementally as rows are appended
+    trends = {key: store.trend(key) for key, _, _ in REPORT_METRICS}
 
     # Charts
     st.markdown("### ❤️ Heart Rate Trends")
-    fig_hr = px.line(df, x='Date', y='Heart Rate', title='Heart Rate Over Time', markers=True)
-    fig_hr.update_layout(yaxis_range=[40, 140], template="plotly_white")
-    st.plotly_chart(fig_hr, use_container_width=True)
+    fig_hr = cached_figure(store, "heart_rates", lambda: line_chart(
+        store.dates, store.column("heart_rates"), 'Heart Rate Over Time', 'Heart Rate',
+        y_range=[40, 140], template="plotly_white"))
+    plot_chart(fig_hr)
 
     st.markdown("### 🩸 Blood Glucose Levels")
-    fig_glucose = px.line(df, x='Date', y='Blood Glucose', title='Blood Glucose Levels Over Time', markers=True)
-    fig_glucose.update_layout(yaxis_range=[50, 200], template="plotly_white")
-    st.plotly_chart(fig_glucose, use_container_width=True)
+    fig_glucose = cached_figure(store, "glucose_levels", lambda: line_chart(
+        store.dates, store.column("glucose_levels"), 'Blood Glucose Levels Over Time', 'Blood Glucose',
+        y_range=[50, 200], template="plotly_white"))
+    plot_chart(fig_glucose)
 
     st.markdown("### 🫁 Peak Flow Trends")
-    fig_peak = px.line(df, x='Date', y='Peak Flow', title='Peak Flow (L/min)', markers=True)
-    fig_peak.update_layout(yaxis_range=[100, 800], template="plotly_white")
-    st.plotly_chart(fig_peak, use_container_width=True)
+    fig_peak = cached_figure(store, "peak_flow", lambda: line_chart(
+        store.dates, store.column("peak_flow"), 'Peak Flow (L/min)', 'Peak Flow',
+        y_range=[100, 800], template="plotly_white"))
+    plot_chart(fig_peak)
 
     st.markdown("### 🧬 HbA1c Levels")
-    fig_hba1c = px.line(df, x='Date', y='HbA1c', title='HbA1c (%) Over Time', markers=True)
-    fig_hba1c.update_layout(yaxis_range=[4, 12], template="plotly_white")
-    st.plotly_chart(fig_hba1c, use_container_width=True)
+    fig_hba1c = cached_figure(store, "hba1c", lambda: line_chart(
+        store.dates, store.column("hba1c"), 'HbA1c (%) Over Time', 'HbA1c',
+        y_range=[4, 12], template="plotly_white"))
+    plot_chart(fig_hba1c)
 
     # BMI Display
     if st.session_state.profile_data.get('bmi'):
@@ -987,107 +1480,80 @@ elif st.session_state.current_section == "reports":
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("### 📊 Latest Metrics")
-        latest_date = dates[-1] if len(dates) > 0 else "N/A"
-        latest_hr = heart_rates[-1] if len(heart_rates) > 0 else "N/A"
-        latest_glucose = glucose_levels[-1] if len(glucose_levels) > 0 else "N/A"
-        latest_peak = peak_flow[-1] if len(peak_flow) > 0 else "N/A"
-        latest_hba1c = hba1c[-1] if len(hba1c) > 0 else "N/A"
-        st.markdown(f"""
-        <div class="metric-card">
-            <strong>Date:</strong> {latest_date}<br>
-            <strong>Heart Rate:</strong> {latest_hr} bpm<br>
-            <strong>Blood Glucose:</strong> {latest_glucose} mg/dL<br>
-            <strong>Peak Flow:</strong> {latest_peak} L/min<br>
-            <strong>HbA1c:</strong> {latest_hba1c} %
-        </div>
-        """, unsafe_allow_html=True)
+        # Each metric with the date it was measured: rows are often partial
+        latest_rows = []
+        for key, label, unit in REPORT_METRICS:
+            date, value = store.latest_reading(key)
+            reading = "N/A" if value is None else f"{value} {unit} <small>({date})</small>"
+            latest_rows.append(f"<strong>{label}:</strong> {reading}")
+        st.markdown(f'<div class="metric-card">{"<br>".join(latest_rows)}</div>', unsafe_allow_html=True)
 
     # Trend Analysis
     with col2:
         st.markdown("### 📈 Trend Analysis")
-        hr_trend = "↑" if len(heart_rates) > 1 and heart_rates[-1] > heart_rates[-2] else "↓" if len(heart_rates) > 1 else "-"
-        glucose_trend = "↑" if len(glucose_levels) > 1 and glucose_levels[-1] > glucose_levels[-2] else "↓" if len(glucose_levels) > 1 else "-"
-        peak_trend = "↑" if len(peak_flow) > 1 and peak_flow[-1] > peak_flow[-2] else "↓" if len(peak_flow) > 1 else "-"
-        hba1c_trend = "↑" if len(hba1c) > 1 and hba1c[-1] > hba1c[-2] else "↓" if len(hba1c) > 1 else "-"
+        trend_rows = []
+        for key, label, unit in REPORT_METRICS:
+            trend = trends[key]
+            arrow = TREND_ARROWS.get(trend["direction"], "-")
+            css = "trend-up" if arrow == "↑" else "trend-down" if arrow == "↓" else ""
+            latest_value = store.latest(key)
+            month = trend["windows"][30]
+            avg = f" · 30-day avg {month['mean']:.1f}" if month["mean"] is not None else ""
+            flag = " ⚠️" if trend["anomaly"] else ""
+            trend_rows.append(
+                f'<strong>{label} Trend:</strong> {arrow} '
+                f'<span class="{css}">{latest_value if latest_value is not None else "?"}</span>{avg}{flag}'
+            )
 
         st.markdown(f"""
         <div class="metric-card">
-            <strong>Heart Rate Trend:</strong> {hr_trend} 
-            <span class="{'trend-up' if hr_trend == '↑' else 'trend-down'}">{heart_rates[-1] if len(heart_rates) > 0 else '?'}</span><br>
-            <strong>Glucose Trend:</strong> {glucose_trend} 
-            <span class="{'trend-up' if glucose_trend == '↑' else 'trend-down'}">{glucose_levels[-1] if len(glucose_levels) > 0 else '?'}</span><br>
-            <strong>Peak Flow Trend:</strong> {peak_trend}
-            <span class="{'trend-up' if peak_trend == '↑' else 'trend-down'}">{latest_peak}</span><br>
-            <strong>HbA1c Trend:</strong> {hba1c_trend}
-            <span class="{'trend-up' if hba1c_trend == '↑' else 'trend-down'}">{latest_hba1c}</span>
+            {"<br>".join(trend_rows)}
         </div>
         """, unsafe_allow_html=True)
 
-    # Generate AI Insights
-    ai_summary = ""
-    if st.button("🧠 Generate Enhanced AI Report Summary"):
-        recent_hr = ', '.join(map(str, heart_rates[-7:]))
-        recent_glucose = ', '.join(map(str, glucose_levels[-7:]))
-        recent_peak = ', '.join(map(str, peak_flow[-7:]))
-        recent_hba1c = ', '.join(map(str, hba1c[-7:]))
-        profile_info = "\n".join([f"{k.capitalize()}: {v}" for k, v in st.session_state.profile_data.items()])
-        prompt = f"""
-You are a professional healthcare AI assistant tasked with providing a personalized health summary based on collected metrics.
-Patient Profile:
-{profile_info}
-Recent Metrics:
-Heart Rate (bpm): [{recent_hr}]
-Blood Glucose (mg/dL): [{recent_glucose}]
-Peak Flow (L/min): [{recent_peak}]
-HbA1c (%): [{recent_hba1c}]
-Instructions:
-1. Analyze trends over time and note if values are increasing, decreasing, or stable.
-2. Interpret what these trends may mean in terms of health implications.
-3. Provide simple, easy-to-understand explanations without medical jargon.
-4. Suggest practical lifestyle changes (e.g., diet, exercise).
-5. Mention when a medical checkup is recommended.
-6. Format output using bullet points and short paragraphs.
-Output format:
-### 🔍 Trend Overview
-- Heart Rate: [Stable/Increasing/Decreasing]
-- Blood Glucose: [Stable/Increasing/Decreasing]
-- Peak Flow: [Stable/Increasing/Decreasing]
-- HbA1c: [Stable/Increasing/Decreasing]
-### 🩺 Health Implications
-Explain what the trend might indicate about the patient's current condition.
-### 💡 Recommendations
-Provide 2-3 lifestyle suggestions tailored to the patient's data.
-### ⚠️ Important Notes
-Include any warnings or reminders about consulting a doctor.
-Remember: Keep everything conversational and easy to understand.
-"""
+    report_summary(trends)
+    pdf_export(store)
+
+    st.markdown('Thanks')
 
-        try:
-            llm = get_llm("reports")
-            with st.spinner("🧠 Generating enhanced report summary..."):
-                response = llm.invoke(prompt).strip()
-                st.markdown("### 🧠 AI Report Summary")
-                st.markdown(response)
-                ai_summary = response
-        except Exception as e:
-            st.error(f"🚨 Error generating AI summary: {str(e)}")
 
-    # Export PDF Button
-    if st.session_state.profile_complete:
-        pdf_data = export_health_report(ai_summary=ai_summary)
-        st.download_button(
-            label="Export PDF",
-            data=pdf_data,
-            file_name="health_report.pdf",
-            mime="application/pdf"
-        )
 
-    st.markdown('Thanks')
+
+# Show the current section. Each section (or, on the reports page, each form)
+# is a fragment, so its widgets rerun only that fragment.
+
+rerun_profile.lap(f"section:{st.session_state.current_section}")
+
+if st.session_state.current_section == "settings":
+    settings_section(lang)
+elif st.session_state.current_section == "profile":
+    profile_section()
+
+# If profile not completed, stop further access
+elif not st.session_state.profile_complete:
+    st.info("ℹ️ Please complete your profile before continuing.")
+    if st.button("Go to Profile"):
+        st.session_state.current_section = "profile"
+    finish_rerun_profile()
+    st.stop()
+
+elif st.session_state.current_section == "chat":
+    chat_section()
+elif st.session_state.current_section == "symptoms":
+    symptoms_section()
+elif st.session_state.current_section == "treatment":
+    treatment_section()
+elif st.session_state.current_section == "diseases":
+    diseases_section()
+elif st.session_state.current_section == "reports":
+    reports_section()
 
     
     
 # Footer
 
+rerun_profile.lap("footer")
+
 
 
 lang = st.session_state.language
@@ -1099,7 +1565,59 @@ st.markdown(f'<p style="text-align:center; font-size:14px;">{LANGUAGES[lang]["fo
 
 
 
-with st.expander("🔧 Debug Mode"):
-    st.write("Session State:", st.session_state)
+def is_admin():
+    """Server-wide diagnostics cover every user's traffic, so they need ADMIN_TOKEN."""
+    token = st.secrets.get("ADMIN_TOKEN")
+    if not token:
+        st.caption("Set ADMIN_TOKEN in the secrets to see server-wide metrics.")
+        return False
+    entered = st.text_input("Admin token", type="password", key="admin_token")
+    return bool(entered) and hmac.compare_digest(entered.encode("utf-8"), str(token).encode("utf-8"))
+
+
+def render_metrics_panel():
+    import pandas as pd
 
+    metrics = get_llm_metrics()
+    snapshot = metrics.snapshot()
+    st.markdown("#### 📊 LLM Metrics")
+    if not snapshot["sections"]:
+        st.caption("No LLM calls recorded yet.")
+        return
+    table = pd.DataFrame.from_dict(snapshot["sections"], orient="index")[[
+        "calls", "error_rate", "latency_p50_s", "latency_p95_s", "latency_p99_s", "ttft_p50_s",
+        "prompt_tokens_avg", "completion_tokens_avg", "cache_hit_rate",
+    ]]
+    st.dataframe(table, use_container_width=True)
+    st.caption(f"Uptime {snapshot['uptime_s']}s · per-call log: {snapshot['jsonl_path'] or 'off'}")
+    st.download_button("⬇️ Prometheus metrics", metrics.prometheus(), file_name="healthai_metrics.prom",
+                       mime="text/plain")
 
+
+rerun_profile.lap("debug")
+
+with st.expander("🔧 Debug Mode"):
+    # Expander bodies run on every rerun even while collapsed, so the panel
+    # (and the pandas import behind its table) is only built on request
+    if st.toggle("Show diagnostics", key="show_diagnostics"):
+        st.write("Chat Context:", {
+            "memory": repr(st.session_state.chat_memory),
+            "last_prompt_tokens": st.session_state.get("chat_prompt_tokens"),
+            "exact_tokenizer": get_conversation_manager().counter.exact,
+        })
+        st.write("Streaming Timings (time-to-first-token):", st.session_state.stream_timings)
+        if is_admin():
+            render_metrics_panel()
+            st.write("LLM Backends:", {"sections": llm_backends, "providers": get_llm_providers().stats()})
+            st.write("LLM Gateway:", get_llm_gateway().stats())
+            st.write("LLM Health:", get_llm_guard().health())
+            st.write("Background Jobs:", get_job_queue().stats())
+            st.write("Prompt Sizes:", PROMPTS.stats())
+            st.write("Response Cache:", get_response_cache().stats())
+            st.write("Figure Cache:", get_figure_cache().stats())
+            st.write("Theme CSS:", theme.stats(st.get_option("server.enableStaticServing")))
+            st.write("PDF Export:", get_pdf_exporter().stats())
+            if rerun_profile.enabled:
+                st.write("Rerun Profile:", get_profile_log().stats())
+
+finish_rerun_profile()
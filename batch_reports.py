@@ -0,0 +1,280 @@
+# Batch PDF report generation
+#
+# Headless entry point for clinic-wide exports: renders one health report per
+# patient across a process pool, using the same record builder and renderer as
+# the dashboard's export button. Patients come from the persistent store or
+# from a JSON/CSV file. Finished PDFs are streamed to a directory or a zip as
+# they complete, so memory stays flat no matter how many patients there are.
+#
+#     python batch_reports.py --db .data/healthai.sqlite3 --out reports.zip
+#     python batch_reports.py --input patients.csv --out reports/ --workers 8
+#
+# --measure-memory reports the peak allocation per report (tracemalloc slows
+# rendering down, so it is for benchmarking only).
+
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import tracemalloc
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from metric_store import METRICS, MetricStore
+from pdf_report import render_report, report_record
+from storage import HealthDatabase
+
+
+PROFILE_FIELDS = ("name", "age", "gender", "height", "weight", "bmi")
+ID_COLUMNS = ("patient_id", "user_id", "id")
+# Same window of history the dashboard keeps in memory for a patient
+HISTORY_DAYS = 365
+
+
+# --------------------------
+# Patient sources
+# --------------------------
+
+def jobs_from_database(db_path, user_ids=None):
+    """One lightweight job per user; the worker loads the data itself."""
+    ids = user_ids or HealthDatabase(db_path, pool_size=1).list_users()
+    for user_id in ids:
+        yield {"id": user_id, "user_id": user_id}
+
+
+def jobs_from_json(path):
+    """Patients from a JSON list.
+
+    Each item has ``id``, ``profile`` and ``readings`` (a list of
+    ``{"date": ..., "<metric>": value}``) plus an optional ``ai_summary``.
+    """
+    with open(path, encoding="utf-8") as f:
+        patients = json.load(f)
+    for i, patient in enumerate(patients):
+        readings = pd.DataFrame(patient.get("readings", []))
+        yield _job_from_frame(patient.get("id", i), patient.get("profile", {}), readings,
+                              patient.get("ai_summary", ""))
+
+
+def jobs_from_csv(path):
+    """Patients from a CSV with one row per reading.
+
+    Needs a patient id column (patient_id/user_id/id) and ``date``; metric
+    columns are the MetricStore names and profile columns are taken from each
+    patient's first row.
+    """
+    frame = pd.read_csv(path)
+    id_column = next((c for c in ID_COLUMNS if c in frame.columns), None)
+    if id_column is None:
+        raise ValueError(f"CSV needs one of the columns: {', '.join(ID_COLUMNS)}")
+    for patient_id, rows in frame.groupby(id_column, sort=False):
+        first = rows.iloc[0]
+        profile = {k: _py(first[k]) for k in PROFILE_FIELDS if k in rows.columns and pd.notna(first[k])}
+        yield _job_from_frame(patient_id, profile, rows)
+
+
+def _job_from_frame(patient_id, profile, readings, ai_summary=""):
+    job = {"id": str(patient_id), "profile": profile, "ai_summary": ai_summary,
+           "dates": [], "columns": {}}
+    if len(readings) and "date" in readings.columns:
+        readings = readings.dropna(subset=["date"])
+        job["dates"] = pd.to_datetime(readings["date"]).dt.strftime("%Y-%m-%d").tolist()
+        job["columns"] = {
+            m: pd.to_numeric(readings[m], errors="coerce").tolist()
+            for m in METRICS if m in readings.columns
+        }
+    return job
+
+
+def _py(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+# --------------------------
+# Worker process
+# --------------------------
+
+_worker_db = None
+
+
+def _init_worker(db_path, measure_memory=False):
+    """Per-process setup: one DB connection, warm fonts, optional memory tracking."""
+    global _worker_db
+    if db_path:
+        _worker_db = HealthDatabase(db_path, pool_size=1)
+    if measure_memory:
+        tracemalloc.start()
+    # Loads the core font metrics and page template once per process
+    render_report({})
+
+
+def _record_for(job):
+    if "user_id" in job:
+        profile = _worker_db.load_profile(job["user_id"]) or {}
+        since = (datetime.now() - timedelta(days=HISTORY_DAYS)).strftime("%Y-%m-%d")
+        dates, columns = _worker_db.load_metric_rows(job["user_id"], since=since)
+        ai_summary = ""
+    else:
+        profile, dates, columns = job["profile"], job["dates"], job["columns"]
+        ai_summary = job.get("ai_summary", "")
+    store = MetricStore()
+    store.extend(dates, **columns)
+    return report_record(profile, store, ai_summary)
+
+
+def render_job(job):
+    """Render one patient's report. Returns ``(id, pdf_bytes, seconds, peak_bytes)``;
+    ``peak_bytes`` is None unless the worker measures memory."""
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    pdf_data = render_report(_record_for(job))
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if tracing else None
+    return job["id"], pdf_data, elapsed, peak
+
+
+# --------------------------
+# Output
+# --------------------------
+
+def safe_filename(patient_id):
+    """File name for a patient id; ids that had to be changed get a short hash
+    of the original, so e.g. "a b" and "a_b" don't end up in the same file."""
+    raw = str(patient_id)
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", raw).strip("._")
+    if name != raw:
+        name = f"{name or 'patient'}-{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:8]}"
+    return name
+
+
+class ReportSink:
+    """Writes finished PDFs into a directory, or into a zip when ``out`` ends in .zip."""
+
+    def __init__(self, out):
+        self.out = out
+        self._zip = None
+        self._names = set()
+        if out.lower().endswith(".zip"):
+            directory = os.path.dirname(out)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._zip = zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            os.makedirs(out, exist_ok=True)
+
+    def write(self, patient_id, pdf_data):
+        name = f"{safe_filename(patient_id)}.pdf"
+        # Case-insensitive, like the file systems the exports get unpacked on
+        if name.lower() in self._names:
+            raise ValueError(f"Another patient's report is already named {name}")
+        self._names.add(name.lower())
+        if self._zip is not None:
+            self._zip.writestr(name, pdf_data)
+        else:
+            with open(os.path.join(self.out, name), "wb") as f:
+                f.write(pdf_data)
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+
+
+# --------------------------
+# Engine
+# --------------------------
+
+def run_batch(jobs, out, db_path=None, workers=None, max_in_flight=None, progress=None,
+              measure_memory=False):
+    """Render every job in a process pool and stream the PDFs to ``out``.
+
+    Only ``max_in_flight`` jobs are queued at once so large exports never hold
+    every report in memory. Returns throughput stats, plus per-report memory
+    stats with ``measure_memory``.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4
+    sink = ReportSink(out)
+    stats = {"reports": 0, "failed": 0, "bytes": 0, "errors": {}}
+    seconds, peaks = [], []
+    started = time.perf_counter()
+
+    def collect(done, pending):
+        for future in done:
+            patient_id = pending.pop(future)
+            try:
+                _, pdf_data, elapsed, peak = future.result()
+                sink.write(patient_id, pdf_data)
+            except Exception as e:
+                stats["failed"] += 1
+                stats["errors"][patient_id] = str(e)
+                continue
+            stats["reports"] += 1
+            stats["bytes"] += len(pdf_data)
+            seconds.append(elapsed)
+            if peak is not None:
+                peaks.append(peak)
+            if progress:
+                progress(stats["reports"] + stats["failed"])
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(db_path, measure_memory)) as pool:
+            pending = {}
+            for job in jobs:
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done, pending)
+                pending[pool.submit(render_job, job)] = job["id"]
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done, pending)
+    finally:
+        sink.close()
+
+    wall = time.perf_counter() - started
+    stats.update(
+        workers=workers,
+        wall_s=round(wall, 3),
+        reports_per_s=round(stats["reports"] / wall, 2) if wall else None,
+        render_ms_avg=round(1000 * sum(seconds) / len(seconds), 2) if seconds else None,
+        peak_kb_avg=round(sum(peaks) / len(peaks) / 1024, 1) if peaks else None,
+        peak_kb_max=round(max(peaks) / 1024, 1) if peaks else None,
+    )
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render health report PDFs for many patients.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db", help="HealthAI SQLite database (renders every saved profile)")
+    source.add_argument("--input", help="JSON or CSV file of patients")
+    parser.add_argument("--user", action="append", help="Only these user ids (with --db)")
+    parser.add_argument("--out", required=True, help="Output directory, or a .zip file")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--measure-memory", action="store_true",
+                        help="Report peak memory per report (slower; for benchmarking)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        jobs = jobs_from_database(args.db, args.user)
+    elif args.input.lower().endswith(".csv"):
+        jobs = jobs_from_csv(args.input)
+    else:
+        jobs = jobs_from_json(args.input)
+
+    stats = run_batch(jobs, args.out, db_path=args.db, workers=args.workers,
+                      measure_memory=args.measure_memory)
+    print(json.dumps(stats, indent=2, default=str))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,675 @@
+# End-to-end load test for app.py
+#
+# Drives complete user sessions headlessly through Streamlit's AppTest: profile
+# save, chat, symptom check, treatment plan, the three disease logs, bulk
+# metrics, the AI report summary and PDF export. LLM calls go to the stub
+# backend (llm_providers.StubProvider), optionally replaying a recording made
+# with LLM_RECORD_PATH / --record, with configurable synthetic latency, so runs
+# need no network access and are repeatable.
+#
+# Reports per-section p50/p95 rerun time, time until the result is shown and
+# page payload per rerun (the serialized size of all elements the script run
+# sent, i.e. what goes over the websocket), memory per session and sessions/sec
+# at N concurrent users. Results can be
+# saved as a JSON baseline; a later run compared against it exits non-zero
+# when anything regressed beyond the tolerance.
+#
+#     python benchmark.py --users 4 --sessions 20 --latency 0.2 --save-baseline .bench/baseline.json
+#     python benchmark.py --users 4 --sessions 20 --latency 0.2 --baseline .bench/baseline.json
+#     python benchmark.py --backend watsonx --sessions 1 --record .bench/recording.jsonl
+#     python benchmark.py --startup 5 --sessions 0
+#     python benchmark.py --interactions 20 --sessions 0
+#
+# --startup N starts N fresh interpreters with -X importtime, renders the
+# first page in each and reports time to first render, total import time, the
+# packages that cost the most and which heavy dependencies got loaded.
+#
+# --interactions N changes a widget N times (asthma severity slider, report
+# range type, bulk entry data editor) and reports server CPU per change, once
+# rerunning the whole script and once only the fragment that owns the widget,
+# as the browser requests it.
+
+
+import argparse
+import dataclasses
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from llm_metrics import percentile
+from metric_store import METRICS
+from storage import HealthDatabase
+
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+SECTIONS = ("profile", "chat", "symptoms", "treatment", "glucose", "bp", "asthma", "bulk_metrics",
+            "reports", "pdf")
+# Metrics where lower is better; sessions_per_s is compared the other way round
+COMPARED = ("rerun_p50_ms", "rerun_p95_ms", "done_p50_ms", "done_p95_ms", "payload_kb_p50")
+# Differences below this many ms (or KB) are noise, whatever the percentage
+ABSOLUTE_SLACK = 5.0
+# Dependencies the first page (profile/settings shell) should not need
+HEAVY_MODULES = ("pandas", "pyarrow", "plotly.express", "fpdf", "langchain_ibm", "ibm_watsonx_ai",
+                 "ibm_watson_machine_learning", "transformers")
+
+
+class BenchError(RuntimeError):
+    pass
+
+
+def load_secrets_file(path=".streamlit/secrets.toml"):
+    if not os.path.exists(path):
+        return {}
+    import tomllib
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def share_script_cache():
+    """Compile app.py once for all sessions, like the Streamlit server does.
+
+    AppTest compiles the script on every run, which would both inflate rerun
+    times and call ast.parse from several threads at once (not thread-safe on
+    Python 3.11).
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    shared = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared
+
+
+def seed_history(db, user_id, days, seed):
+    """Give the user ``days`` of metric history so charts and trends have data."""
+    if not days:
+        return
+    rng = random.Random(seed)
+    today = datetime.now()
+    dates = [(today - timedelta(days=days - i)).strftime("%Y-%m-%d") for i in range(days)]
+    ranges = {"heart_rates": (60, 100), "glucose_levels": (80, 160), "peak_flow": (300, 600), "hba1c": (5, 8)}
+    columns = {metric: [round(rng.uniform(*ranges.get(metric, (1, 10))), 1) for _ in dates] for metric in METRICS}
+    db.add_metric_rows(user_id, dates, columns)
+
+
+# --------------------------
+# One headless session
+# --------------------------
+
+# AppTest swaps process globals (the runtime instance, st.secrets) in and out
+# around every script run, so runs from different sessions can't overlap.
+# Sessions still interleave run by run, and their background jobs and LLM
+# calls run concurrently.
+_RUN_LOCK = threading.Lock()
+
+
+def page_payload(at):
+    """(bytes, elements) of everything the last script run rendered."""
+    size = count = 0
+    nodes = [at._tree]
+    while nodes:
+        node = nodes.pop()
+        children = getattr(node, "children", None)
+        if children is not None:
+            nodes.extend(children.values())
+        elif getattr(node, "proto", None) is not None:
+            size += node.proto.ByteSize()
+            count += 1
+    return size, count
+
+
+class BenchSession:
+    """An AppTest session that times every script run by section."""
+
+    def __init__(self, user_id, secrets, index, timeout=60, poll_interval=0.05):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        for key, value in secrets.items():
+            self.at.secrets[key] = value
+        self.at.query_params["uid"] = user_id
+        self.section = "start"
+        self.reruns = defaultdict(list)  # section -> seconds per script run
+        self.payloads = defaultdict(list)  # section -> (bytes, elements) per script run
+        self.carried_states = []  # widgets outside the last rerun fragment
+        self.done = {}  # section -> seconds until the result was shown
+
+    def run(self, widget=None):
+        with _RUN_LOCK:
+            started = time.perf_counter()
+            (widget or self.at).run()
+            self.reruns[self.section].append(time.perf_counter() - started)
+        if self.at.exception:
+            raise BenchError(f"{self.section}: {self.at.exception[0].message}")
+        self.payloads[self.section].append(page_payload(self.at))
+
+    def button(self, label=None, key=None):
+        for button in self.at.button:
+            if (key is not None and button.key == key) or (label is not None and button.label == label):
+                return button
+        raise BenchError(f"{self.section}: no button {label or key!r}")
+
+    def markdown_contains(self, text):
+        return any(text in m.value for m in self.at.markdown)
+
+    def step(self, section, action, done=None):
+        """Run ``action`` and poll until ``done()`` is true; both are timed."""
+        self.section = section
+        started = time.perf_counter()
+        action()
+        deadline = started + self.timeout
+        while done is not None and not done():
+            if time.perf_counter() > deadline:
+                raise BenchError(f"{section}: no result after {self.timeout}s")
+            time.sleep(self.poll_interval)
+            self.run()
+        self.done[section] = time.perf_counter() - started
+
+    def navigate(self, section):
+        self.run(self.button(key=f"btn_{section}").click())
+
+    def widget(self, kind, label=None, key=None):
+        for widget in getattr(self.at, kind):
+            if (key is not None and widget.key == key) or (label is not None and widget.label == label):
+                return widget
+        raise BenchError(f"{self.section}: no {kind} {label or key!r}")
+
+    def timed_rerun(self, widget_id=None, fragment=False, value=None):
+        """Rerun after a change to ``widget_id``; returns (cpu_s, wall_s, fragment_run).
+
+        With ``fragment`` only the fragment the widget belongs to runs (the
+        whole script if it isn't in one). ``value`` replaces the widget's
+        string value, for widgets AppTest can't set (the data editor).
+        """
+        states = self.at._tree.get_widget_states()
+        # After a fragment run the tree only has the fragment's elements; the
+        # browser still sends the values of all the other widgets
+        present = {state.id for state in states.widgets}
+        states.widgets.extend(state for state in self.carried_states if state.id not in present)
+        if value is not None:
+            for state in states.widgets:
+                if state.id == widget_id:
+                    state.string_value = value
+                    break
+            else:
+                states.widgets.add(id=widget_id, string_value=value)
+        fragment_id = getattr(_fragments, "owners", {}).get(widget_id) if fragment else None
+        _fragments.request = [fragment_id] if fragment_id else None
+        try:
+            with _RUN_LOCK:
+                started, cpu = time.perf_counter(), time.process_time()
+                self.at._run(states)
+                cpu, wall = time.process_time() - cpu, time.perf_counter() - started
+        finally:
+            _fragments.request = None
+        if self.at.exception:
+            raise BenchError(f"{self.section}: {self.at.exception[0].message}")
+        owners = _fragments.owners
+        self.carried_states = [state for state in states.widgets
+                               if fragment_id and owners.get(state.id) != fragment_id]
+        return cpu, wall, fragment_id is not None
+
+
+def run_scenario(session):
+    """Walk through every section once, like a user trying out the whole app."""
+    s, at, i = session, session.at, session.index
+
+    def save_profile():
+        s.run()
+        at.text_input[0].input(f"Bench User {i}")
+        at.number_input[0].set_value(25 + i % 50)
+        at.number_input[1].set_value(160 + i % 30)
+        at.number_input[2].set_value(55 + i % 40)
+        s.run(s.button("Save Profile").click())
+        s.run()
+
+    s.step("profile", save_profile)
+
+    def send_chat():
+        s.navigate("chat")
+        s.chat_before = len(at.session_state.messages)
+        at.text_input[0].input(f"I have had a headache for {i % 5 + 1} days, what should I do?")
+        s.run(s.button("Send").click())
+
+    s.step("chat", send_chat, lambda: len(at.session_state.messages) >= s.chat_before + 2)
+
+    def check_symptoms():
+        s.navigate("symptoms")
+        at.text_area[0].input(f"fever and sore throat since {i % 4 + 1} days")
+        s.run(s.button("Check Symptoms").click())
+
+    s.step("symptoms", check_symptoms, lambda: s.markdown_contains("Diagnosis Results"))
+
+    def plan_treatment():
+        s.navigate("treatment")
+        at.text_input[0].input("hypertension")
+        s.run(s.button("Generate Treatment Plan").click())
+
+    s.step("treatment", plan_treatment, lambda: s.markdown_contains("Personalized Treatment Plan"))
+
+    def log_reading(condition, fill, label):
+        def action():
+            if condition == "Diabetes":
+                s.navigate("diseases")
+            select = next(b for b in at.selectbox if b.label == "Select Chronic Condition")
+            s.run(select.set_value(condition))
+            fill()
+            s.run(s.button(label).click())
+        return action
+
+    # Readings outside the normal range, so each one asks the LLM for advice
+    advice_shown = lambda: s.markdown_contains("AI Health Advice")
+    s.step("glucose", log_reading("Diabetes", lambda: at.number_input(key="glucose").set_value(180 + i % 50),
+                                  "✅ Log Glucose Reading"), advice_shown)
+    s.step("bp", log_reading("Hypertension", lambda: at.number_input(key="sys").set_value(145 + i % 20),
+                             "✅ Log Blood Pressure"), advice_shown)
+    s.step("asthma", log_reading("Asthma", lambda: (at.text_area[0].input("pollen"),
+                                                    at.slider(key="severity_slider").set_value(5 + i % 4)),
+                                 "✅ Log Asthma Episode"), advice_shown)
+
+    def add_bulk_metrics():
+        s.navigate("reports")
+        s.run(s.button("➕ Add Bulk Metrics").click())
+
+    s.step("bulk_metrics", add_bulk_metrics)
+    s.step("reports", lambda: s.run(s.button("🧠 Generate Enhanced AI Report Summary").click()),
+           lambda: bool(at.session_state.ai_summary))
+
+    def pdf_ready():
+        return any(getattr(e, "proto", None) is not None and e.proto.label == "Export PDF"
+                   for e in at.get("download_button"))
+
+    s.step("pdf", lambda: s.run(s.button("📄 Prepare PDF Report").click()), pdf_ready)
+    return session
+
+
+# --------------------------
+# Load test
+# --------------------------
+
+def bench_secrets(args, db_path):
+    secrets = load_secrets_file() if args.backend != "stub" else {}
+    secrets.update({
+        "LLM_BACKEND": args.backend,
+        "HEALTH_DB_PATH": db_path,
+        "RESPONSE_CACHE_PATH": "memory",
+        "LLM_METRICS_PATH": "none",
+        "JOB_WORKERS": args.job_workers,
+        # The benchmark measures the app, not the per-user rate limits
+        "LLM_USER_RATE": 1000,
+        "LLM_GLOBAL_RATE": 10000,
+        "STUB_LATENCY_S": args.latency,
+    })
+    if args.replay:
+        secrets["STUB_REPLAY_PATH"] = args.replay
+    if args.record:
+        secrets["LLM_RECORD_PATH"] = args.record
+    return secrets
+
+
+def summarize(sessions):
+    reruns, done, payloads = defaultdict(list), defaultdict(list), defaultdict(list)
+    for session in sessions:
+        for section, values in session.reruns.items():
+            reruns[section].extend(values)
+        for section, values in session.payloads.items():
+            payloads[section].extend(values)
+        for section, value in session.done.items():
+            done[section].append(value)
+    summary = {}
+    for section in SECTIONS:
+        r = sorted(v * 1000 for v in reruns.get(section, ()))
+        d = sorted(v * 1000 for v in done.get(section, ()))
+        sizes = sorted(size / 1024 for size, _ in payloads.get(section, ()))
+        elements = sorted(count for _, count in payloads.get(section, ()))
+        summary[section] = {
+            "reruns": len(r),
+            "rerun_p50_ms": percentile(r, 50, 2),
+            "rerun_p95_ms": percentile(r, 95, 2),
+            "done_p50_ms": percentile(d, 50, 2),
+            "done_p95_ms": percentile(d, 95, 2),
+            "payload_kb_p50": percentile(sizes, 50, 2),
+            "elements_p50": percentile(elements, 50, 2),
+        }
+    return summary
+
+
+def run_load(args):
+    """Run ``args.sessions`` full sessions on ``args.users`` concurrent threads."""
+    workdir = tempfile.mkdtemp(prefix="healthai-bench-")
+    db_path = os.path.join(workdir, "bench.sqlite3")
+    secrets = bench_secrets(args, db_path)
+    db = HealthDatabase(db_path)
+    share_script_cache()
+
+    def one(index):
+        user_id = uuid.uuid4().hex
+        seed_history(db, user_id, args.history_days, seed=index)
+        return run_scenario(BenchSession(user_id, secrets, index, timeout=args.step_timeout))
+
+    # Imports, caches and worker pools are warmed up outside the measurement
+    for index in range(args.warmup):
+        one(-1 - index)
+
+    sessions, errors = [], []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        futures = [pool.submit(one, index) for index in range(args.sessions)]
+        for future in as_completed(futures):
+            try:
+                sessions.append(future.result())
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+    wall = time.perf_counter() - started
+
+    result = {
+        "sections": summarize(sessions),
+        "sessions": len(sessions),
+        "failed": len(errors),
+        "errors": errors[:10],
+        "wall_s": round(wall, 3),
+        "sessions_per_s": round(len(sessions) / wall, 3) if wall else None,
+    }
+    sessions.clear()
+    if args.memory_sessions:
+        result["memory_kb_per_session"] = measure_memory(one, args.memory_sessions, offset=args.sessions)
+    return result
+
+
+def measure_memory(one, count, offset=0):
+    """Memory still held per finished session (session state, caches, logs)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [one(offset + i) for i in range(count)]
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return round((after - before) / count / 1024, 1)
+
+
+# --------------------------
+# Cold start
+# --------------------------
+
+STARTUP_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+for key, value in json.loads(sys.argv[2]).items():
+    at.secrets[key] = value
+at.run()
+print(json.dumps({
+    "first_render_s": time.perf_counter() - started,
+    "error": at.exception[0].message if at.exception else None,
+    "loaded": [m for m in json.loads(sys.argv[3]) if m in sys.modules],
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Total import time and self time per top-level package (microseconds)."""
+    packages, total = defaultdict(int), 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        self_us = int(self_us)
+        packages[name.strip().split(".")[0]] += self_us
+        total += self_us
+    return total, packages
+
+
+def run_startup(args, runs, top=15):
+    """Time ``runs`` cold starts of the app in fresh interpreters."""
+    workdir = tempfile.mkdtemp(prefix="healthai-startup-")
+    secrets = bench_secrets(args, os.path.join(workdir, "startup.sqlite3"))
+    renders, imports, packages, loaded, errors = [], [], defaultdict(list), set(), []
+    for _ in range(runs):
+        child = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_CHILD, APP_PATH,
+             json.dumps(secrets), json.dumps(HEAVY_MODULES)],
+            capture_output=True, text=True, cwd=os.path.dirname(APP_PATH),
+        )
+        try:
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            errors.append(child.stderr.strip().splitlines()[-1:] or f"exit code {child.returncode}")
+            continue
+        if result["error"]:
+            errors.append(result["error"])
+        total, by_package = parse_importtime(child.stderr)
+        renders.append(result["first_render_s"] * 1000)
+        imports.append(total / 1000)
+        for name, us in by_package.items():
+            packages[name].append(us / 1000)
+        loaded.update(result["loaded"])
+    medians = {name: sorted(values)[len(values) // 2] for name, values in packages.items()}
+    return {
+        "runs": len(renders),
+        "errors": errors,
+        "first_render_ms_p50": percentile(sorted(renders), 50, 2),
+        "first_render_ms_max": round(max(renders), 2) if renders else None,
+        "import_ms_p50": percentile(sorted(imports), 50, 2),
+        "top_imports_ms": {name: round(ms, 1) for name, ms in
+                           sorted(medians.items(), key=lambda p: -p[1])[:top]},
+        "heavy_modules_loaded": sorted(loaded),
+    }
+
+
+# --------------------------
+# Per-interaction CPU
+# --------------------------
+
+_fragments = threading.local()  # owners: widget id -> fragment id; request: fragment ids to run
+
+
+def enable_fragment_runs():
+    """Let sessions rerun a single fragment, as the browser does for its widgets.
+
+    AppTest always reruns the whole script. The patched script runner records
+    which fragment every widget was rendered in and, when asked to, requests a
+    fragment-scoped rerun instead.
+    """
+    from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequests
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    class FragmentScriptRunner(local_script_runner.LocalScriptRunner):
+        def request_rerun(self, rerun_data):
+            fragment_ids = getattr(_fragments, "request", None)
+            if fragment_ids:
+                rerun_data = dataclasses.replace(rerun_data, fragment_id_queue=list(fragment_ids),
+                                                 is_fragment_scoped_rerun=True)
+                # The runner was created with a full-app rerun pending, which
+                # would swallow the fragment-scoped one; it hasn't started yet
+                self._requests = ScriptRequests()
+            return super().request_rerun(rerun_data)
+
+        def run(self, *args, **kwargs):
+            tree = super().run(*args, **kwargs)
+            owners = {}
+            for msg in self.forward_msgs():
+                if msg.HasField("delta") and msg.delta.HasField("new_element"):
+                    element = msg.delta.new_element
+                    widget_id = getattr(getattr(element, element.WhichOneof("type")), "id", "")
+                    if widget_id:
+                        owners[widget_id] = msg.delta.fragment_id or None
+            if getattr(_fragments, "request", None):
+                _fragments.owners.update(owners)
+            else:
+                _fragments.owners = owners
+            return tree
+
+    app_test.LocalScriptRunner = FragmentScriptRunner
+
+
+def data_editor_id(at):
+    nodes = [at._tree]
+    while nodes:
+        node = nodes.pop()
+        children = getattr(node, "children", None)
+        if children is not None:
+            nodes.extend(children.values())
+        elif getattr(node, "type", None) == "dataframe" and node.proto.id:
+            return node.proto.id
+    raise BenchError("reports: no data editor")
+
+
+def run_interactions(args):
+    """Server CPU per widget change: whole-script rerun vs. fragment rerun."""
+    workdir = tempfile.mkdtemp(prefix="healthai-interactions-")
+    db_path = os.path.join(workdir, "bench.sqlite3")
+    secrets = bench_secrets(args, db_path)
+    db = HealthDatabase(db_path)
+    share_script_cache()
+    enable_fragment_runs()
+    user_id = uuid.uuid4().hex
+    db.save_profile(user_id, {"name": "Bench User", "age": 40, "gender": "Other",
+                              "height": 170, "weight": 70, "bmi": 24.2})
+    seed_history(db, user_id, args.history_days, seed=0)
+    s = BenchSession(user_id, secrets, 0, timeout=args.step_timeout)
+    s.run()
+
+    def asthma_severity(i):
+        return s.widget("slider", key="severity_slider").set_value(2 + i % 8).id, None
+
+    def range_type(i):
+        return s.widget("selectbox", label="Select Range Type").set_value(("By Week", "By Day")[i % 2]).id, None
+
+    def data_editor(i):
+        edits = {"edited_rows": {"0": {"Heart Rate (bpm)": str(60 + i % 40)}}, "added_rows": [], "deleted_rows": []}
+        return data_editor_id(s.at), json.dumps(edits)
+
+    def open_asthma():
+        s.navigate("diseases")
+        s.run(s.widget("selectbox", label="Select Chronic Condition").set_value("Asthma"))
+
+    def open_reports():
+        s.navigate("reports")
+        s.run(s.widget("selectbox", label="Select Range Type").set_value("By Day"))
+
+    results = {}
+    for name, prepare, change in (("asthma_severity", open_asthma, asthma_severity),
+                                  ("range_type", open_reports, range_type),
+                                  ("data_editor", open_reports, data_editor)):
+        s.section = name
+        result = {}
+        for scope in ("full", "fragment"):
+            prepare()
+            cpu, wall, fragment_runs = [], [], 0
+            for i in range(args.interactions + 1):
+                widget_id, value = change(i)
+                c, w, ran_fragment = s.timed_rerun(widget_id, fragment=scope == "fragment", value=value)
+                if i:  # the first change warms up caches
+                    cpu.append(c * 1000)
+                    wall.append(w * 1000)
+                    fragment_runs += ran_fragment
+            s.timed_rerun()  # back to a complete page
+            result[f"{scope}_cpu_ms_p50"] = percentile(sorted(cpu), 50, 2)
+            result[f"{scope}_cpu_ms_p95"] = percentile(sorted(cpu), 95, 2)
+            result[f"{scope}_wall_ms_p50"] = percentile(sorted(wall), 50, 2)
+        result["in_fragment"] = fragment_runs == args.interactions
+        results[name] = result
+    return results
+
+
+# --------------------------
+# Baselines
+# --------------------------
+
+def compare(current, baseline, tolerance):
+    """Regressions of ``current`` against ``baseline`` beyond ``tolerance`` (fraction)."""
+    regressions = []
+
+    def worse(name, now, then, higher_is_better=False):
+        if now is None or then is None:
+            return
+        delta = then - now if higher_is_better else now - then
+        if delta > max(abs(then) * tolerance, 0 if higher_is_better else ABSOLUTE_SLACK):
+            regressions.append(f"{name}: {then} -> {now}")
+
+    for section, metrics in baseline["results"].get("sections", {}).items():
+        for metric in COMPARED:
+            worse(f"{section}.{metric}", current["sections"].get(section, {}).get(metric), metrics.get(metric))
+    worse("sessions_per_s", current.get("sessions_per_s"), baseline["results"].get("sessions_per_s"),
+          higher_is_better=True)
+    worse("memory_kb_per_session", current.get("memory_kb_per_session"),
+          baseline["results"].get("memory_kb_per_session"))
+    for metric in ("first_render_ms_p50", "import_ms_p50"):
+        worse(f"startup.{metric}", current.get("startup", {}).get(metric),
+              baseline["results"].get("startup", {}).get(metric))
+    for name, metrics in baseline["results"].get("interactions", {}).items():
+        worse(f"interactions.{name}.fragment_cpu_ms_p50",
+              current.get("interactions", {}).get(name, {}).get("fragment_cpu_ms_p50"),
+              metrics.get("fragment_cpu_ms_p50"))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the HealthAI app headlessly.")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent sessions")
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions to run in total (0: skip the load test)")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured sessions run first")
+    parser.add_argument("--memory-sessions", type=int, default=3, help="Sessions used to measure memory (0: skip)")
+    parser.add_argument("--history-days", type=int, default=90, help="Days of metric history per user")
+    parser.add_argument("--backend", default="stub", choices=("stub", "watsonx", "local"),
+                        help="LLM backend (non-stub backends read .streamlit/secrets.toml)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Synthetic stub latency per call (s)")
+    parser.add_argument("--replay", help="JSONL recording for the stub backend to replay")
+    parser.add_argument("--record", help="Record every LLM response to this JSONL file")
+    parser.add_argument("--job-workers", type=int, default=8, help="Background job workers")
+    parser.add_argument("--step-timeout", type=float, default=60, help="Seconds to wait for a result")
+    parser.add_argument("--startup", type=int, default=0, help="Cold starts to measure with -X importtime")
+    parser.add_argument("--interactions", type=int, default=0,
+                        help="Widget changes to time per interaction (full vs. fragment rerun)")
+    parser.add_argument("--save-baseline", help="Write the results to this JSON baseline")
+    parser.add_argument("--baseline", help="Compare against this baseline; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("save_baseline", "baseline", "tolerance", "record")}
+    results = run_load(args) if args.sessions else {}
+    if args.startup:
+        results["startup"] = run_startup(args, args.startup)
+    if args.interactions:
+        results["interactions"] = run_interactions(args)
+    report = {"config": config, "results": results, "at": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    status = 1 if results.get("failed") or results.get("startup", {}).get("errors") else 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            report["config_mismatch"] = baseline.get("config")
+        report["regressions"] = compare(results, baseline, args.tolerance)
+        status = status or (1 if report["regressions"] else 0)
+    if args.save_baseline:
+        directory = os.path.dirname(args.save_baseline)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2, default=str))
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+# Vectorized bulk metric ingestion
+#
+# Validates the "Log Multiple Metrics at Once" data editor column by column with
+# pandas instead of row by row, then appends every valid row to the MetricStore
+# in one batch. Invalid rows are collected into a single report with the reason
+# for each row.
+
+
+import numpy as np
+import pandas as pd
+
+
+DATE_COLUMN = "Date"
+
+# Editor column -> (metric key, min, max, whole numbers only)
+BULK_COLUMNS = {
+    "Heart Rate (bpm)": ("heart_rates", 40, 140, True),
+    "Blood Glucose (mg/dL)": ("glucose_levels", 50, 200, True),
+    "Peak Flow (L/min)": ("peak_flow", 100, 800, False),
+    "HbA1c (%)": ("hba1c", 4, 12, False),
+}
+
+
+class IngestReport:
+    """Outcome of one bulk ingestion.
+
+    ``rejected`` is a DataFrame with the 1-based editor row number and the
+    reasons each rejected row was not added.
+    """
+
+    def __init__(self, added, skipped, rejected):
+        self.added = added
+        self.skipped = skipped
+        self.rejected = rejected
+
+    def __repr__(self):
+        return f"IngestReport(added={self.added}, skipped={self.skipped}, rejected={len(self.rejected)})"
+
+
+def _blank(raw):
+    return raw.isna() | (raw.astype(str).str.strip() == "")
+
+
+def validate_bulk_metrics(frame):
+    """Coerce and range-check the editor frame.
+
+    Returns ``(dates, columns, ok, empty, reasons)``: parsed dates, numeric
+    metric columns (NaN = not entered), the mask of rows to add, the mask of
+    rows with no readings at all, and a per-row reason string ("" if valid).
+    """
+    n = len(frame)
+    reasons = pd.Series([""] * n, index=frame.index, dtype=object)
+    bad = np.zeros(n, dtype=bool)
+
+    raw_dates = frame[DATE_COLUMN] if DATE_COLUMN in frame else pd.Series([None] * n, index=frame.index)
+    dates = pd.to_datetime(raw_dates, errors="coerce", format="ISO8601")
+    bad_date = dates.isna().to_numpy()
+    if bad_date.any():
+        bad |= bad_date
+        reasons = reasons.where(~bad_date, reasons + "missing or invalid date; ")
+
+    columns = {}
+    empty = np.ones(n, dtype=bool)
+    for column, (metric, low, high, whole) in BULK_COLUMNS.items():
+        if column not in frame:
+            columns[metric] = np.full(n, np.nan)
+            continue
+        raw = frame[column]
+        blank = _blank(raw).to_numpy()
+        values = pd.to_numeric(raw, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        if whole:
+            values = np.trunc(values)
+
+        not_numeric = ~blank & np.isnan(values)
+        with np.errstate(invalid="ignore"):
+            out_of_range = ~np.isnan(values) & ((values < low) | (values > high))
+
+        if not_numeric.any():
+            reasons = reasons.where(~not_numeric, reasons + f"{column} is not a number; ")
+        if out_of_range.any():
+            reasons = reasons.where(~out_of_range, reasons + f"{column} outside {low}–{high}; ")
+        bad |= not_numeric | out_of_range
+        empty &= blank
+        columns[metric] = values
+
+    # Rows with no readings at all (e.g. untouched editor rows) are skipped, not errors
+    ok = ~bad & ~empty
+    return dates, columns, ok, empty & ~bad, reasons
+
+
+def ingest_bulk_metrics(store, frame):
+    """Validate ``frame`` and append its valid rows to ``store`` in one batch."""
+    if len(frame) == 0:
+        return IngestReport(0, 0, pd.DataFrame({"Row": [], "Reason": []}))
+
+    dates, columns, ok, empty, reasons = validate_bulk_metrics(frame)
+    if ok.any():
+        store.extend(
+            dates.to_numpy()[ok],
+            **{metric: values[ok] for metric, values in columns.items()},
+        )
+
+    rejected_mask = ~ok & ~empty
+    rejected = pd.DataFrame({
+        "Row": np.flatnonzero(rejected_mask) + 1,
+        "Reason": reasons.to_numpy()[rejected_mask],
+    })
+    rejected["Reason"] = rejected["Reason"].str.rstrip("; ")
+    return IngestReport(int(ok.sum()), int(empty.sum()), rejected)
@@ -0,0 +1,154 @@
+# Chart data preparation
+#
+# Long histories are reduced on the server before they are handed to Plotly, so
+# the figure JSON sent to the browser on each rerun carries a few hundred points
+# per chart instead of every reading. Readings are first aggregated by day or
+# week as the date range grows, then downsampled with Largest-Triangle-Three-
+# Buckets (LTTB), which keeps the visual shape (peaks and dips) of the series.
+#
+# pandas and plotly are imported when the first chart is built, not when the
+# app starts: sessions that never open a chart don't pay for them.
+
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Rendered chart width in CSS pixels; more points than this can't be seen anyway
+CHART_WIDTH_PX = 900
+POINTS_PER_PIXEL = 0.5
+
+# Aggregate raw readings once the visible range exceeds these spans
+DAILY_AFTER_DAYS = 90
+WEEKLY_AFTER_DAYS = 2 * 365
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    ``x`` must be numeric and sorted. Returns the indices of the points to
+    keep (always including the first and last point).
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Average of the next bucket is the third triangle vertex
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else n
+        if next_stop <= next_start:
+            next_start, next_stop = n - 1, n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+
+        bx, by = x[start:stop], y[start:stop]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def aggregation_level(dates):
+    """'raw', 'daily' or 'weekly' depending on the span of ``dates``."""
+    if len(dates) < 2:
+        return "raw"
+    span_days = (dates.max() - dates.min()) / np.timedelta64(1, "D")
+    if span_days > WEEKLY_AFTER_DAYS:
+        return "weekly"
+    if span_days > DAILY_AFTER_DAYS:
+        return "daily"
+    return "raw"
+
+
+def prepare_series(dates, values, width_px=CHART_WIDTH_PX, level=None):
+    """Drop missing readings, aggregate and downsample one series.
+
+    Returns ``(dates, values, level)`` where ``level`` is the aggregation used
+    ('raw', 'daily' or 'weekly'), so charts can say what they show.
+    """
+    import pandas as pd
+
+    dates = np.asarray(pd.to_datetime(dates), dtype="datetime64[ns]")
+    values = np.asarray(pd.array(values, dtype="Float64").to_numpy(dtype=np.float64, na_value=np.nan))
+    present = ~np.isnan(values) & ~np.isnat(dates)
+    dates, values = dates[present], values[present]
+
+    order = np.argsort(dates, kind="stable")
+    dates, values = dates[order], values[order]
+
+    level = level or aggregation_level(dates)
+    if level in ("daily", "weekly") and len(dates):
+        freq = "D" if level == "daily" else "W"
+        grouped = pd.Series(values, index=pd.DatetimeIndex(dates)).resample(freq).mean().dropna()
+        dates, values = grouped.index.to_numpy(), grouped.to_numpy()
+
+    max_points = max(int(width_px * POINTS_PER_PIXEL), 3)
+    if len(dates) > max_points:
+        keep = lttb(dates.astype(np.int64).astype(np.float64), values, max_points)
+        dates, values = dates[keep], values[keep]
+    return dates, values, level
+
+
+def line_chart(dates, values, title, y_label, x_label="Date", y_range=None,
+               width_px=CHART_WIDTH_PX, template=None):
+    """px.line over a prepared series, with markers only when they stay readable."""
+    import pandas as pd
+    import plotly.express as px
+
+    dates, values, level = prepare_series(dates, values, width_px=width_px)
+    if level != "raw":
+        title = f"{title} ({level} average)"
+    df = pd.DataFrame({x_label: dates, y_label: values})
+    fig = px.line(df, x=x_label, y=y_label, title=title, markers=len(df) <= 60)
+    layout = {}
+    if y_range is not None:
+        layout["yaxis_range"] = y_range
+    if template is not None:
+        layout["template"] = template
+    if layout:
+        fig.update_layout(**layout)
+    return fig
+
+
+class FigureCache:
+    """Bounded LRU of built figures, keyed on the data version they were built from.
+
+    Keys should include the store's ``uid`` and ``version`` plus anything that
+    changes the figure (metric, range, width), so unrelated widget interactions
+    reuse the figure and any data change builds a new one.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._figures = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            fig = self._figures.get(key)
+            if fig is not None:
+                self._figures.move_to_end(key)
+                self._stats["hits"] += 1
+                return fig
+            self._stats["misses"] += 1
+
+        fig = build()
+        with self._lock:
+            self._figures[key] = fig
+            while len(self._figures) > self.max_entries:
+                self._figures.popitem(last=False)
+                self._stats["evictions"] += 1
+        return fig
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._figures))
@@ -0,0 +1,145 @@
+# Rule-based classification of disease-log readings
+#
+# Glucose bands, ACC/AHA blood pressure categories and asthma severity tiers,
+# each with short templated guidance. Logging a reading is classified locally
+# in microseconds; the LLM is only asked for advice when a reading is
+# borderline or abnormal, or when the user explicitly asks for it.
+#
+# This is general guidance, not a diagnosis. Thresholds follow common adult
+# reference ranges (ADA glucose targets, 2017 ACC/AHA blood pressure
+# guideline) and don't account for individual treatment targets.
+
+
+# Levels in increasing order of concern; everything above "normal" goes to the LLM
+LEVELS = ("normal", "borderline", "abnormal", "urgent")
+
+
+class Assessment:
+    """Result of classifying one reading."""
+
+    def __init__(self, kind, category, level, guidance):
+        self.kind = kind
+        self.category = category
+        self.level = level
+        self.guidance = guidance
+
+    @property
+    def needs_ai(self):
+        return self.level != "normal"
+
+    @property
+    def icon(self):
+        return {"normal": "🟢", "borderline": "🟡", "abnormal": "🟠", "urgent": "🔴"}[self.level]
+
+    def to_dict(self):
+        return {"kind": self.kind, "category": self.category, "level": self.level, "guidance": self.guidance}
+
+    def __repr__(self):
+        return f"Assessment({self.kind}: {self.category}, level={self.level})"
+
+
+URGENT_CARE = "Seek medical care now or call your local emergency number if you feel unwell."
+
+
+# --------------------------
+# Blood glucose (mg/dL)
+# --------------------------
+
+# (upper bound exclusive, category, level, guidance)
+GLUCOSE_BANDS = [
+    (54, "Very low (level 2 hypoglycemia)", "urgent",
+     "Take 15 g of fast-acting sugar now (juice, glucose tablets), recheck in 15 minutes, "
+     "and get help if it doesn't rise. " + URGENT_CARE),
+    (70, "Low (hypoglycemia)", "abnormal",
+     "Have 15 g of fast-acting carbohydrate and recheck in 15 minutes. "
+     "Tell your doctor if lows happen often."),
+    (100, "In range", "normal",
+     "This is within the usual fasting range. Keep up your current routine and keep logging."),
+    (140, "Above fasting target", "borderline",
+     "Fine after a meal, but above target if you were fasting. Note when you last ate "
+     "and watch for a pattern over the next readings."),
+    (200, "High", "abnormal",
+     "Above the usual after-meal target. Drink water, take a short walk if you can, "
+     "and follow your care plan for high readings."),
+    (300, "Very high", "abnormal",
+     "Well above target. Check for ketones if you have type 1 diabetes, take medication as "
+     "prescribed and contact your doctor if it stays this high."),
+    (float("inf"), "Dangerously high", "urgent",
+     "Readings this high can be dangerous, especially with nausea, thirst or confusion. " + URGENT_CARE),
+]
+
+
+def classify_glucose(value):
+    value = float(value)
+    for upper, category, level, guidance in GLUCOSE_BANDS:
+        if value < upper:
+            return Assessment("glucose", category, level, guidance)
+
+
+# --------------------------
+# Blood pressure (mmHg), 2017 ACC/AHA categories
+# --------------------------
+
+BP_GUIDANCE = {
+    "Low": ("borderline",
+            "Lower than usual. If you feel dizzy or faint, sit down, drink water and let your doctor know."),
+    "Normal": ("normal",
+               "Healthy blood pressure. Keep up regular activity and a low-salt diet."),
+    "Elevated": ("borderline",
+                 "Slightly above normal. Cutting salt, staying active and limiting alcohol can bring it down."),
+    "Stage 1 hypertension": ("abnormal",
+                             "In the stage 1 range. Recheck after resting 5 minutes and discuss repeated "
+                             "readings like this with your doctor."),
+    "Stage 2 hypertension": ("abnormal",
+                             "In the stage 2 range. Take medication as prescribed and contact your doctor "
+                             "soon if readings stay this high."),
+    "Hypertensive crisis": ("urgent",
+                            "Rest for 5 minutes and measure again. If it is still this high, or you have chest "
+                            "pain, shortness of breath, headache or vision changes: " + URGENT_CARE),
+}
+
+
+def classify_bp(systolic, diastolic):
+    systolic, diastolic = float(systolic), float(diastolic)
+    if systolic > 180 or diastolic > 120:
+        category = "Hypertensive crisis"
+    elif systolic >= 140 or diastolic >= 90:
+        category = "Stage 2 hypertension"
+    elif systolic >= 130 or diastolic >= 80:
+        category = "Stage 1 hypertension"
+    elif systolic >= 120:
+        category = "Elevated"
+    elif systolic < 90 or diastolic < 60:
+        category = "Low"
+    else:
+        category = "Normal"
+    level, guidance = BP_GUIDANCE[category]
+    return Assessment("bp", category, level, guidance)
+
+
+# --------------------------
+# Asthma episode severity (1-10 self-rating)
+# --------------------------
+
+ASTHMA_TIERS = [
+    # (max severity, category, level, guidance)
+    (3, "Mild", "normal",
+     "Mild episode. Use your reliever inhaler as prescribed and avoid the trigger where you can."),
+    (6, "Moderate", "borderline",
+     "Moderate episode. Follow your asthma action plan; if you need your reliever more than "
+     "usual this week, book a review with your doctor."),
+    (8, "Severe", "abnormal",
+     "Severe episode. Use your reliever now and follow the 'worsening' steps of your action plan. "
+     "Contact your doctor today."),
+    (10, "Very severe", "urgent",
+     "If you can't speak in full sentences or your reliever isn't helping: " + URGENT_CARE),
+]
+
+
+def classify_asthma(severity):
+    severity = int(severity)
+    for upper, category, level, guidance in ASTHMA_TIERS:
+        if severity <= upper:
+            return Assessment("asthma", category, level, guidance)
+    upper, category, level, guidance = ASTHMA_TIERS[-1]
+    return Assessment("asthma", category, level, guidance)
@@ -0,0 +1,214 @@
+# Chat context management
+#
+# Keeps chat prompts under a token budget. Recent turns are included verbatim
+# (newest first until the budget runs out, long replies clipped), and older
+# turns are folded into a rolling summary that is refreshed in the background
+# every few turns, so earlier context isn't simply dropped and prompt size
+# doesn't grow with the length of the conversation.
+
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Roughly 4 characters per token for English text with BPE tokenizers
+CHARS_PER_TOKEN = 4.0
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """Tokenizer-free estimate, used when no matching tokenizer is installed."""
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / CHARS_PER_TOKEN), len(_WORD_RE.findall(text)))
+
+
+class TokenCounter:
+    """Counts tokens with the model's Hugging Face tokenizer when available.
+
+    ``transformers`` is optional; without it (or if the tokenizer can't be
+    loaded) counts fall back to ``estimate_tokens``. Counts are memoized since
+    chat turns are counted again on every prompt.
+    """
+
+    def __init__(self, tokenizer_name=None, max_entries=4096):
+        self.tokenizer_name = tokenizer_name
+        self.max_entries = max_entries
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._counts = OrderedDict()
+
+    @property
+    def exact(self):
+        return self._load() is not None
+
+    def _load(self):
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                if self.tokenizer_name:
+                    try:
+                        from transformers import AutoTokenizer
+                        self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+                    except Exception:
+                        self._tokenizer = None
+            return self._tokenizer
+
+    def count(self, text):
+        text = text or ""
+        with self._lock:
+            if text in self._counts:
+                self._counts.move_to_end(text)
+                return self._counts[text]
+        tokenizer = self._load()
+        n = len(tokenizer.encode(text, add_special_tokens=False)) if tokenizer else estimate_tokens(text)
+        with self._lock:
+            self._counts[text] = n
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return n
+
+    def clip(self, text, max_tokens):
+        """Shorten ``text`` to about ``max_tokens``, keeping the beginning."""
+        if self.count(text) <= max_tokens:
+            return text
+        tokenizer = self._load()
+        if tokenizer:
+            ids = tokenizer.encode(text, add_special_tokens=False)[:max_tokens]
+            return tokenizer.decode(ids).rstrip() + " …"
+        return text[: int(max_tokens * CHARS_PER_TOKEN)].rstrip() + " …"
+
+
+def format_turns(turns):
+    return "".join(f"{role.capitalize()}: {content}\n" for role, content in turns)
+
+
+class ConversationMemory:
+    """Per-conversation state: the rolling summary and how far it reaches.
+
+    ``generation`` changes on every reset, so a summary that was still being
+    written for the old conversation is dropped instead of applied.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.summary = ""
+        self.summarized = 0  # number of leading messages covered by the summary
+        self.pending = None  # background refresh in progress
+        self.refreshes = 0
+        self.errors = 0
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+            self.generation += 1
+
+    def commit(self, generation, summary, summarized):
+        """Apply a finished refresh unless the memory was reset since it started."""
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self.summary = summary
+            self.summarized = summarized
+            self.refreshes += 1
+            return True
+
+    def __repr__(self):
+        return f"ConversationMemory(summarized={self.summarized}, refreshes={self.refreshes})"
+
+
+class ConversationManager:
+    """Builds budgeted chat context and keeps conversation summaries fresh.
+
+    ``summary_prompt(summary, turns)`` builds the prompt that folds ``turns``
+    into the previous summary. ``summarize_every`` is in turns (a user message
+    plus its reply). The most recent ``keep_recent`` messages are never folded
+    into the summary.
+    """
+
+    def __init__(self, counter, summary_prompt, budget=1024, max_turn_tokens=256, keep_recent=6,
+                 summarize_every=4, max_workers=2):
+        self.counter = counter
+        self.summary_prompt = summary_prompt
+        self.budget = budget
+        self.max_turn_tokens = max_turn_tokens
+        self.keep_recent = keep_recent
+        self.summarize_every = summarize_every
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chat-summary")
+
+    def build_context(self, memory, messages, fixed_text=""):
+        """Return ``(summary, history_text, tokens)`` for the next prompt.
+
+        ``fixed_text`` is the rest of the prompt (instructions, profile,
+        question); its tokens are taken from the budget first.
+        """
+        available = self.budget - self.counter.count(fixed_text)
+        summary = memory.summary if memory.summarized else ""
+        if summary:
+            summary = self.counter.clip(summary, max(available // 4, 32))
+            available -= self.counter.count(summary)
+
+        lines = []
+        for role, content in reversed(messages[memory.summarized:]):
+            line = f"{role.capitalize()}: {self.counter.clip(content, self.max_turn_tokens)}\n"
+            cost = self.counter.count(line)
+            if cost > available:
+                break
+            lines.append(line)
+            available -= cost
+        history = "".join(reversed(lines))
+        return summary, history, self.budget - available
+
+    def maybe_refresh(self, memory, messages, summarize):
+        """Fold older messages into the summary in the background when due.
+
+        ``summarize`` takes a prompt and returns text; it runs on a worker
+        thread, so it must not touch Streamlit state.
+        """
+        if memory.pending is not None and not memory.pending.done():
+            return False
+        upto = len(messages) - self.keep_recent
+        if upto - memory.summarized < 2 * self.summarize_every:
+            return False
+
+        turns = list(messages[memory.summarized:upto])
+        previous = memory.summary
+        generation = memory.generation
+
+        def refresh():
+            try:
+                text = summarize(self.summary_prompt(previous, turns)).strip()
+            except Exception:
+                memory.errors += 1
+                raise
+            # Dropped if the conversation was reset or cut short meanwhile
+            if text and upto <= len(messages):
+                memory.commit(generation, text, upto)
+            return text
+
+        memory.pending = self._executor.submit(refresh)
+        return True
+
+    def trim(self, memory, messages, max_messages):
+        """Drop the oldest messages beyond ``max_messages`` (they stay in the database)."""
+        overflow = len(messages) - max_messages
+        if overflow <= 0 or (memory.pending is not None and not memory.pending.done()):
+            return 0
+        del messages[:overflow]
+        if memory.summarized >= overflow:
+            memory.summarized -= overflow
+        else:
+            # Part of what was dropped was never summarized; start over
+            memory.reset()
+        return overflow
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,321 @@
+# Background job queue
+#
+# Long-running generation (chat replies, diagnoses, treatment plans, disease
+# advice, report summaries) runs on worker threads instead of the Streamlit
+# script thread. A job is a registered task name plus a JSON-serializable
+# payload; the page keeps only the job id in session state and polls for the
+# result, so reruns neither block on the job nor start it again.
+#
+# Jobs live in memory by default. With a SQLiteBroker they are kept in a local
+# database instead, so queued work survives a restart and several app
+# processes on one machine can share the queue.
+
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+
+ACTIVE = ("queued", "running")
+
+
+class Job:
+    def __init__(self, id, task, payload, owner=None, key=None, status="queued",
+                 result=None, error=None, created=None, started=None, finished=None):
+        self.id = id
+        self.task = task
+        self.payload = payload
+        self.owner = owner
+        self.key = key
+        self.status = status
+        self.result = result
+        self.error = error
+        self.created = created or time.time()
+        self.started = started
+        self.finished = finished
+
+    @property
+    def active(self):
+        return self.status in ACTIVE
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in (
+            "id", "task", "owner", "status", "error", "created", "started", "finished")}
+
+    def __repr__(self):
+        return f"Job({self.task}, {self.status}, id={self.id[:8]})"
+
+
+# --------------------------
+# Brokers
+# --------------------------
+
+class MemoryBroker:
+    """Jobs in a dict plus a FIFO of queued ids (single process)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._queue = deque()
+
+    def put(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+            self._queue.append(job.id)
+
+    def claim(self):
+        with self._lock:
+            while self._queue:
+                job = self._jobs.get(self._queue.popleft())
+                if job is not None and job.status == "queued":
+                    job.status, job.started = "running", time.time()
+                    return job
+        return None
+
+    def update(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find(self, key):
+        """Newest job with this dedupe key that is still useful (active or succeeded)."""
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.key == key and job.status != "failed":
+                    return job
+        return None
+
+    def prune(self, older_than):
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if not j.active and j.finished < older_than]:
+                del self._jobs[job_id]
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+
+class SQLiteBroker:
+    """Jobs in a local SQLite table; workers claim them with an atomic update."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        task TEXT NOT NULL,
+        owner TEXT,
+        key TEXT,
+        status TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        created REAL NOT NULL,
+        started REAL,
+        finished REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created);
+    CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (key);
+    """
+    COLUMNS = ("id", "task", "owner", "key", "status", "payload", "result", "error",
+               "created", "started", "finished")
+
+    def __init__(self, path, stale_after=600):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+            # Jobs left running by a process that died are picked up again
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running' AND started < ?",
+                (time.time() - stale_after,),
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _row_to_job(self, row):
+        if row is None:
+            return None
+        data = dict(zip(self.COLUMNS, row))
+        data["payload"] = json.loads(data["payload"])
+        data["result"] = json.loads(data["result"]) if data["result"] is not None else None
+        return Job(**data)
+
+    def put(self, job):
+        self._conn().execute(
+            f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+            (job.id, job.task, job.owner, job.key, job.status, json.dumps(job.payload), None, None,
+             job.created, None, None),
+        )
+
+    def claim(self):
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            "UPDATE jobs SET status = 'running', started = ? WHERE id = ("
+            "  SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ") AND status = 'queued' RETURNING " + ", ".join(self.COLUMNS),
+            (now,),
+        ).fetchone()
+        return self._row_to_job(row)
+
+    def update(self, job):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, key = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+            (job.status, job.key, json.dumps(job.result) if job.result is not None else None, job.error,
+             job.finished, job.id),
+        )
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._row_to_job(row)
+
+    def find(self, key):
+        row = self._conn().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE key = ? AND status != 'failed' "
+            "ORDER BY created DESC LIMIT 1", (key,)
+        ).fetchone()
+        return self._row_to_job(row)
+
+    def prune(self, older_than):
+        self._conn().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?", (older_than,)
+        )
+
+    def counts(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+# --------------------------
+# Queue
+# --------------------------
+
+class JobQueue:
+    """Runs registered tasks on a pool of worker threads.
+
+    A task is ``fn(payload, progress)`` returning a JSON-serializable result;
+    ``progress(value)`` publishes partial output (e.g. streamed text) that
+    pollers can show before the job finishes. A task registered with
+    ``reusable(result)`` only shares results that pass it with later
+    submissions of the same key (e.g. not a fallback served while the
+    provider was down).
+    """
+
+    def __init__(self, broker=None, max_workers=4, result_ttl=3600, poll_interval=0.5):
+        self.broker = broker or MemoryBroker()
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._tasks = {}
+        self._reusable = {}
+        self._progress = {}
+        self._wakeup = threading.Condition()
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "deduplicated": 0, "completed": 0, "failed": 0}
+        self._run_times = deque(maxlen=512)
+        self._workers = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def register(self, task, fn, reusable=None):
+        self._tasks[task] = fn
+        self._reusable[task] = reusable
+
+    def submit(self, task, payload, owner=None, key=None):
+        """Queue a job and return its id.
+
+        With a ``key`` (e.g. user + section + prompt hash), a matching job
+        that is still running or already succeeded with a reusable result is
+        returned instead.
+        """
+        if task not in self._tasks:
+            raise KeyError(f"Unknown task: {task}")
+        self.broker.prune(time.time() - self.result_ttl)
+        if key is not None:
+            existing = self.broker.find(key)
+            if existing is not None:
+                self._count("deduplicated")
+                return existing.id
+        job = Job(uuid.uuid4().hex, task, payload, owner=owner, key=key)
+        self.broker.put(job)
+        self._count("submitted")
+        with self._wakeup:
+            self._wakeup.notify()
+        return job.id
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, job_id):
+        return self.broker.get(job_id)
+
+    def progress(self, job_id):
+        return self._progress.get(job_id)
+
+    def _work(self):
+        while not self._stopped:
+            job = self.broker.claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            fn = self._tasks.get(job.task)
+            try:
+                if fn is None:
+                    raise KeyError(f"No handler registered for task {job.task!r}")
+                job.result = fn(job.payload, lambda value, job_id=job.id: self._progress.__setitem__(job_id, value))
+                job.status = "done"
+                self._count("completed")
+                reusable = self._reusable.get(job.task)
+                if reusable is not None and not reusable(job.result):
+                    job.key = None  # out of dedupe: the next submit tries again
+            except Exception as e:
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+                self._count("failed")
+            job.finished = time.time()
+            with self._lock:
+                self._run_times.append(job.finished - job.started)
+            self.broker.update(job)
+            self._progress.pop(job.id, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            run_times = sorted(self._run_times)
+        return dict(
+            stats,
+            broker=type(self.broker).__name__,
+            workers=len(self._workers),
+            jobs=self.broker.counts(),
+            run_s_p50=round(run_times[len(run_times) // 2], 3) if run_times else None,
+            run_s_max=round(run_times[-1], 3) if run_times else None,
+        )
+
+    def close(self):
+        self._stopped = True
+        with self._wakeup:
+            self._wakeup.notify_all()
@@ -0,0 +1,189 @@
+# Local gateway in front of the LLM provider
+#
+# Every model call from the app goes through one LLMGateway per process, which
+# - coalesces identical prompts that are already in flight (single-flight),
+# - rate limits with token buckets per user and for the whole process,
+# - bounds the number of concurrent provider requests,
+# - queues callers only as long as their deadline allows, and
+# - records how long requests waited before being sent.
+# Spikes then turn into short, bounded queueing here instead of 429s and retry
+# storms from the provider.
+
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from llm_metrics import percentile
+
+
+class QueueTimeout(TimeoutError):
+    """The request could not be admitted before its deadline."""
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``capacity``."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token now if possible, else return seconds until one is due."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def acquire(self, deadline):
+        """Wait for a token until the monotonic ``deadline``; False if it can't be met."""
+        while True:
+            wait = self.reserve()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class LLMGateway:
+    """Admission control and request coalescing for LLM calls.
+
+    ``timeout`` is the default deadline (seconds) for getting a request
+    admitted; it does not limit the provider call itself.
+    """
+
+    def __init__(self, max_concurrency=8, global_rate=10, global_burst=20,
+                 user_rate=1, user_burst=6, timeout=30, max_users=10000, sample_size=2048):
+        self.timeout = timeout
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_users = max_users
+        self._global = TokenBucket(global_rate, global_burst)
+        self._users = OrderedDict()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._waits = deque(maxlen=sample_size)
+        self._stats = {
+            "requests": 0,
+            "coalesced": 0,
+            "rejected_user_rate": 0,
+            "rejected_global_rate": 0,
+            "rejected_concurrency": 0,
+            "errors": 0,
+            "active": 0,
+        }
+
+    # ----- Admission -----
+
+    def _user_bucket(self, user):
+        with self._lock:
+            bucket = self._users.get(user)
+            if bucket is None:
+                bucket = self._users[user] = TokenBucket(self.user_rate, self.user_burst)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user)
+            return bucket
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self._stats[name] += delta
+
+    def _admit(self, user, deadline):
+        """Wait for rate limits and a concurrency slot; caller must release the slot."""
+        started = time.monotonic()
+        if user is not None and not self._user_bucket(user).acquire(deadline):
+            self._count("rejected_user_rate")
+            raise QueueTimeout("Too many requests from this user, please wait a moment.")
+        if not self._global.acquire(deadline):
+            self._count("rejected_global_rate")
+            raise QueueTimeout("The AI service is busy, please try again shortly.")
+        if not self._slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            self._count("rejected_concurrency")
+            raise QueueTimeout("The AI service is busy, please try again shortly.")
+        with self._lock:
+            self._waits.append(time.monotonic() - started)
+            self._stats["active"] += 1
+
+    def _release(self):
+        with self._lock:
+            self._stats["active"] -= 1
+        self._slots.release()
+
+    # ----- Calls -----
+
+    def invoke(self, llm, prompt, model_id="", user=None, timeout=None):
+        """``llm.invoke(prompt)`` through the gateway.
+
+        Callers asking for the same ``(model_id, prompt)`` while it is in
+        flight share one provider request and its result.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        key = (model_id, hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        with self._lock:
+            self._stats["requests"] += 1
+            leader = self._in_flight.get(key)
+            if leader is None:
+                future = self._in_flight[key] = Future()
+            else:
+                self._stats["coalesced"] += 1
+        if leader is not None:
+            return leader.result()
+
+        try:
+            self._admit(user, deadline)
+            try:
+                result = llm.invoke(prompt)
+            finally:
+                self._release()
+        except BaseException as e:
+            if not isinstance(e, QueueTimeout):
+                self._count("errors")
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stream(self, llm, prompt, user=None, timeout=None):
+        """``llm.stream(prompt)`` holding a concurrency slot until the stream ends."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        self._count("requests")
+        self._admit(user, deadline)
+        try:
+            yield from llm.stream(prompt)
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            self._release()
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = dict(self._stats, in_flight=len(self._in_flight), users=len(self._users))
+        stats["max_concurrency"] = self.max_concurrency
+        stats["queue_wait_s"] = {
+            "p50": percentile(waits, 50),
+            "p95": percentile(waits, 95),
+            "p99": percentile(waits, 99),
+            "max": round(waits[-1], 4) if waits else None,
+            "samples": len(waits),
+        }
+        return stats
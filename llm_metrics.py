@@ -0,0 +1,286 @@
+# LLM call instrumentation
+#
+# Records every model call per call site (the sections in model_map: chat,
+# symptoms, treatment, diseases, reports): latency, prompt and completion
+# tokens, outcome (ok / error / fallback) and response cache hits. Numbers are
+# kept in memory per process and exported as
+# - Prometheus text (a latency histogram plus counters), and
+# - one JSON line per call in a local file, for offline analysis. The file is
+#   rotated by size (llm_metrics.jsonl.1, .2, ...) so it stays bounded.
+# Percentiles (p50/p95/p99) come from a bounded sample of recent latencies.
+
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from conversation import estimate_tokens
+
+
+# Upper bounds in seconds; LLM calls range from cached-fast to tens of seconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60)
+
+OUTCOMES = ("ok", "error", "fallback")
+
+
+def percentile(sorted_values, p, digits=4):
+    """Nearest-rank ``p``-th percentile of already sorted values (None if empty)."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], digits)
+
+
+class SectionMetrics:
+    """Counters and latency distribution for one call site."""
+
+    def __init__(self, sample_size=2048):
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last one is +Inf
+        self.latency_sum = 0.0
+        self.latencies = deque(maxlen=sample_size)
+        self.ttfts = deque(maxlen=sample_size)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_lookups = 0
+        self.cache_hits = 0
+        self.streams = 0
+
+    @property
+    def calls(self):
+        return sum(self.outcomes.values())
+
+    def observe(self, latency, outcome, prompt_tokens, completion_tokens, ttft=None):
+        self.outcomes[outcome] += 1
+        for i, upper in enumerate(LATENCY_BUCKETS):
+            if latency <= upper:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.latency_sum += latency
+        self.latencies.append(latency)
+        if ttft is not None:
+            self.ttfts.append(ttft)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+
+    def summary(self):
+        calls = self.calls
+        latencies = sorted(self.latencies)
+        ttfts = sorted(self.ttfts)
+        failed = self.outcomes["error"] + self.outcomes["fallback"]
+        return {
+            "calls": calls,
+            **self.outcomes,
+            "error_rate": round(failed / calls, 4) if calls else None,
+            "latency_p50_s": percentile(latencies, 50),
+            "latency_p95_s": percentile(latencies, 95),
+            "latency_p99_s": percentile(latencies, 99),
+            "ttft_p50_s": percentile(ttfts, 50),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "prompt_tokens_avg": round(self.prompt_tokens / calls, 1) if calls else None,
+            "completion_tokens_avg": round(self.completion_tokens / calls, 1) if calls else None,
+            "cache_lookups": self.cache_lookups,
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": round(self.cache_hits / self.cache_lookups, 4) if self.cache_lookups else None,
+            "streams": self.streams,
+        }
+
+
+class LLMMetrics:
+    """Thread-safe metrics for all LLM call sites in one process.
+
+    ``jsonl_path`` (optional) gets one JSON object per call appended; once it
+    reaches ``max_bytes`` it is rotated, keeping ``backups`` older files.
+    ``count_tokens`` is used when a prompt doesn't carry its own token count.
+    """
+
+    def __init__(self, jsonl_path=None, count_tokens=estimate_tokens, sample_size=2048,
+                 max_bytes=50 * 1024 * 1024, backups=3):
+        self.jsonl_path = jsonl_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.count_tokens = count_tokens
+        self.sample_size = sample_size
+        self.started = time.time()
+        self._sections = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self.jsonl_errors = 0
+        self._jsonl_size = 0
+        if jsonl_path:
+            directory = os.path.dirname(jsonl_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(jsonl_path):
+                self._jsonl_size = os.path.getsize(jsonl_path)
+
+    def _section(self, section):
+        metrics = self._sections.get(section)
+        if metrics is None:
+            metrics = self._sections[section] = SectionMetrics(self.sample_size)
+        return metrics
+
+    def _prompt_tokens(self, prompt):
+        tokens = getattr(prompt, "tokens", None)  # prompts.RenderedPrompt
+        return tokens if tokens is not None else self.count_tokens(prompt)
+
+    # ----- Recording -----
+
+    def record(self, section, latency, outcome="ok", prompt="", completion="", ttft=None,
+               stream=False, error=None, template=None):
+        prompt_tokens = self._prompt_tokens(prompt)
+        completion_tokens = self.count_tokens(completion) if completion else 0
+        with self._lock:
+            metrics = self._section(section)
+            metrics.observe(latency, outcome, prompt_tokens, completion_tokens, ttft)
+            if stream:
+                metrics.streams += 1
+        self._write({
+            "ts": round(time.time(), 3),
+            "section": section,
+            "template": template or getattr(prompt, "name", None),
+            "outcome": outcome,
+            "stream": stream,
+            "latency_s": round(latency, 4),
+            "ttft_s": round(ttft, 4) if ttft is not None else None,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "error": error,
+        })
+
+    def record_cache(self, section, hit):
+        with self._lock:
+            metrics = self._section(section)
+            metrics.cache_lookups += 1
+            metrics.cache_hits += bool(hit)
+
+    def timed(self, section, prompt, fn, is_fallback=lambda result: False):
+        """Run ``fn()`` and record its latency, tokens and outcome."""
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            self.record(section, time.perf_counter() - started, "error", prompt,
+                        error=f"{type(e).__name__}: {e}"[:200])
+            raise
+        outcome = "fallback" if is_fallback(result) else "ok"
+        self.record(section, time.perf_counter() - started, outcome, prompt,
+                    completion="" if outcome == "fallback" else result)
+        return result
+
+    def track_stream(self, section, prompt, chunks):
+        """Pass a chunk stream through, recording it once it ends or fails."""
+        started = time.perf_counter()
+        ttft = None
+        parts = []
+        try:
+            for chunk in chunks:
+                if chunk and ttft is None:
+                    ttft = time.perf_counter() - started
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            self.record(section, time.perf_counter() - started, "error", prompt, "".join(parts),
+                        ttft=ttft, stream=True, error=f"{type(e).__name__}: {e}"[:200])
+            raise
+        self.record(section, time.perf_counter() - started, "ok", prompt, "".join(parts),
+                    ttft=ttft, stream=True)
+
+    def _write(self, event):
+        if not self.jsonl_path:
+            return
+        line = (json.dumps(event) + "\n").encode("utf-8")
+        try:
+            with self._file_lock:
+                if self.max_bytes and self._jsonl_size and self._jsonl_size + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.jsonl_path, "ab") as f:
+                    f.write(line)
+                self._jsonl_size += len(line)
+        except OSError:
+            self.jsonl_errors += 1
+
+    def _rotate(self):
+        # Caller holds self._file_lock
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.jsonl_path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.jsonl_path}.{i + 1}")
+        if self.backups:
+            os.replace(self.jsonl_path, f"{self.jsonl_path}.1")
+        else:
+            os.remove(self.jsonl_path)
+        self._jsonl_size = 0
+
+    # ----- Export -----
+
+    def snapshot(self):
+        with self._lock:
+            sections = {name: metrics.summary() for name, metrics in sorted(self._sections.items())}
+        return {"uptime_s": round(time.time() - self.started, 1), "sections": sections,
+                "jsonl_path": self.jsonl_path, "jsonl_errors": self.jsonl_errors}
+
+    def prometheus(self, prefix="healthai_llm"):
+        """Metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            sections = [(name, m, m.summary(), list(m.buckets), m.latency_sum)
+                        for name, m in sorted(self._sections.items())]
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        family("requests_total", "counter", "LLM calls by section and outcome.")
+        for name, _, summary, _, _ in sections:
+            for outcome in OUTCOMES:
+                lines.append(f'{prefix}_requests_total{{section="{name}",outcome="{outcome}"}} {summary[outcome]}')
+
+        family("latency_seconds", "histogram", "LLM call latency in seconds.")
+        for name, _, summary, buckets, latency_sum in sections:
+            cumulative = 0
+            for upper, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                cumulative += count
+                lines.append(f'{prefix}_latency_seconds_bucket{{section="{name}",le="{upper}"}} {cumulative}')
+            lines.append(f'{prefix}_latency_seconds_sum{{section="{name}"}} {latency_sum:.6f}')
+            lines.append(f'{prefix}_latency_seconds_count{{section="{name}"}} {summary["calls"]}')
+
+        for metric, key, help_text in (
+            ("prompt_tokens_total", "prompt_tokens", "Prompt tokens sent."),
+            ("completion_tokens_total", "completion_tokens", "Completion tokens received."),
+            ("cache_lookups_total", "cache_lookups", "Response cache lookups."),
+            ("cache_hits_total", "cache_hits", "Response cache hits."),
+        ):
+            family(metric, "counter", help_text)
+            for name, _, summary, _, _ in sections:
+                lines.append(f'{prefix}_{metric}{{section="{name}"}} {summary[key]}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Expose ``/metrics`` for a Prometheus scraper on a background thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="llm-metrics-http", daemon=True).start()
+        return server
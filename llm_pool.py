@@ -0,0 +1,164 @@
+# Shared Watsonx client pool
+#
+# Streamlit re-executes app.py on every interaction, so building a WatsonxLLM per
+# click meant a new IAM token exchange and a new TLS connection per request. The
+# pool keeps one APIClient (token + HTTP connection pool) for the whole server
+# process and one WatsonxLLM per (model_id, params) on top of it.
+#
+# The SDKs (langchain_ibm alone takes well over a second to import) are loaded
+# when the first client is created, so processes that never call Watsonx, or
+# haven't yet, start without them.
+
+
+import threading
+
+
+def freeze_params(params):
+    """Turn a generation params dict into a hashable, order-independent key."""
+    frozen = []
+    for k, v in sorted(params.items()):
+        if isinstance(v, (list, tuple)):
+            v = tuple(v)
+        frozen.append((k, v))
+    return tuple(frozen)
+
+
+class LLMClientPool:
+    """Thread-safe registry of WatsonxLLM clients shared by every session.
+
+    All clients reuse a single APIClient, so the IAM token and the keep-alive
+    HTTP connections are shared too. A background thread touches the token
+    every ``token_refresh_interval`` seconds; the SDK refreshes it once it is
+    close to expiry, so user requests never pay for the token exchange.
+    """
+
+    def __init__(self, credentials, project_id, token_refresh_interval=300,
+                 max_connections=20, max_keepalive_connections=10, timeout=120):
+        self.credentials = dict(credentials)
+        self.project_id = project_id
+        self.token_refresh_interval = token_refresh_interval
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._clients = {}
+        self._api_client = None
+        self._http_client = None
+        self._refresher = None
+        self._closed = threading.Event()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "http_requests": 0,
+            "new_connections": 0,
+            "token_refreshes": 0,
+            "token_refresh_errors": 0,
+        }
+
+    # --------------------------
+    # Public API
+    # --------------------------
+
+    def get(self, model_id, params):
+        key = (model_id, freeze_params(params))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._count("hits")
+                return client
+
+            self._count("misses")
+            from langchain_ibm import WatsonxLLM
+
+            client = WatsonxLLM(
+                model_id=model_id,
+                watsonx_client=self._get_api_client(),
+                project_id=self.project_id,
+                params=dict(params),
+            )
+            self._clients[key] = client
+            return client
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._lock:
+            stats["clients"] = len(self._clients)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["reused_connections"] = max(stats["http_requests"] - stats["new_connections"], 0)
+        return stats
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._clients.clear()
+            self._api_client = None
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+
+    # --------------------------
+    # Internals
+    # --------------------------
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def _get_api_client(self):
+        # Caller holds self._lock
+        if self._api_client is None:
+            import httpx
+            from ibm_watsonx_ai import APIClient
+
+            self._http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                ),
+                timeout=self.timeout,
+                event_hooks={"request": [self._on_request]},
+            )
+            self._api_client = APIClient(
+                credentials=self.credentials,
+                project_id=self.project_id,
+                httpx_client=self._http_client,
+            )
+            self._start_token_refresher()
+        return self._api_client
+
+    def _on_request(self, request):
+        # httpcore reports TCP connects through the "trace" extension, which lets
+        # us tell fresh connections apart from keep-alive reuse.
+        self._count("http_requests")
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self._count("new_connections")
+
+    def _start_token_refresher(self):
+        if self._refresher is not None or not self.token_refresh_interval:
+            return
+        self._refresher = threading.Thread(
+            target=self._refresh_token_loop, name="watsonx-token-refresher", daemon=True
+        )
+        self._refresher.start()
+
+    def _refresh_token_loop(self):
+        last_token = None
+        while not self._closed.wait(self.token_refresh_interval):
+            api_client = self._api_client
+            if api_client is None:
+                continue
+            try:
+                token = api_client.token
+            except Exception:
+                self._count("token_refresh_errors")
+                continue
+            if last_token is not None and token != last_token:
+                self._count("token_refreshes")
+            last_token = token
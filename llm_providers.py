@@ -0,0 +1,265 @@
+# Pluggable LLM backends
+#
+# Every section in model_map is served by one backend:
+# - "watsonx": IBM watsonx.ai through the shared LLMClientPool (default),
+# - "local":   a GGUF model on the CPU via llama.cpp (llama-cpp-python), e.g. a
+#              small quantized Granite model for cheap, sub-second answers,
+# - "stub":    deterministic offline responses, optionally replayed from a
+#              JSONL recording, for tests and benchmarks without network access.
+#
+# With a Recorder, every prompt/response pair a backend produces is appended to
+# a JSONL file in the format the stub backend replays.
+#
+# A backend is any object with ``get(model_id, params)`` returning a client
+# with ``invoke(prompt)`` and ``stream(prompt)``, plus ``stats()``. Backends
+# are created on first use, so missing credentials or optional packages only
+# matter for the backends a deployment actually selects.
+
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from llm_pool import freeze_params
+
+
+BACKENDS = ("watsonx", "local", "stub")
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def backend_model_id(backend, model_id, local_model_path=None):
+    """Model id used for cache keys and metrics, distinct per backend."""
+    if backend == "watsonx":
+        return model_id
+    if backend == "local":
+        return f"local/{os.path.basename(local_model_path or 'model.gguf')}"
+    if backend == "stub":
+        return f"stub/{model_id}"
+    raise ValueError(f"Unknown LLM backend: {backend!r} (expected one of {', '.join(BACKENDS)})")
+
+
+# --------------------------
+# Local CPU backend (llama.cpp)
+# --------------------------
+
+class LlamaCppLLM:
+    """invoke/stream on a shared llama.cpp model with watsonx-style params."""
+
+    def __init__(self, provider, params):
+        self.provider = provider
+        self.options = {
+            "max_tokens": params.get("max_new_tokens", 300),
+            "stop": list(params.get("stop_sequences") or []) or None,
+        }
+        if params.get("decoding_method", "greedy") == "greedy":
+            self.options.update(temperature=0.0, top_k=1)
+        else:
+            self.options["temperature"] = params.get("temperature", 0.7)
+
+    def invoke(self, prompt):
+        return "".join(self.stream(prompt))
+
+    def stream(self, prompt):
+        with self.provider.lock:  # a llama.cpp context serves one request at a time
+            model = self.provider.model()
+            self.provider.count("requests")
+            for chunk in model(prompt, stream=True, **self.options):
+                text = chunk["choices"][0]["text"]
+                if text:
+                    yield text
+
+
+class LlamaCppProvider:
+    def __init__(self, model_path, n_ctx=4096, n_threads=None):
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self.lock = threading.Lock()
+        self._model = None
+        self._clients = {}
+        self._stats = {"requests": 0, "load_s": None}
+
+    def model(self):
+        # Caller holds self.lock
+        if self._model is None:
+            try:
+                from llama_cpp import Llama
+            except ImportError as e:
+                raise RuntimeError("The local LLM backend needs llama-cpp-python (pip install llama-cpp-python).") from e
+            started = time.perf_counter()
+            self._model = Llama(model_path=self.model_path, n_ctx=self.n_ctx,
+                                n_threads=self.n_threads, verbose=False)
+            self._stats["load_s"] = round(time.perf_counter() - started, 2)
+        return self._model
+
+    def count(self, name):
+        self._stats[name] += 1
+
+    def get(self, model_id, params):
+        key = freeze_params(params)
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients[key] = LlamaCppLLM(self, params)
+        return client
+
+    def stats(self):
+        return dict(self._stats, model_path=self.model_path, loaded=self._model is not None)
+
+
+# --------------------------
+# Stub / replay backend
+# --------------------------
+
+class StubLLM:
+    def __init__(self, provider, model_id):
+        self.provider = provider
+        self.model_id = model_id
+
+    def invoke(self, prompt):
+        response = self.provider.respond(self.model_id, prompt)
+        if self.provider.latency:
+            time.sleep(self.provider.latency)
+        return response
+
+    def stream(self, prompt):
+        response = self.provider.respond(self.model_id, prompt)
+        words = response.split(" ")
+        for i, word in enumerate(words):
+            if self.provider.latency:
+                time.sleep(self.provider.latency / len(words))
+            yield word if i == len(words) - 1 else word + " "
+
+
+class StubProvider:
+    """Deterministic responses: replayed when the prompt was recorded, else
+    a placeholder derived from the prompt hash.
+
+    ``replay_path`` is a JSONL file of ``{"prompt_sha256" or "prompt", "response"}``
+    objects. ``latency`` (seconds) simulates model time per call.
+    """
+
+    def __init__(self, replay_path=None, latency=0.0):
+        self.replay_path = replay_path
+        self.latency = float(latency or 0)
+        self.responses = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "replayed": 0, "generated": 0}
+        if replay_path and os.path.exists(replay_path):
+            with open(replay_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        key = record.get("prompt_sha256") or prompt_key(record["prompt"])
+                        self.responses[key] = record["response"]
+
+    def respond(self, model_id, prompt):
+        key = prompt_key(prompt)
+        response = self.responses.get(key)
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["replayed" if response is not None else "generated"] += 1
+        if response is not None:
+            return response
+        return (f"This is a stub response ({key[:12]}) from {model_id}. "
+                "Please consult a doctor for medical advice.")
+
+    def get(self, model_id, params):
+        return StubLLM(self, model_id)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, replay_entries=len(self.responses), latency_s=self.latency)
+
+
+# --------------------------
+# Recording
+# --------------------------
+
+class Recorder:
+    """Appends prompt/response pairs to a JSONL file (see StubProvider)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, backend, model_id, prompt, response):
+        line = json.dumps({
+            "prompt_sha256": prompt_key(prompt),
+            "backend": backend,
+            "model_id": model_id,
+            "prompt": prompt,
+            "response": response,
+        }) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            self.records += 1
+
+
+class RecordingLLM:
+    def __init__(self, llm, recorder, backend, model_id):
+        self.llm = llm
+        self.recorder = recorder
+        self.backend = backend
+        self.model_id = model_id
+
+    def invoke(self, prompt):
+        response = self.llm.invoke(prompt)
+        self.recorder.write(self.backend, self.model_id, prompt, response)
+        return response
+
+    def stream(self, prompt):
+        parts = []
+        for chunk in self.llm.stream(prompt):
+            parts.append(chunk)
+            yield chunk
+        # Only complete streams are recorded
+        self.recorder.write(self.backend, self.model_id, prompt, "".join(parts))
+
+
+# --------------------------
+# Registry
+# --------------------------
+
+class ProviderRegistry:
+    """Creates backends on first use from ``factories`` (name -> callable).
+
+    With a ``recorder``, clients are wrapped so their responses get recorded.
+    """
+
+    def __init__(self, factories, recorder=None):
+        self.factories = dict(factories)
+        self.recorder = recorder
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def provider(self, backend):
+        with self._lock:
+            provider = self._providers.get(backend)
+            if provider is None:
+                if backend not in self.factories:
+                    raise ValueError(f"Unknown LLM backend: {backend!r}")
+                provider = self._providers[backend] = self.factories[backend]()
+            return provider
+
+    def get(self, backend, model_id, params):
+        llm = self.provider(backend).get(model_id, params)
+        if self.recorder is not None:
+            llm = RecordingLLM(llm, self.recorder, backend, model_id)
+        return llm
+
+    def stats(self):
+        with self._lock:
+            providers = dict(self._providers)
+        stats = {name: provider.stats() for name, provider in providers.items()}
+        if self.recorder is not None:
+            stats["recorded"] = {"path": self.recorder.path, "records": self.recorder.records}
+        return stats
@@ -0,0 +1,61 @@
+# Streaming helpers for LLM output
+#
+# Wraps llm.stream(prompt) so the UI can paint tokens as they arrive while we
+# keep time-to-first-token (TTFT) and total generation time for every call.
+
+
+import time
+
+
+class TimedStream:
+    """Iterate over streamed LLM chunks and time the call.
+
+    ``ttft`` is the delay until the first non-empty chunk and ``total`` the
+    time until the stream is exhausted, both in seconds.
+    """
+
+    def __init__(self, chunks, section=""):
+        self.section = section
+        self._chunks = chunks
+        self._parts = []
+        self.started = None
+        self.ttft = None
+        self.total = None
+
+    def __iter__(self):
+        self.started = time.perf_counter()
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.started
+            self._parts.append(chunk)
+            yield chunk
+        self.total = time.perf_counter() - self.started
+
+    def iter_text(self, min_interval=0.05):
+        """Yield the accumulated text, throttled to one update per ``min_interval``.
+
+        Every yield becomes a delta sent to the browser, so painting each token
+        separately would flood the websocket on fast models.
+        """
+        last_flush = 0.0
+        for _ in self:
+            now = time.perf_counter()
+            if now - last_flush >= min_interval:
+                last_flush = now
+                yield self.text
+        yield self.text
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def timing(self):
+        return {
+            "section": self.section,
+            "ttft_s": round(self.ttft, 3) if self.ttft is not None else None,
+            "total_s": round(self.total, 3) if self.total is not None else None,
+            "chars": len(self.text),
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
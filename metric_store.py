@@ -0,0 +1,249 @@
+# Columnar metric store
+#
+# Replaces the analytics_data dict of parallel Python lists. Every row has a
+# date and one slot per metric; a missing reading is a null in its column's
+# mask rather than a shorter list, so columns can never drift out of alignment.
+# Buffers grow geometrically, so appends are amortized O(1), and to_frame()
+# wraps the live buffers without copying them. pandas is only imported by the
+# methods that return pandas objects, so loading a session doesn't need it.
+
+
+import uuid
+from datetime import date, datetime
+
+import numpy as np
+
+from trend_stats import TrendEngine
+
+
+METRICS = ("heart_rates", "glucose_levels", "peak_flow", "hba1c")
+
+METRIC_LABELS = {
+    "heart_rates": "Heart Rate",
+    "glucose_levels": "Blood Glucose",
+    "peak_flow": "Peak Flow",
+    "hba1c": "HbA1c",
+}
+
+
+def to_day(value):
+    """Coerce a date, datetime or 'YYYY-MM-DD' string to numpy datetime64[D]."""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, (date, str, np.datetime64)):
+        return np.datetime64(value, "D")
+    raise TypeError(f"Unsupported date value: {value!r}")
+
+
+def _float_column(values):
+    """float64 array with NaN for None and anything non-numeric."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        import pandas as pd
+        return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _py(value):
+    # 72.0 -> 72 so integer readings display the way they were entered
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class MetricStore:
+    """Aligned, typed columns of health metrics keyed by date.
+
+    Values are float64 buffers paired with boolean null masks (True = missing,
+    the pandas masked-array convention). ``version`` increases on every write
+    so callers can cache anything derived from the data.
+    """
+
+    def __init__(self, metrics=METRICS, capacity=64):
+        self.metrics = tuple(metrics)
+        self._size = 0
+        self._dates = np.empty(capacity, dtype="datetime64[s]")
+        self._values = {m: np.empty(capacity, dtype=np.float64) for m in self.metrics}
+        self._mask = {m: np.ones(capacity, dtype=bool) for m in self.metrics}
+        self.uid = uuid.uuid4().hex
+        self.version = 0
+        self._trends = TrendEngine(self.metrics)
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return f"MetricStore(rows={self._size}, metrics={list(self.metrics)}, version={self.version})"
+
+    # --------------------------
+    # Writes
+    # --------------------------
+
+    def append(self, day, **values):
+        """Append one row; metrics not given (or None) are stored as null."""
+        unknown = set(values) - set(self.metrics)
+        if unknown:
+            raise KeyError(f"Unknown metric(s): {', '.join(sorted(unknown))}")
+        self._reserve(self._size + 1)
+        i = self._size
+        self._dates[i] = to_day(day)
+        for m in self.metrics:
+            v = values.get(m)
+            if v is None or v != v:  # None or NaN
+                self._mask[m][i] = True
+            else:
+                self._values[m][i] = v
+                self._mask[m][i] = False
+        self._size += 1
+        self.version += 1
+
+    def extend(self, days, **columns):
+        """Append many rows at once from equal-length array-likes.
+
+        NaN/None entries become nulls. One buffer copy per column, no Python
+        loop per row.
+        """
+        unknown = set(columns) - set(self.metrics)
+        if unknown:
+            raise KeyError(f"Unknown metric(s): {', '.join(sorted(unknown))}")
+        days = np.asarray(days, dtype="datetime64[D]")
+        n = len(days)
+        if n == 0:
+            return
+        self._reserve(self._size + n)
+        start, stop = self._size, self._size + n
+        self._dates[start:stop] = days
+        for m in self.metrics:
+            if m in columns:
+                col = _float_column(columns[m])
+                if len(col) != n:
+                    raise ValueError(f"Column {m!r} has {len(col)} values, expected {n}")
+                missing = np.isnan(col)
+                self._values[m][start:stop] = np.where(missing, 0.0, col)
+                self._mask[m][start:stop] = missing
+            else:
+                self._mask[m][start:stop] = True
+        self._size = stop
+        self.version += 1
+
+    def _reserve(self, needed):
+        capacity = len(self._dates)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        self._dates = np.resize(self._dates, new_capacity)
+        for m in self.metrics:
+            self._values[m] = np.resize(self._values[m], new_capacity)
+            mask = np.ones(new_capacity, dtype=bool)
+            mask[:self._size] = self._mask[m][:self._size]
+            self._mask[m] = mask
+
+    # --------------------------
+    # Reads
+    # --------------------------
+
+    @property
+    def dates(self):
+        """Read-only view of the date column (datetime64[s], midnight of each day)."""
+        view = self._dates[:self._size]
+        view.flags.writeable = False
+        return view
+
+    def column(self, metric):
+        """Zero-copy nullable pandas array over a metric column."""
+        import pandas as pd
+        return pd.arrays.FloatingArray(
+            self._values[metric][:self._size], self._mask[metric][:self._size], copy=False
+        )
+
+    def count(self, metric):
+        return int(self._size - self._mask[metric][:self._size].sum())
+
+    def latest(self, metric):
+        """Most recent non-null reading, or None."""
+        present = np.flatnonzero(~self._mask[metric][:self._size])
+        if len(present) == 0:
+            return None
+        return _py(self._values[metric][present[-1]])
+
+    def latest_reading(self, metric):
+        """``(date, value)`` of the most recent non-null reading, or ``(None, None)``.
+
+        Rows often fill only some metrics (the symptom checker never records
+        peak flow), so each metric has its own latest date.
+        """
+        present = np.flatnonzero(~self._mask[metric][:self._size])
+        if len(present) == 0:
+            return None, None
+        row = present[-1]
+        return str(self._dates[row].astype("datetime64[D]")), _py(self._values[metric][row])
+
+    def recent(self, metric, n):
+        """Last ``n`` non-null readings, oldest first, as Python numbers."""
+        present = np.flatnonzero(~self._mask[metric][:self._size])[-n:]
+        return [_py(v) for v in self._values[metric][present]]
+
+    def trend(self, metric):
+        """Rolling trend statistics for ``metric`` (see trend_stats.MetricTrend.summary).
+
+        Only rows appended since the previous call are processed.
+        """
+        n = self._size
+        self._trends.sync(
+            self._dates[:n],
+            {m: self._values[m][:n] for m in self.metrics},
+            {m: self._mask[m][:n] for m in self.metrics},
+        )
+        return self._trends.summary(metric)
+
+    def rows_since(self, start):
+        """Rows ``start:`` as ``(['YYYY-MM-DD', ...], {metric: [value or None, ...]})``.
+
+        Used to persist whatever was appended since a known length.
+        """
+        days = [str(d) for d in self._dates[start:self._size].astype("datetime64[D]")]
+        columns = {}
+        for m in self.metrics:
+            values = self._values[m][start:self._size].tolist()
+            mask = self._mask[m][start:self._size].tolist()
+            columns[m] = [None if missing else v for v, missing in zip(values, mask)]
+        return days, columns
+
+    def to_frame(self, labels=None):
+        """DataFrame view over the live buffers (no per-render copy).
+
+        ``labels`` optionally renames metric columns, e.g. METRIC_LABELS.
+        """
+        import pandas as pd
+        labels = labels or {}
+        data = {"Date": self._dates[:self._size]}
+        for m in self.metrics:
+            data[labels.get(m, m)] = self.column(m)
+        return pd.DataFrame(data, copy=False)
+
+
+class EventLog(list):
+    """List of log entries (glucose, blood pressure, asthma) with a version.
+
+    Works anywhere a list of dicts did (e.g. ``pd.DataFrame(log)``); every
+    mutation bumps ``version`` so charts built from the log can be cached.
+    """
+
+    def __init__(self, entries=()):
+        super().__init__(entries)
+        self.uid = uuid.uuid4().hex
+        self.version = 0
+
+    def append(self, entry):
+        super().append(entry)
+        self.version += 1
+
+    def extend(self, entries):
+        super().extend(entries)
+        self.version += 1
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self.version += 1
+
+    def __repr__(self):
+        return f"EventLog(entries={len(self)}, version={self.version})"
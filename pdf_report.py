@@ -0,0 +1,207 @@
+# PDF health report
+#
+# The report is rendered from a plain ``record`` dict (profile, latest readings,
+# trend descriptions, AI summary) rather than from session state, so it can be
+# built off the request thread and cached. PDFExporter builds reports lazily in
+# a small worker pool and keeps the finished bytes keyed on the versions of the
+# data they were built from, so reruns that don't change the data reuse them.
+
+
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from report_pipeline import REPORT_METRICS
+from trend_stats import describe_trend
+
+
+# The core PDF fonts only cover latin-1; map the symbols the app uses and drop
+# anything else (emoji) instead of failing the whole export.
+PDF_REPLACEMENTS = str.maketrans({
+    "•": "-",
+    "–": "-",
+    "—": "-",
+    "‘": "'",
+    "’": "'",
+    "“": '"',
+    "”": '"',
+    "…": "...",
+    "↑": "up",
+    "↓": "down",
+    "→": "->",
+    "≥": ">=",
+    "≤": "<=",
+})
+
+
+def pdf_text(value):
+    """Make ``value`` printable with the core (latin-1) PDF fonts."""
+    text = str(value).translate(PDF_REPLACEMENTS)
+    return text.encode("latin-1", "ignore").decode("latin-1").strip()
+
+
+def summary_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def report_record(profile, store, ai_summary=""):
+    """Snapshot of everything the report shows, taken from a MetricStore."""
+    trends = {}
+    for key, _, unit in REPORT_METRICS:
+        trend = store.trend(key)
+        if trend["count"]:
+            trends[key] = describe_trend(trend, unit)
+    return {
+        "profile": dict(profile),
+        "latest": {key: store.latest_reading(key) for key, _, _ in REPORT_METRICS},
+        "trends": trends,
+        "ai_summary": ai_summary or "",
+    }
+
+
+def _section_title(pdf, title):
+    pdf.set_font("Arial", 'B', 14)
+    pdf.set_text_color(0, 51, 102)
+    pdf.cell(0, 10, pdf_text(title), ln=True)
+    pdf.set_text_color(0, 0, 0)
+
+
+def render_report(record):
+    """Render one report ``record`` to PDF bytes."""
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.set_font("Arial", size=12)
+
+    # Title with border and background
+    pdf.set_fill_color(200, 220, 255)
+    pdf.cell(0, 15, txt="Health Report Summary", ln=True, align='C', fill=True)
+    pdf.ln(10)
+
+    # --------------------------
+    # Patient Profile Section
+    # --------------------------
+    _section_title(pdf, "Patient Profile")
+    pdf.set_draw_color(180, 180, 180)
+    pdf.rect(x=10, y=pdf.get_y() - 5, w=190, h=40, style='D')
+    pdf.ln(5)
+
+    pdf.set_font("Arial", size=12)
+    for k, v in record.get("profile", {}).items():
+        if v:  # Skip empty fields
+            pdf.cell(0, 8, txt=pdf_text(f"- {k.capitalize()}: {v}"), ln=True)
+    pdf.ln(10)
+
+    # --------------------------
+    # Latest Metrics Section
+    # --------------------------
+    _section_title(pdf, "Latest Metrics")
+    pdf.rect(x=10, y=pdf.get_y() - 5, w=190, h=50, style='D')
+    pdf.ln(5)
+
+    latest = record.get("latest", {})
+    pdf.set_font("Arial", size=12)
+    for key, label, unit in REPORT_METRICS:
+        date, value = latest.get(key) or (None, None)
+        text = "N/A" if value is None else f"{value} {unit} (on {date})"
+        pdf.cell(0, 8, txt=pdf_text(f"- {label}: {text}"), ln=True)
+    pdf.ln(10)
+
+    # --------------------------
+    # Trends Section
+    # --------------------------
+    trends = record.get("trends", {})
+    if trends:
+        _section_title(pdf, "Trends")
+        pdf.set_font("Arial", size=11)
+        for key, label, _ in REPORT_METRICS:
+            if trends.get(key):
+                pdf.multi_cell(0, 7, txt=pdf_text(f"- {label}: {trends[key]}"))
+        pdf.ln(10)
+
+    # --------------------------
+    # AI Summary Section (if available)
+    # --------------------------
+    ai_summary = record.get("ai_summary")
+    if ai_summary:
+        _section_title(pdf, "AI Report Summary")
+        pdf.rect(x=10, y=pdf.get_y() - 5, w=190, h=60, style='D')  # Border around summary
+        pdf.ln(5)
+
+        pdf.set_font("Arial", size=12)
+        for line in ai_summary.split('\n'):
+            line = pdf_text(line.replace("#", ""))
+            if line:
+                pdf.multi_cell(0, 8, txt=line)
+        pdf.ln(10)
+
+    # --------------------------
+    # Footer
+    # --------------------------
+    pdf.set_y(-30)
+    pdf.set_font("Arial", 'I', 10)
+    pdf.set_text_color(128, 128, 128)
+    pdf.cell(0, 10, txt=pdf_text("Generated by Health Analytics Dashboard © All rights reserved"), align='C')
+
+    return pdf.output(dest='S').encode('latin-1')
+
+
+class PDFExporter:
+    """Builds reports in a worker pool and caches the results by key.
+
+    ``key`` should identify the data the report shows, e.g. (user, profile
+    version, metrics version, summary hash). Submitting a key that is already
+    building or built returns the same future, so repeated clicks and reruns
+    never render the same report twice.
+    """
+
+    def __init__(self, max_workers=2, max_entries=64, render=render_report):
+        self.render = render
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdf-export")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._stats = {"builds": 0, "hits": 0, "failures": 0, "evictions": 0}
+
+    def peek(self, key):
+        """The future for ``key`` if it was already submitted, else None."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+            return job
+
+    def submit(self, key, record):
+        """Start rendering ``record`` unless ``key`` is already built or building."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not (job.done() and job.exception()):
+                self._jobs.move_to_end(key)
+                self._stats["hits"] += 1
+                return job
+            self._stats["builds"] += 1
+            job = self._executor.submit(self._build, record)
+            self._jobs[key] = job
+            while len(self._jobs) > self.max_entries:
+                self._jobs.popitem(last=False)
+                self._stats["evictions"] += 1
+            return job
+
+    def _build(self, record):
+        try:
+            return self.render(record)
+        except Exception:
+            with self._lock:
+                self._stats["failures"] += 1
+            raise
+
+    def stats(self):
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.done())
+            return dict(self._stats, entries=len(self._jobs), pending=pending)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,272 @@
+# Prompt template registry
+#
+# Every prompt the app sends is a named, versioned template registered here
+# instead of an inline f-string. Templates are parsed once: the static prefix
+# (everything before the first placeholder) is kept as-is, so identical
+# prefixes can be reused by provider-side prompt caching, and rendering only
+# joins precompiled literal/field pairs. Each render is measured (chars and
+# tokens) per template, so prompt size regressions show up in the numbers.
+#
+# Profile snippets used by several prompts are built once per profile by
+# ProfileFragments and replaced only when the saved profile changes.
+
+
+import json
+import string
+import threading
+
+from conversation import estimate_tokens
+
+
+class RenderedPrompt(str):
+    """A prompt string that remembers which template produced it."""
+
+    name = None
+    version = None
+    tokens = None
+
+
+class PromptTemplate:
+    def __init__(self, name, version, text):
+        self.name = name
+        self.version = version
+        self.text = text
+        self.parts = []  # (literal, field or None)
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if spec or conversion:
+                raise ValueError(f"{name}: format specs are not supported ({{{field}}})")
+            self.parts.append((literal, field))
+        self.fields = frozenset(f for _, f in self.parts if f is not None)
+        prefix = []
+        for literal, field in self.parts:
+            prefix.append(literal)
+            if field is not None:
+                break
+        self.prefix = "".join(prefix)
+
+    def render(self, **fields):
+        missing = self.fields - fields.keys()
+        if missing:
+            raise KeyError(f"{self.name} v{self.version}: missing field(s) {', '.join(sorted(missing))}")
+        out = []
+        for literal, field in self.parts:
+            out.append(literal)
+            if field is not None:
+                out.append(str(fields[field]))
+        return "".join(out)
+
+    def __repr__(self):
+        return f"PromptTemplate({self.name} v{self.version}, fields={sorted(self.fields)})"
+
+
+class PromptRegistry:
+    def __init__(self, count_tokens=estimate_tokens):
+        self.count_tokens = count_tokens
+        self._templates = {}  # name -> {version: PromptTemplate}
+        self._lock = threading.Lock()
+        self._sizes = {}
+
+    def register(self, name, version, text):
+        template = PromptTemplate(name, version, text)
+        self._templates.setdefault(name, {})[version] = template
+        return template
+
+    def get(self, name, version=None):
+        versions = self._templates[name]
+        return versions[version if version is not None else max(versions)]
+
+    def render(self, name, version=None, **fields):
+        template = self.get(name, version)
+        prompt = RenderedPrompt(template.render(**fields))
+        prompt.name, prompt.version = template.name, template.version
+        prompt.tokens = self.count_tokens(prompt)
+        self._record(template, len(prompt), prompt.tokens)
+        return prompt
+
+    def _record(self, template, chars, tokens):
+        key = f"{template.name}@v{template.version}"
+        with self._lock:
+            size = self._sizes.setdefault(key, {
+                "renders": 0, "chars_total": 0, "chars_max": 0, "tokens_total": 0, "tokens_max": 0,
+                "prefix_chars": len(template.prefix),
+            })
+            size["renders"] += 1
+            size["chars_total"] += chars
+            size["chars_max"] = max(size["chars_max"], chars)
+            size["tokens_total"] += tokens
+            size["tokens_max"] = max(size["tokens_max"], tokens)
+
+    def stats(self):
+        with self._lock:
+            sizes = {k: dict(v) for k, v in self._sizes.items()}
+        for size in sizes.values():
+            n = size["renders"]
+            size["chars_avg"] = round(size.pop("chars_total") / n, 1)
+            size["tokens_avg"] = round(size.pop("tokens_total") / n, 1)
+        return sizes
+
+
+# --------------------------
+# Per-profile fragments
+# --------------------------
+
+FRAGMENT_BUILDERS = {
+    # "Name: Ann\nAge: 30\n..." used by chat and reports
+    "lines": lambda p: "\n".join(f"{k.capitalize()}: {v}" for k, v in p.items()),
+    "json": lambda p: json.dumps(p),
+    "basic": lambda p: (
+        f"Name: {p.get('name', 'Unknown')}\n"
+        f"Age: {p.get('age', 'Unknown')}\n"
+        f"Gender: {p.get('gender', 'Unknown')}"
+    ),
+    "clinical": lambda p: (
+        f"Name: {p.get('name', 'Unknown')}\n"
+        f"Age: {p.get('age', 'Unknown')}\n"
+        f"Gender: {p.get('gender', 'Unknown')}\n"
+        f"BMI: {p.get('bmi', 'Unknown')}"
+    ),
+}
+
+
+class ProfileFragments:
+    """Prompt snippets derived from one profile, each built on first use."""
+
+    def __init__(self, profile):
+        self.profile = dict(profile)
+        self._built = {}
+
+    def __getitem__(self, name):
+        if name not in self._built:
+            self._built[name] = FRAGMENT_BUILDERS[name](self.profile)
+        return self._built[name]
+
+    def matches(self, profile):
+        return self.profile == profile
+
+    def __repr__(self):
+        return f"ProfileFragments(built={sorted(self._built)})"
+
+
+# --------------------------
+# Templates
+# --------------------------
+
+PROMPTS = PromptRegistry()
+
+PROMPTS.register("chat", 1, """
+You are a professional medical assistant AI helping a patient with their health queries.
+Use the following guidelines:
+- Be empathetic, informative, and clear.
+- Always mention that you're not a substitute for real medical advice.
+- If unsure, recommend consulting a physician.
+
+Patient Profile:
+{profile_info}
+{conversation_summary}
+Chat History:
+{chat_history}
+
+User Question: "{user_input}"
+
+Based on the question category ("{category}"), provide a detailed response that includes:
+1. Medical interpretation of the query
+2. Possible causes or implications
+3. Suggested actions or precautions
+4. When to consult a doctor
+
+Answer:""")
+
+PROMPTS.register("chat_summary", 1, """
+Summarize this conversation between a patient and a medical assistant for the
+assistant's future reference. Keep symptoms, conditions, medications, advice
+already given and open questions. Use at most 120 words.
+
+Earlier summary:
+{summary}
+
+New messages:
+{turns}
+Summary:""")
+
+PROMPTS.register("symptoms", 1, """
+You are a medical AI assistant. Based on the following symptoms, list the most likely conditions or diseases from most to least probable.
+
+Patient Profile:
+{profile_basic}
+
+Symptoms: {symptoms}
+
+Provide a structured response with:
+1. Most likely condition with brief explanation
+2. Alternative possibilities
+3. Likelihood percentages
+4. Recommended next steps
+
+Keep it concise and professional.
+""")
+
+PROMPTS.register("treatment", 1, """
+Based on the following patient profile and condition, create a personalized treatment plan:
+
+Patient Profile:
+{profile_clinical}
+
+Condition: {condition}
+Duration: {duration}
+
+Include:
+1. Medications (with dosages and frequency)
+2. Lifestyle modifications
+3. Follow-up care recommendations
+4. Potential complications to monitor
+""")
+
+PROMPTS.register("glucose_advice", 1, """
+My blood sugar is {glucose} mg/dL ({category}). Is this normal? What should I do next?
+Patient Profile: {profile_json}
+""")
+
+PROMPTS.register("bp_advice", 1, """
+My blood pressure is {systolic}/{diastolic} mmHg ({category}). What does that mean?
+Patient Profile: {profile_json}
+""")
+
+PROMPTS.register("asthma_advice", 1, """
+What are some ways to avoid asthma triggers like '{triggers}'?
+Also, how can I manage severity level {severity} ({category}) episodes?
+Patient Profile: {profile_json}
+""")
+
+PROMPTS.register("report_metric", 1, """
+You are a healthcare AI assistant reviewing a single health metric for a patient.
+Patient Profile:
+{profile_info}
+Metric: {label} ({unit})
+Trend statistics: {trend_text}
+In 3-4 short sentences:
+1. Say whether the trend is Stable, Increasing or Decreasing.
+2. Say whether the values are within a typical healthy range.
+3. Give one practical suggestion for this metric.
+Avoid medical jargon.
+""")
+
+PROMPTS.register("report_synthesis", 1, """
+You are a professional healthcare AI assistant writing a personalized health summary.
+Patient Profile:
+{profile_info}
+Per-metric findings:
+{findings}
+Combine these findings into one report. Keep it conversational and easy to understand.
+Output format:
+### 🔍 Trend Overview
+- Heart Rate: [Stable/Increasing/Decreasing]
+- Blood Glucose: [Stable/Increasing/Decreasing]
+- Peak Flow: [Stable/Increasing/Decreasing]
+- HbA1c: [Stable/Increasing/Decreasing]
+### 🩺 Health Implications
+Explain what the trends might indicate about the patient's current condition.
+### 💡 Recommendations
+Provide 2-3 lifestyle suggestions tailored to the patient's data.
+### ⚠️ Important Notes
+Include any warnings or reminders about consulting a doctor.
+""")
@@ -0,0 +1,96 @@
+# Concurrent AI report pipeline
+#
+# Instead of one large prompt that analyzes every metric at once, each metric is
+# analyzed by its own short request, sent in parallel over a bounded thread pool,
+# and a final synthesis prompt combines the per-metric findings. Wall-clock time
+# is close to the slowest metric rather than the sum, and a failing metric only
+# removes its own paragraph from the report.
+
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from prompts import PROMPTS
+
+
+REPORT_METRICS = [
+    # (analytics key, label, unit)
+    ("heart_rates", "Heart Rate", "bpm"),
+    ("glucose_levels", "Blood Glucose", "mg/dL"),
+    ("peak_flow", "Peak Flow", "L/min"),
+    ("hba1c", "HbA1c", "%"),
+]
+
+
+def build_metric_prompt(profile_info, label, unit, trend_text):
+    return PROMPTS.render("report_metric", profile_info=profile_info, label=label, unit=unit,
+                          trend_text=trend_text)
+
+
+def build_synthesis_prompt(profile_info, analyses, series):
+    sections = []
+    for key, label, unit in REPORT_METRICS:
+        if key in analyses:
+            sections.append(f"{label} analysis:\n{analyses[key]}")
+        else:
+            sections.append(f"{label} ({unit}) trend statistics: {series.get(key) or 'No readings recorded.'}")
+    return PROMPTS.render("report_synthesis", profile_info=profile_info, findings="\n\n".join(sections))
+
+
+def analyze_metrics(invoke, profile_info, series, max_workers=4, timeout=60):
+    """Run one analysis request per metric concurrently.
+
+    ``invoke`` takes a prompt and returns the model's text. ``series`` maps the
+    metric keys in REPORT_METRICS to a text description of their trend
+    statistics (see trend_stats.describe_trend). Returns
+    ``(analyses, errors, timings)``: per-metric text, per-metric error message
+    for metrics that failed or timed out, and per-metric seconds plus the
+    overall wall-clock time under ``"total"``.
+    """
+    analyses, errors, timings = {}, {}, {}
+    started = time.perf_counter()
+
+    def run(key, label, unit):
+        t0 = time.perf_counter()
+        try:
+            return invoke(build_metric_prompt(profile_info, label, unit, series.get(key) or "No readings recorded.")).strip()
+        finally:
+            timings[key] = round(time.perf_counter() - t0, 3)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-metric")
+    try:
+        futures = {
+            executor.submit(run, key, label, unit): key
+            for key, label, unit in REPORT_METRICS
+        }
+        done, not_done = wait(futures, timeout=timeout)
+        for future in done:
+            key = futures[future]
+            try:
+                text = future.result()
+            except Exception as e:
+                errors[key] = str(e)
+                continue
+            if text:
+                analyses[key] = text
+            else:
+                errors[key] = "empty response"
+        for future in not_done:
+            future.cancel()
+            errors[futures[future]] = f"timed out after {timeout}s"
+    finally:
+        # Don't block the page on a hung request; it finishes in the background.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    timings["total"] = round(time.perf_counter() - started, 3)
+    return analyses, errors, timings
+
+
+def fallback_summary(analyses):
+    """Partial report built from whatever metric analyses succeeded."""
+    lines = ["### 🔍 Trend Overview"]
+    for key, label, _ in REPORT_METRICS:
+        lines.append(f"**{label}:** {analyses.get(key, 'Analysis unavailable.')}")
+    lines.append("### ⚠️ Important Notes")
+    lines.append("This summary is partial. Please consult a doctor for a complete review.")
+    return "\n\n".join(lines)
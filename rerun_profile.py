@@ -0,0 +1,190 @@
+# Rerun profiling
+#
+# Streamlit executes app.py top to bottom on every interaction. RerunProfile
+# splits one rerun into phases (CSS, navbar, section body, charts, PDF export,
+# footer, debug panel) and measures wall time and, optionally, allocations
+# (tracemalloc) for each. ProfileLog keeps per-phase distributions across
+# reruns, logs the slowest phases and warns when a rerun or phase goes over
+# its render budget.
+#
+# Profiling is opt-in: a disabled RerunProfile costs one attribute check per
+# phase. Fragment reruns (st.fragment) skip the rest of the script, so they
+# start a RerunProfile of their own once the one of the last full run is
+# finished.
+
+
+import logging
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+from llm_metrics import percentile
+
+
+logger = logging.getLogger("healthai.rerun")
+
+
+class _Phase:
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.started = time.perf_counter()
+        self.alloc_start = None
+        self.peak = 0
+
+
+class RerunProfile:
+    """Phase timings for a single script run.
+
+    Top-level phases follow each other (``lap``), nested phases (``phase``)
+    are counted inside their parent as well. Repeated phases with the same
+    name (e.g. several charts) are summed.
+    """
+
+    def __init__(self, enabled=False, trace_allocations=False):
+        self.enabled = enabled
+        self.trace_allocations = enabled and trace_allocations
+        self.started = time.perf_counter()
+        self.phases = {}  # name -> {"ms", "calls", "alloc_kb", "peak_kb", "depth"}
+        self._stack = []
+        self._lap = None
+        self.finished = False
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _open(self, name):
+        phase = _Phase(name, len(self._stack))
+        if self.trace_allocations:
+            phase.alloc_start = tracemalloc.get_traced_memory()[0]
+            if self._stack:
+                # Keep the parent's peak before the child resets it
+                parent = self._stack[-1]
+                parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append(phase)
+        return phase
+
+    def _close(self, phase):
+        elapsed = (time.perf_counter() - phase.started) * 1000
+        self._stack.remove(phase)
+        entry = self.phases.setdefault(phase.name, {"ms": 0.0, "calls": 0, "depth": phase.depth})
+        entry["ms"] += elapsed
+        entry["calls"] += 1
+        if self.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, phase.peak)
+            entry["alloc_kb"] = entry.get("alloc_kb", 0.0) + (current - phase.alloc_start) / 1024
+            entry["peak_kb"] = max(entry.get("peak_kb", 0.0), (peak - phase.alloc_start) / 1024)
+            if self._stack:
+                self._stack[-1].peak = max(self._stack[-1].peak, peak)
+
+    def lap(self, name):
+        """End the current top-level phase and start ``name``."""
+        if not self.enabled:
+            return
+        if self._lap is not None:
+            self._close(self._lap)
+        self._lap = self._open(name)
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        phase = self._open(name)
+        try:
+            yield
+        finally:
+            self._close(phase)
+
+    def finish(self):
+        """Close open phases and return the rerun report (None when disabled)."""
+        self.finished = True
+        if not self.enabled:
+            return None
+        while self._stack:
+            self._close(self._stack[-1])
+        self._lap = None
+        phases = {name: dict(entry, ms=round(entry["ms"], 2)) for name, entry in self.phases.items()}
+        for entry in phases.values():
+            for key in ("alloc_kb", "peak_kb"):
+                if key in entry:
+                    entry[key] = round(entry[key], 1)
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "phases": phases,
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+
+class ProfileLog:
+    """Rerun reports from all sessions, checked against a render budget.
+
+    ``budget_ms`` applies to a whole rerun; ``phase_budgets_ms`` optionally
+    sets limits for individual phases (e.g. ``{"charts": 150}``).
+    """
+
+    def __init__(self, budget_ms=500, phase_budgets_ms=None, slowest=3, sample_size=512):
+        self.budget_ms = budget_ms
+        self.phase_budgets_ms = dict(phase_budgets_ms or {})
+        self.slowest = slowest
+        self._samples = {}  # phase -> deque of ms
+        self._totals = deque(maxlen=sample_size)
+        self._recent = deque(maxlen=20)
+        self.sample_size = sample_size
+        self.reruns = 0
+        self.over_budget = 0
+        self._lock = threading.Lock()
+
+    def check(self, report):
+        """Budget warnings for one rerun report."""
+        warnings = []
+        if self.budget_ms and report["total_ms"] > self.budget_ms:
+            top = max((p for p in report["phases"].items() if p[1]["depth"] == 0),
+                      key=lambda p: p[1]["ms"], default=None)
+            hint = f", mostly {top[0]} ({top[1]['ms']:.0f} ms)" if top else ""
+            warnings.append(f"Rerun took {report['total_ms']:.0f} ms (budget {self.budget_ms} ms){hint}")
+        for name, limit in self.phase_budgets_ms.items():
+            entry = report["phases"].get(name)
+            if entry and entry["ms"] > limit:
+                warnings.append(f"{name} took {entry['ms']:.0f} ms (budget {limit} ms)")
+        return warnings
+
+    def add(self, report, section=None):
+        """Record a finished rerun; returns its budget warnings."""
+        warnings = self.check(report)
+        slowest = sorted(report["phases"].items(), key=lambda p: p[1]["ms"], reverse=True)[:self.slowest]
+        with self._lock:
+            self.reruns += 1
+            self.over_budget += bool(warnings)
+            self._totals.append(report["total_ms"])
+            for name, entry in report["phases"].items():
+                self._samples.setdefault(name, deque(maxlen=self.sample_size)).append(entry["ms"])
+            self._recent.append(dict(report, section=section, warnings=warnings))
+        summary = ", ".join(f"{name} {entry['ms']:.1f} ms" for name, entry in slowest)
+        logger.info("rerun %s %.1f ms; slowest: %s", section or "-", report["total_ms"], summary)
+        for warning in warnings:
+            logger.warning("render budget exceeded (%s): %s", section or "-", warning)
+        return warnings
+
+    def stats(self):
+        with self._lock:
+            totals = sorted(self._totals)
+            phases = {name: sorted(samples) for name, samples in self._samples.items()}
+            recent = list(self._recent)[-5:]
+            reruns, over_budget = self.reruns, self.over_budget
+        return {
+            "reruns": reruns,
+            "over_budget": over_budget,
+            "budget_ms": self.budget_ms,
+            "total_ms": {"p50": percentile(totals, 50, 2), "p95": percentile(totals, 95, 2),
+                         "max": round(totals[-1], 2) if totals else None},
+            "phases_ms": {
+                name: {"p50": percentile(values, 50, 2), "p95": percentile(values, 95, 2),
+                       "max": round(values[-1], 2), "samples": len(values)}
+                for name, values in sorted(phases.items(), key=lambda p: -percentile(p[1], 95, 2))
+            },
+            "recent": recent,
+        }
@@ -0,0 +1,280 @@
+# Resilience for LLM calls
+#
+# Wraps provider calls with an overall deadline, retries transient failures
+# with exponential backoff and full jitter, and trips a circuit breaker after
+# sustained failures. While the circuit is open, calls fail immediately so the
+# app can serve templated fallback content instead of parking script threads
+# on a degraded provider. Health state is exposed for dashboards.
+
+
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class ServiceUnavailable(RuntimeError):
+    """The call failed for good (deadline, retries exhausted or circuit open)."""
+
+
+class CircuitOpen(ServiceUnavailable):
+    """The circuit breaker is open; the provider was not called."""
+
+
+class Fallback(str):
+    """Text served in place of a live model response (never cache it)."""
+
+
+_STATUS_RE = re.compile(r"\b(408|425|429|500|502|503|504)\b")
+_TRANSIENT_WORDS = ("timeout", "timed out", "temporarily", "connection", "reset by peer", "rate limit")
+
+
+def is_retryable(exc):
+    """Timeouts, connection problems, 429 and 5xx responses are worth retrying."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status in (408, 425, 429) or status >= 500
+    try:
+        import httpx
+        if isinstance(exc, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)):
+            return True
+    except ImportError:
+        pass
+    message = str(exc).lower()
+    return bool(_STATUS_RE.search(message)) or any(word in message for word in _TRANSIENT_WORDS)
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """Full-jitter exponential backoff for retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """closed -> open after ``failure_threshold`` consecutive failures;
+    open -> half_open after ``recovery_time`` seconds, where one trial call
+    decides between closed and open again."""
+
+    def __init__(self, failure_threshold=5, recovery_time=30):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.recovery_time:
+                self.state = "half_open"
+                self._trial_running = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_running = False
+
+    def release(self):
+        """The allowed call ended without telling us anything (e.g. rejected locally)."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """Deadline + retry + circuit breaker around blocking calls.
+
+    Attempts run on a small thread pool so the caller can stop waiting at the
+    deadline even if the underlying request hangs (the abandoned request still
+    finishes in the background, bounded by the HTTP client timeout). Attempts
+    still queued at the deadline are cancelled and never reach the provider.
+    Streams must deliver their first chunk within ``first_chunk_timeout`` and
+    finish within ``timeout``.
+    """
+
+    def __init__(self, timeout=45, max_attempts=3, base_delay=0.5, max_delay=8.0,
+                 failure_threshold=5, recovery_time=30, max_workers=16, passthrough=(),
+                 first_chunk_timeout=15):
+        self.timeout = timeout
+        self.first_chunk_timeout = first_chunk_timeout
+        # Local errors (e.g. rate limiting) that say nothing about provider health
+        self.passthrough = tuple(passthrough)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = CircuitBreaker(failure_threshold, recovery_time)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "successes": 0, "failures": 0, "retries": 0,
+                       "timeouts": 0, "short_circuited": 0, "fallbacks": 0}
+        self.last_error = None
+        self.last_success = None
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _fail(self, exc):
+        self.breaker.record_failure()
+        self._count("failures")
+        self.last_error = f"{type(exc).__name__}: {exc}"[:300]
+
+    def call(self, fn, timeout=None, fallback=None):
+        """Run ``fn()`` with retries until ``timeout`` seconds have passed.
+
+        On final failure returns ``fallback()`` when given, otherwise raises
+        ServiceUnavailable (CircuitOpen when the provider wasn't called).
+        """
+        self._count("calls")
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        def attempt_fn():
+            # Picked up from the pool queue after the caller gave up
+            if time.monotonic() >= deadline:
+                raise ServiceUnavailable(f"AI service did not respond within {timeout}s.")
+            return fn()
+
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self.breaker.allow():
+                self._count("short_circuited")
+                error = error or CircuitOpen("AI service is temporarily unavailable.")
+                break
+            future = self._executor.submit(attempt_fn)
+            # Wait separately: a TimeoutError raised by the provider is retryable,
+            # only the caller's deadline running out here is final
+            if not wait([future], timeout=remaining).done:
+                future.cancel()
+                self._count("timeouts")
+                error = ServiceUnavailable(f"AI service did not respond within {timeout}s.")
+                self._fail(error)
+                break
+            try:
+                result = future.result()
+            except self.passthrough:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                error = e
+                self._fail(e)
+                if not is_retryable(e):
+                    break
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                if attempt == self.max_attempts or time.monotonic() + delay >= deadline:
+                    break
+                self._count("retries")
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                self._count("successes")
+                self.last_success = time.time()
+                return result
+
+        if fallback is not None:
+            self._count("fallbacks")
+            return fallback()
+        if isinstance(error, ServiceUnavailable):
+            raise error
+        raise ServiceUnavailable(str(error) if error else "AI service is unavailable.") from error
+
+    def guard_stream(self, chunks, first_chunk_timeout=None, timeout=None):
+        """Pass a stream through the breaker: refused while open, outcome recorded.
+
+        Chunks are pulled on the pool so the deadlines hold even if the
+        provider stalls mid-stream. A stream the consumer abandons (closed
+        generator, st.rerun) leaves provider health unchanged.
+        """
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpen("AI service is temporarily unavailable.")
+        started = time.monotonic()
+        timeout = self.timeout if timeout is None else timeout
+        first_chunk_timeout = self.first_chunk_timeout if first_chunk_timeout is None else first_chunk_timeout
+        deadline = started + timeout
+        first_deadline = min(deadline, started + first_chunk_timeout)
+        iterator = iter(chunks)
+        end = object()
+        future = None
+        settled = False
+        try:
+            while True:
+                future = self._executor.submit(next, iterator, end)
+                waiting_for = first_deadline if first_deadline is not None else deadline
+                if not wait([future], timeout=max(0, waiting_for - time.monotonic())).done:
+                    future.cancel()
+                    self._count("timeouts")
+                    what = "start" if first_deadline is not None else "finish"
+                    limit = first_chunk_timeout if first_deadline is not None else timeout
+                    raise ServiceUnavailable(f"AI service did not {what} streaming within {limit}s.")
+                chunk = future.result()
+                if chunk is end:
+                    break
+                first_deadline = None
+                yield chunk
+        except self.passthrough:
+            raise
+        except Exception as e:
+            settled = True
+            self._fail(e)
+            raise
+        else:
+            settled = True
+            self.breaker.record_success()
+            self._count("successes")
+            self.last_success = time.time()
+        finally:
+            if not settled:
+                # Abandoned or rejected locally: free a half-open trial slot
+                self.breaker.release()
+            self._close_later(iterator, future)
+
+    @staticmethod
+    def _close_later(iterator, future):
+        """Close the provider stream (freeing its gateway slot) once no pull is running."""
+        close = getattr(iterator, "close", None)
+        if close is None:
+            return
+        if future is None or future.done():
+            close()
+        else:
+            future.add_done_callback(lambda _: close())
+
+    def health(self):
+        """Snapshot for dashboards: 'healthy', 'degraded' (half open) or 'down' (open)."""
+        state = self.breaker.state
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(
+            status={"closed": "healthy", "half_open": "degraded", "open": "down"}[state],
+            circuit=state,
+            consecutive_failures=self.breaker.consecutive_failures,
+            trips=self.breaker.trips,
+            last_error=self.last_error,
+            last_success=self.last_success,
+        )
+        return stats
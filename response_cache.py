@@ -0,0 +1,259 @@
+# LLM response cache
+#
+# The symptom checker, treatment planner and disease-log advice build
+# deterministic prompts and decode greedily, so identical inputs give identical
+# answers. This cache keys responses on a normalized prompt fingerprint; only
+# exact matches are served by default.
+#
+# An optional semantic tier can also match near-duplicate free text, but only
+# with an embedding function injected by the caller (``embed_fn``). Similarity
+# is not meaning: embeddings routinely score "since 2 days" vs "since 9 days"
+# or "chest pain" vs "no chest pain" as near-identical, so a match can answer a
+# different medical question. Never enable it for the symptom checker or the
+# treatment planner, and only for call sites where a wrong near match is
+# harmless.
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt):
+    return _WHITESPACE.sub(" ", prompt).strip().lower()
+
+
+def fingerprint(*parts):
+    """Stable sha256 over the normalized, stringified parts."""
+    h = hashlib.sha256()
+    for part in parts:
+        text = part if isinstance(part, str) else repr(part)
+        h.update(normalize_prompt(text).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def cosine(a, b):
+    # Vectors are already L2-normalized
+    return sum(x * y for x, y in zip(a, b))
+
+
+# --------------------------
+# Backends
+# --------------------------
+
+class MemoryBackend:
+    """In-process LRU store with TTL; lost on restart."""
+
+    def __init__(self, max_entries=1000, ttl=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, created, scope, vector)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, scope=None, vector=None):
+        with self._lock:
+            self._entries[key] = (value, time.time(), scope, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def candidates(self, scope):
+        now = time.time()
+        with self._lock:
+            return [
+                (key, entry[3]) for key, entry in self._entries.items()
+                if entry[2] == scope and entry[3] is not None
+                and not (self.ttl and now - entry[1] > self.ttl)
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk LRU store with TTL that survives server restarts."""
+
+    def __init__(self, path, max_entries=10000, ttl=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                scope TEXT,
+                vector TEXT,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_scope ON responses (scope)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key, value, scope=None, vector=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, scope, vector, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, scope, json.dumps(vector) if vector is not None else None, now, now),
+            )
+            if self.ttl:
+                cur = self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                self.evictions += cur.rowcount
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                cur = self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                self.evictions += cur.rowcount
+            self._conn.commit()
+
+    def candidates(self, scope):
+        cutoff = time.time() - self.ttl if self.ttl else 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, vector FROM responses "
+                "WHERE scope = ? AND vector IS NOT NULL AND created >= ?",
+                (scope, cutoff),
+            ).fetchall()
+        return [(key, json.loads(vector)) for key, vector in rows]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+# --------------------------
+# Cache front-end
+# --------------------------
+
+class ResponseCache:
+    """Exact + (optional) semantic cache in front of LLM calls.
+
+    ``scope`` groups entries that may answer each other: everything in the
+    prompt except the free text (patient profile, section, model). Only
+    entries in the same scope are compared by similarity to ``text``.
+    The semantic tier is off unless both ``similarity_threshold`` and
+    ``embed_fn`` (text -> L2-normalized vector) are given; see the module
+    comment for where it must not be used.
+    """
+
+    def __init__(self, backend, similarity_threshold=None, embed_fn=None):
+        self.backend = backend
+        self.similarity_threshold = similarity_threshold
+        self.embed_fn = embed_fn
+        self.semantic = bool(similarity_threshold and embed_fn)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0}
+
+    def key_for(self, prompt, model_id, params):
+        return fingerprint(model_id, params, prompt)
+
+    def get(self, prompt, model_id, params, scope=None, text=None):
+        key = self.key_for(prompt, model_id, params)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        if self.semantic and scope is not None and text:
+            vector = self.embed_fn(text)
+            best_key, best_score = None, self.similarity_threshold
+            for cand_key, cand_vector in self.backend.candidates(fingerprint(scope)):
+                score = cosine(vector, cand_vector)
+                if score >= best_score:
+                    best_key, best_score = cand_key, score
+            if best_key is not None:
+                value = self.backend.get(best_key)
+                if value is not None:
+                    self._count("semantic_hits")
+                    return value
+
+        self._count("misses")
+        return None
+
+    def put(self, prompt, value, model_id, params, scope=None, text=None):
+        key = self.key_for(prompt, model_id, params)
+        semantic = self.semantic and scope is not None and text
+        self.backend.set(
+            key,
+            value,
+            scope=fingerprint(scope) if semantic else None,
+            vector=self.embed_fn(text) if semantic else None,
+        )
+        self._count("stores")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["semantic_hits"]) / lookups, 3) if lookups else 0.0
+        stats["entries"] = len(self.backend)
+        stats["evictions"] = self.backend.evictions
+        stats["backend"] = type(self.backend).__name__
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
@@ -0,0 +1,236 @@
+# Persistent per-user storage
+#
+# Profiles, metric readings, disease logs and chat messages are written to an
+# embedded SQLite database so they survive the browser session and don't have
+# to live in server RAM. Session state only keeps a recent working set that is
+# reloaded from here when a returning user opens the app.
+
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    user_id TEXT PRIMARY KEY,
+    profile TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metric_rows (
+    user_id TEXT NOT NULL,
+    row_no INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (user_id, row_no)
+);
+CREATE INDEX IF NOT EXISTS idx_metric_rows_user_date
+    ON metric_rows (user_id, date);
+CREATE TABLE IF NOT EXISTS metric_values (
+    user_id TEXT NOT NULL,
+    row_no INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (user_id, row_no, metric)
+);
+CREATE INDEX IF NOT EXISTS idx_metric_values_user_metric_date
+    ON metric_values (user_id, metric, date);
+CREATE TABLE IF NOT EXISTS disease_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    date TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_disease_logs_user_kind_date
+    ON disease_logs (user_id, kind, date);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_user ON messages (user_id, id);
+"""
+
+
+class HealthDatabase:
+    """SQLite-backed store for all per-user data.
+
+    Uses WAL mode so readers don't block the writer, and a bounded pool of
+    connections shared by all sessions in the process.
+    """
+
+    def __init__(self, path, pool_size=4, timeout=10):
+        self.path = path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._created = 0
+        self._create_lock = threading.Lock()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    # --------------------------
+    # Connection pool
+    # --------------------------
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; commits on success, rolls back on error."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._create_lock:
+                can_create = self._created < self.pool_size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._pool.get(timeout=self.timeout)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # --------------------------
+    # Profiles
+    # --------------------------
+
+    def save_profile(self, user_id, profile):
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO profiles (user_id, profile, updated) VALUES (?, ?, ?)",
+                (user_id, json.dumps(profile), time.time()),
+            )
+
+    def load_profile(self, user_id):
+        with self.connection() as conn:
+            row = conn.execute("SELECT profile FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_users(self):
+        """Ids of every user with a saved profile, in a stable order."""
+        with self.connection() as conn:
+            rows = conn.execute("SELECT user_id FROM profiles ORDER BY user_id").fetchall()
+        return [r[0] for r in rows]
+
+    def delete_user(self, user_id):
+        with self.connection() as conn:
+            for table in ("profiles", "metric_rows", "metric_values", "disease_logs", "messages"):
+                conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+    # --------------------------
+    # Metrics
+    # --------------------------
+
+    def add_metric_rows(self, user_id, dates, columns):
+        """Persist aligned metric rows in one transaction.
+
+        ``dates`` are 'YYYY-MM-DD' strings and ``columns`` maps metric name to
+        a sequence of values (None/NaN = not recorded, not stored).
+        """
+        if not len(dates):
+            return
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            (last,) = conn.execute(
+                "SELECT COALESCE(MAX(row_no), 0) FROM metric_rows WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            conn.executemany(
+                "INSERT INTO metric_rows (user_id, row_no, date) VALUES (?, ?, ?)",
+                [(user_id, last + i + 1, day) for i, day in enumerate(dates)],
+            )
+            conn.executemany(
+                "INSERT INTO metric_values (user_id, row_no, date, metric, value) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (user_id, last + i + 1, dates[i], metric, float(value))
+                    for metric, values in columns.items()
+                    for i, value in enumerate(values)
+                    if value is not None and value == value
+                ],
+            )
+
+    def load_metric_rows(self, user_id, since=None):
+        """Return ``(dates, columns)`` in insertion order, optionally from ``since`` on."""
+        where, params = "user_id = ?", [user_id]
+        if since:
+            where += " AND date >= ?"
+            params.append(since)
+        with self.connection() as conn:
+            rows = conn.execute(
+                f"SELECT row_no, date FROM metric_rows WHERE {where} ORDER BY row_no", params
+            ).fetchall()
+            values = conn.execute(
+                f"SELECT row_no, metric, value FROM metric_values WHERE {where}", params
+            ).fetchall()
+
+        position = {row_no: i for i, (row_no, _) in enumerate(rows)}
+        columns = {}
+        for row_no, metric, value in values:
+            column = columns.setdefault(metric, [None] * len(rows))
+            column[position[row_no]] = value
+        return [day for _, day in rows], columns
+
+    # --------------------------
+    # Disease logs
+    # --------------------------
+
+    def add_log_entry(self, user_id, kind, entry):
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT INTO disease_logs (user_id, kind, date, entry) VALUES (?, ?, ?, ?)",
+                (user_id, kind, entry.get("date", ""), json.dumps(entry)),
+            )
+
+    def load_log(self, user_id, kind, limit=500):
+        """Most recent ``limit`` entries of one log, oldest first."""
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT entry FROM disease_logs WHERE user_id = ? AND kind = ? ORDER BY id DESC LIMIT ?",
+                (user_id, kind, limit),
+            ).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
+
+    # --------------------------
+    # Chat messages
+    # --------------------------
+
+    def add_messages(self, user_id, messages):
+        now = time.time()
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT INTO messages (user_id, role, content, created) VALUES (?, ?, ?, ?)",
+                [(user_id, role, content, now) for role, content in messages],
+            )
+
+    def load_messages(self, user_id, limit=100):
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT role, content FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, limit),
+            ).fetchall()
+        return [(role, content) for role, content in reversed(rows)]
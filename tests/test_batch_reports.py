@@ -0,0 +1,58 @@
+import json
+import zipfile
+
+import pytest
+
+from batch_reports import ReportSink, jobs_from_csv, jobs_from_json, run_batch, safe_filename
+
+
+def test_safe_filename_keeps_sanitized_ids_apart():
+    assert safe_filename("patient-7") == "patient-7"
+    names = {safe_filename(i) for i in ("a b", "a_b", "a/b", "../")}
+    assert len(names) == 4
+    assert safe_filename("a b").startswith("a_b-")
+    assert safe_filename("../").startswith("patient-")
+
+
+def test_sink_rejects_names_that_collide_case_insensitively(tmp_path):
+    sink = ReportSink(str(tmp_path / "out"))
+    sink.write("Ann", b"%PDF-1")
+    with pytest.raises(ValueError):
+        sink.write("ann", b"%PDF-2")
+    sink.close()
+    assert (tmp_path / "out" / "Ann.pdf").read_bytes() == b"%PDF-1"
+
+
+def test_jobs_from_csv_groups_rows_by_patient(tmp_path):
+    path = tmp_path / "patients.csv"
+    path.write_text(
+        "patient_id,name,date,heart_rates\n"
+        "p1,Ann,2026-01-01,70\n"
+        "p1,Ann,2026-01-02,bad\n"
+        "p2,Bob,2026-01-01,80\n"
+    )
+    jobs = {job["id"]: job for job in jobs_from_csv(str(path))}
+    assert jobs["p1"]["profile"] == {"name": "Ann"}
+    assert jobs["p1"]["dates"] == ["2026-01-01", "2026-01-02"]
+    assert jobs["p1"]["columns"]["heart_rates"][0] == 70
+    assert len(jobs["p2"]["dates"]) == 1
+
+
+def test_run_batch_writes_a_zip_and_counts_failures(tmp_path):
+    patients = [
+        {"id": "p1", "profile": {"name": "Ann"},
+         "readings": [{"date": "2026-01-01", "heart_rates": 70}]},
+        {"id": "P1", "profile": {"name": "Clash"}},  # same file name as p1
+    ]
+    source = tmp_path / "patients.json"
+    source.write_text(json.dumps(patients))
+
+    out = tmp_path / "reports.zip"
+    stats = run_batch(jobs_from_json(str(source)), str(out), workers=1, measure_memory=True)
+    assert stats["reports"] == 1
+    assert stats["failed"] == 1
+    assert stats["peak_kb_max"] is not None
+    with zipfile.ZipFile(out) as archive:
+        names = archive.namelist()
+    assert len(names) == 1
+    assert names[0].lower() == "p1.pdf"
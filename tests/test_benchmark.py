@@ -0,0 +1,27 @@
+from benchmark import compare
+
+
+def baseline(**results):
+    return {"results": results}
+
+
+def test_compare_flags_regressions_beyond_tolerance_and_slack():
+    old = baseline(
+        sections={"chat": {"rerun_p50_ms": 100.0, "rerun_p95_ms": 10.0, "payload_kb_p50": 50.0}},
+        sessions_per_s=4.0,
+        memory_kb_per_session=1000.0,
+    )
+    current = {
+        "sections": {"chat": {"rerun_p50_ms": 125.0, "rerun_p95_ms": 14.0, "payload_kb_p50": 52.0}},
+        "sessions_per_s": 3.0,
+        "memory_kb_per_session": 1050.0,
+    }
+    assert compare(current, old, tolerance=0.1) == [
+        "chat.rerun_p50_ms: 100.0 -> 125.0",  # 25% slower
+        "sessions_per_s: 4.0 -> 3.0",         # throughput drop
+    ]  # p95 +4 ms is within the absolute slack, memory +5% within tolerance
+
+
+def test_compare_ignores_metrics_missing_on_either_side():
+    old = baseline(sections={"pdf": {"done_p50_ms": 100.0}}, startup={"import_ms_p50": 500.0})
+    assert compare({"sections": {}}, old, tolerance=0.1) == []
@@ -0,0 +1,54 @@
+import pandas as pd
+
+from bulk_ingest import ingest_bulk_metrics
+from metric_store import MetricStore
+
+
+def editor_frame(rows):
+    columns = ["Date", "Heart Rate (bpm)", "Blood Glucose (mg/dL)", "Peak Flow (L/min)", "HbA1c (%)"]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def test_valid_rows_are_added_in_one_batch():
+    store = MetricStore()
+    report = ingest_bulk_metrics(store, editor_frame([
+        ["2026-03-01", 72, 95, None, None],
+        ["2026-03-02", "80.7", None, 420.5, 5.9],
+    ]))
+    assert (report.added, report.skipped, len(report.rejected)) == (2, 0, 0)
+    assert store.version == 1
+    days, columns = store.rows_since(0)
+    assert days == ["2026-03-01", "2026-03-02"]
+    assert columns["heart_rates"] == [72.0, 80.0]  # whole numbers only
+    assert columns["peak_flow"] == [None, 420.5]
+
+
+def test_invalid_rows_are_reported_with_every_reason():
+    store = MetricStore()
+    report = ingest_bulk_metrics(store, editor_frame([
+        ["2026-03-01", 72, None, None, None],
+        ["not a date", 300, "abc", None, None],
+        ["2026-03-03", None, None, None, 20],
+    ]))
+    assert report.added == 1
+    assert list(report.rejected["Row"]) == [2, 3]
+    reasons = list(report.rejected["Reason"])
+    assert "missing or invalid date" in reasons[0]
+    assert "Heart Rate (bpm) outside 40–140" in reasons[0]
+    assert "Blood Glucose (mg/dL) is not a number" in reasons[0]
+    assert reasons[1] == "HbA1c (%) outside 4–12"
+    assert len(store) == 1
+
+
+def test_rows_without_readings_are_skipped():
+    store = MetricStore()
+    report = ingest_bulk_metrics(store, editor_frame([
+        ["2026-03-01", None, "", " ", None],
+        ["2026-03-02", 70, None, None, None],
+    ]))
+    assert (report.added, report.skipped, len(report.rejected)) == (1, 1, 0)
+
+
+def test_empty_editor():
+    report = ingest_bulk_metrics(MetricStore(), editor_frame([]))
+    assert (report.added, report.skipped, len(report.rejected)) == (0, 0, 0)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from charts import aggregation_level, lttb, prepare_series
+
+
+@pytest.mark.parametrize("n, threshold", [(10, 3), (100, 10), (1000, 450), (1001, 7)])
+def test_lttb_keeps_the_endpoints_and_threshold_points(n, threshold):
+    x = np.arange(n, dtype=np.float64)
+    y = np.sin(x / 7)
+    keep = lttb(x, y, threshold)
+    assert len(keep) == threshold
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert np.all(np.diff(keep) > 0)  # sorted, no duplicates
+
+
+def test_lttb_keeps_a_spike():
+    y = np.zeros(500)
+    y[317] = 100.0
+    keep = lttb(np.arange(500, dtype=np.float64), y, 20)
+    assert 317 in keep
+
+
+@pytest.mark.parametrize("threshold", [2, 10, 11])
+def test_lttb_returns_everything_when_it_cant_reduce(threshold):
+    assert list(lttb(np.arange(10.0), np.arange(10.0), threshold)) == list(range(10))
+
+
+def test_aggregation_level_follows_the_span():
+    days = lambda n: np.array(["2026-01-01", str(np.datetime64("2026-01-01") + n)], dtype="datetime64[D]")
+    assert aggregation_level(days(30)) == "raw"
+    assert aggregation_level(days(200)) == "daily"
+    assert aggregation_level(days(1000)) == "weekly"
+    assert aggregation_level(days(0)[:1]) == "raw"
+
+
+def test_prepare_series_drops_missing_sorts_and_downsamples():
+    dates = pd.date_range("2026-01-01", periods=2000, freq="h")
+    values = pd.array(np.arange(2000, dtype=float), dtype="Float64")
+    values[5] = pd.NA
+    shuffled = np.random.default_rng(0).permutation(2000)
+    out_dates, out_values, level = prepare_series(dates[shuffled], values[shuffled], width_px=200)
+    assert level == "raw"
+    assert len(out_dates) == 100
+    assert np.all(np.diff(out_dates.astype(np.int64)) > 0)
+    assert out_values[0] == 0 and out_values[-1] == 1999
+    assert 5.0 not in out_values
+
+
+def test_prepare_series_aggregates_long_ranges_by_week():
+    dates = pd.date_range("2020-01-01", periods=3 * 365, freq="D")
+    out_dates, out_values, level = prepare_series(dates, np.ones(len(dates)))
+    assert level == "weekly"
+    assert len(out_dates) <= 160
+    assert np.allclose(out_values, 1.0)
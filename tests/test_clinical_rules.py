@@ -0,0 +1,45 @@
+import pytest
+
+from clinical_rules import classify_asthma, classify_bp, classify_glucose
+
+
+@pytest.mark.parametrize("value, category, level", [
+    (40, "Very low (level 2 hypoglycemia)", "urgent"),
+    (54, "Low (hypoglycemia)", "abnormal"),
+    (70, "In range", "normal"),
+    (99.9, "In range", "normal"),
+    (100, "Above fasting target", "borderline"),
+    (199, "High", "abnormal"),
+    (250, "Very high", "abnormal"),
+    (300, "Dangerously high", "urgent"),
+])
+def test_glucose_bands(value, category, level):
+    assessment = classify_glucose(value)
+    assert (assessment.category, assessment.level) == (category, level)
+    assert assessment.needs_ai == (level != "normal")
+
+
+@pytest.mark.parametrize("systolic, diastolic, category", [
+    (115, 75, "Normal"),
+    (125, 75, "Elevated"),
+    (125, 85, "Stage 1 hypertension"),  # the higher category wins
+    (135, 70, "Stage 1 hypertension"),
+    (150, 85, "Stage 2 hypertension"),
+    (120, 95, "Stage 2 hypertension"),
+    (185, 100, "Hypertensive crisis"),
+    (130, 121, "Hypertensive crisis"),
+    (85, 70, "Low"),
+    (110, 55, "Low"),
+])
+def test_blood_pressure_categories(systolic, diastolic, category):
+    assert classify_bp(systolic, diastolic).category == category
+
+
+def test_asthma_tiers():
+    assert [classify_asthma(s).category for s in (1, 3, 4, 6, 7, 8, 9, 10, 12)] == [
+        "Mild", "Mild", "Moderate", "Moderate", "Severe", "Severe",
+        "Very severe", "Very severe", "Very severe",
+    ]
+    assessment = classify_asthma("9")
+    assert assessment.icon == "🔴"
+    assert assessment.to_dict()["kind"] == "asthma"
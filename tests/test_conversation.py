@@ -0,0 +1,119 @@
+import threading
+
+import pytest
+
+from conversation import ConversationManager, ConversationMemory, TokenCounter, estimate_tokens
+
+
+def summary_prompt(summary, turns):
+    return f"{summary}|" + ";".join(content for _, content in turns)
+
+
+@pytest.fixture
+def manager():
+    manager = ConversationManager(TokenCounter(), summary_prompt, budget=60,
+                                  max_turn_tokens=8, keep_recent=2, summarize_every=1)
+    yield manager
+    manager.close()
+
+
+def test_estimate_and_clip_without_a_tokenizer():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a, b, c") == 5  # punctuation counts as tokens
+    counter = TokenCounter()
+    assert not counter.exact
+    long_text = "word " * 100
+    assert counter.count(long_text) == 125  # 500 characters
+    clipped = counter.clip(long_text, 10)
+    assert clipped.endswith(" …")
+    assert len(clipped) <= 10 * 4 + 2
+
+
+def test_context_keeps_the_newest_turns_within_budget(manager):
+    messages = [("user", f"question number {i} " * 3) for i in range(20)]
+    summary, history, tokens = manager.build_context(ConversationMemory(), messages, "fixed")
+    assert summary == ""
+    assert tokens <= manager.budget
+    assert history.endswith(f"User: {manager.counter.clip(messages[-1][1], 8)}\n")
+    assert "question number 0 " not in history
+
+
+def test_refresh_folds_older_turns_into_the_summary(manager):
+    memory = ConversationMemory()
+    messages = [("user", "q1"), ("assistant", "a1"), ("user", "q2"), ("assistant", "a2")]
+    prompts = []
+
+    def summarize(prompt):
+        prompts.append(prompt)
+        return "S1"
+
+    assert manager.maybe_refresh(memory, messages, summarize)
+    memory.pending.result(5)
+    assert prompts == ["|q1;a1"]
+    assert (memory.summary, memory.summarized, memory.refreshes) == ("S1", 2, 1)
+    # not enough new messages since the last refresh
+    assert not manager.maybe_refresh(memory, messages, summarize)
+
+    summary, history, _ = manager.build_context(memory, messages)
+    assert summary == "S1"
+    assert history == "User: q2\nAssistant: a2\n"
+
+
+def test_failed_refresh_keeps_the_old_summary(manager):
+    memory = ConversationMemory()
+    messages = [("user", "q")] * 4
+
+    def summarize(prompt):
+        raise RuntimeError("down")
+
+    manager.maybe_refresh(memory, messages, summarize)
+    with pytest.raises(RuntimeError):
+        memory.pending.result(5)
+    assert (memory.summarized, memory.errors) == (0, 1)
+
+
+def test_trim_shifts_or_resets_the_summary(manager):
+    memory = ConversationMemory()
+    memory.summary, memory.summarized = "S", 4
+    messages = list(range(10))
+    assert manager.trim(memory, messages, 7) == 3
+    assert messages == list(range(3, 10))
+    assert memory.summarized == 1
+    assert manager.trim(memory, messages, 4) == 3
+    assert (memory.summary, memory.summarized) == ("", 0)
+
+
+def test_refresh_finishing_after_a_reset_is_dropped(manager):
+    memory = ConversationMemory()
+    messages = [("user", "chest pain")] * 10
+    started, release = threading.Event(), threading.Event()
+
+    def summarize(prompt):
+        started.set()
+        release.wait(5)
+        return "old summary about chest pain"
+
+    assert manager.maybe_refresh(memory, messages, summarize)
+    pending = memory.pending
+    started.wait(5)
+    memory.reset()  # "Delete everything" while the summary is being written
+    release.set()
+    pending.result(5)
+    assert (memory.summary, memory.summarized, memory.refreshes) == ("", 0, 0)
+
+    new_chat = [("user", "hello"), ("assistant", "hi")]
+    summary, history, _ = manager.build_context(memory, new_chat)
+    assert summary == ""
+    assert history == "User: hello\nAssistant: hi\n"
+
+
+def test_refresh_is_dropped_when_messages_were_cut_short(manager):
+    memory = ConversationMemory()
+    messages = [("user", "q")] * 10
+    release = threading.Event()
+    manager.maybe_refresh(memory, messages, lambda prompt: release.wait(5) and "S")
+    pending = memory.pending
+    del messages[2:]
+    release.set()
+    pending.result(5)
+    assert memory.summarized == 0
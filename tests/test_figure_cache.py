@@ -0,0 +1,28 @@
+from charts import FigureCache
+
+
+def test_builds_once_per_key():
+    cache = FigureCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return object()
+
+    first = cache.get_or_build(("uid", 1, "heart_rates"), build)
+    assert cache.get_or_build(("uid", 1, "heart_rates"), build) is first
+    # A new data version builds a new figure
+    assert cache.get_or_build(("uid", 2, "heart_rates"), build) is not first
+    assert len(builds) == 2
+    assert cache.stats() == {"hits": 1, "misses": 2, "evictions": 0, "entries": 2}
+
+
+def test_least_recently_used_figure_is_evicted():
+    cache = FigureCache(max_entries=2)
+    cache.get_or_build("a", lambda: "A")
+    cache.get_or_build("b", lambda: "B")
+    cache.get_or_build("a", lambda: "A2")  # a is now the most recent
+    cache.get_or_build("c", lambda: "C")
+    assert cache.get_or_build("a", lambda: "A3") == "A"
+    assert cache.get_or_build("b", lambda: "B2") == "B2"
+    assert cache.stats()["evictions"] == 2
@@ -0,0 +1,67 @@
+import uuid
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import app_test, local_script_runner
+
+import benchmark
+from benchmark import BenchSession, enable_fragment_runs
+from storage import HealthDatabase
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    # enable_fragment_runs swaps AppTest's script runner; restore it afterwards
+    monkeypatch.setattr(app_test, "LocalScriptRunner", local_script_runner.LocalScriptRunner)
+    enable_fragment_runs()
+    # The app's resources (database, queues) are per process; start fresh
+    st.cache_resource.clear()
+    db_path = str(tmp_path / "app.sqlite3")
+    user_id = uuid.uuid4().hex
+    HealthDatabase(db_path).save_profile(user_id, {"name": "Ann", "age": 40, "gender": "Female",
+                                                   "height": 170, "weight": 70, "bmi": 24.2})
+    secrets = {"LLM_BACKEND": "stub", "HEALTH_DB_PATH": db_path, "RESPONSE_CACHE_PATH": "memory",
+               "LLM_METRICS_PATH": "none"}
+    session = BenchSession(user_id, secrets, 0)
+    session.run()
+    session.navigate("diseases")
+    yield session
+    st.cache_resource.clear()
+
+
+def navbar_shown(session):
+    return any(button.key == "btn_chat" for button in session.at.button)
+
+
+def log_normal_glucose(session):
+    session.widget("number_input", key="glucose").set_value(90)
+    session.run(session.button(label="✅ Log Glucose Reading").click())
+    return session.button(label="🧠 Ask AI for detailed advice")
+
+
+def test_widget_in_a_section_reruns_only_its_fragment(session):
+    widget_id = session.widget("number_input", key="glucose").id
+    assert benchmark._fragments.owners[widget_id]  # rendered inside a fragment
+    session.widget("number_input", key="glucose").set_value(120)
+    _, _, ran_fragment = session.timed_rerun(widget_id, fragment=True)
+    assert ran_fragment
+    # Only the section was sent: the rest of the page (navbar) didn't run
+    assert not navbar_shown(session)
+    assert session.widget("number_input", key="glucose").value == 120
+
+
+def test_rerun_section_falls_back_to_a_full_rerun(session):
+    # In a full script run st.rerun(scope="fragment") would raise
+    ask = log_normal_glucose(session)
+    session.run(ask.click())
+    assert "advice_glucose" in session.at.session_state.jobs
+    assert navbar_shown(session)
+
+
+def test_rerun_section_reruns_the_fragment_it_was_called_from(session):
+    ask = log_normal_glucose(session)
+    ask.click()
+    _, _, ran_fragment = session.timed_rerun(ask.id, fragment=True)
+    assert ran_fragment
+    assert "advice_glucose" in session.at.session_state.jobs
+    assert not navbar_shown(session)
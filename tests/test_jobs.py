@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobQueue, MemoryBroker, SQLiteBroker
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def queue(request, tmp_path):
+    broker = MemoryBroker() if request.param == "memory" else SQLiteBroker(str(tmp_path / "jobs.sqlite3"))
+    queue = JobQueue(broker, max_workers=2, poll_interval=0.01)
+    yield queue
+    queue.close()
+
+
+def wait_done(queue, job_id, timeout=5):
+    deadline = time.perf_counter() + timeout
+    while True:
+        job = queue.get(job_id)
+        if not job.active:
+            return job
+        assert time.perf_counter() < deadline
+        time.sleep(0.005)
+
+
+def test_runs_jobs_and_reports_failures(queue):
+    queue.register("echo", lambda payload, progress: {"text": payload["text"].upper()})
+    queue.register("boom", lambda payload, progress: 1 / 0)
+    ok = wait_done(queue, queue.submit("echo", {"text": "hi"}, owner="u1"))
+    assert (ok.status, ok.result, ok.owner) == ("done", {"text": "HI"}, "u1")
+    failed = wait_done(queue, queue.submit("boom", {}))
+    assert failed.status == "failed"
+    assert failed.error.startswith("ZeroDivisionError")
+    with pytest.raises(KeyError):
+        queue.submit("missing", {})
+    stats = queue.stats()
+    assert (stats["completed"], stats["failed"]) == (1, 1)
+
+
+def test_progress_is_visible_while_running(queue):
+    release = threading.Event()
+
+    def task(payload, progress):
+        progress("partial")
+        release.wait(5)
+        return "final"
+
+    queue.register("slow", task)
+    job_id = queue.submit("slow", {})
+    deadline = time.perf_counter() + 5
+    while queue.progress(job_id) is None:
+        assert time.perf_counter() < deadline
+        time.sleep(0.005)
+    assert queue.progress(job_id) == "partial"
+    release.set()
+    assert wait_done(queue, job_id).result == "final"
+    assert queue.progress(job_id) is None
+
+
+def test_same_key_reuses_running_and_finished_jobs(queue):
+    calls = []
+    queue.register("echo", lambda payload, progress: calls.append(payload) or "ok")
+    first = queue.submit("echo", {"n": 1}, key="u1:report")
+    assert queue.submit("echo", {"n": 1}, key="u1:report") == first
+    wait_done(queue, first)
+    assert queue.submit("echo", {"n": 1}, key="u1:report") == first
+    assert calls == [{"n": 1}]
+    assert queue.stats()["deduplicated"] == 2
+
+
+def test_failed_and_unusable_results_are_not_reused(queue):
+    outcomes = iter([ValueError("down"), "fallback", "real answer"])
+
+    def task(payload, progress):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    queue.register("ask", task, reusable=lambda result: result != "fallback")
+    failed = queue.submit("ask", {}, key="k")
+    assert wait_done(queue, failed).status == "failed"
+    fallback = queue.submit("ask", {}, key="k")
+    assert fallback != failed
+    assert wait_done(queue, fallback).result == "fallback"
+    real = queue.submit("ask", {}, key="k")
+    assert real != fallback
+    assert wait_done(queue, real).result == "real answer"
+    assert queue.submit("ask", {}, key="k") == real
+
+
+def test_sqlite_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first = JobQueue(SQLiteBroker(path), max_workers=0)
+    first.register("echo", lambda payload, progress: payload)
+    job_id = first.submit("echo", {"a": 1})
+    first.close()
+
+    second = JobQueue(SQLiteBroker(path), max_workers=1, poll_interval=0.01)
+    second.register("echo", lambda payload, progress: payload)
+    try:
+        assert wait_done(second, job_id).result == {"a": 1}
+    finally:
+        second.close()
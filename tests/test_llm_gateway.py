@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+import llm_gateway
+from llm_gateway import LLMGateway, QueueTimeout, TokenBucket
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_gateway.time, "monotonic", clock.monotonic)
+    return clock
+
+
+class SlowLLM:
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def invoke(self, prompt):
+        self.calls += 1
+        self.release.wait(5)
+        return f"answer to {prompt}"
+
+    def stream(self, prompt):
+        yield "a"
+        yield "b"
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.001)
+
+
+def test_token_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.reserve() == 0
+    # a deadline that comes before the next token fails without sleeping
+    assert not bucket.acquire(clock.now + 0.1)
+    clock.now += 10
+    assert bucket.tokens <= bucket.capacity
+    assert bucket.acquire(clock.now)
+
+
+def test_identical_prompts_in_flight_share_one_call():
+    gateway = LLMGateway(max_concurrency=4)
+    llm = SlowLLM()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gateway.invoke(llm, "hi", "m")))
+               for _ in range(3)]
+    threads[0].start()
+    wait_for(lambda: gateway.stats()["in_flight"])
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: gateway.stats()["coalesced"] == 2)
+    llm.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["answer to hi"] * 3
+    assert llm.calls == 1
+    stats = gateway.stats()
+    assert (stats["requests"], stats["coalesced"], stats["in_flight"], stats["active"]) == (3, 2, 0, 0)
+
+
+def test_requests_over_the_user_rate_are_rejected():
+    gateway = LLMGateway(user_rate=0.001, user_burst=1)
+    llm = SlowLLM()
+    llm.release.set()
+    assert gateway.invoke(llm, "one", user="u1", timeout=0) == "answer to one"
+    with pytest.raises(QueueTimeout):
+        gateway.invoke(llm, "two", user="u1", timeout=0)
+    assert gateway.invoke(llm, "two", user="u2", timeout=0) == "answer to two"
+    stats = gateway.stats()
+    assert stats["rejected_user_rate"] == 1
+    assert stats["errors"] == 0
+
+
+def test_streams_hold_a_concurrency_slot_until_closed():
+    gateway = LLMGateway(max_concurrency=1)
+    llm = SlowLLM()
+    stream = gateway.stream(llm, "hi")
+    assert next(stream) == "a"
+    with pytest.raises(QueueTimeout):
+        gateway.invoke(llm, "other", timeout=0)
+    assert gateway.stats()["rejected_concurrency"] == 1
+    stream.close()
+    assert gateway.stats()["active"] == 0
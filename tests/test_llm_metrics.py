@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from llm_metrics import LLMMetrics, percentile
+
+
+def test_percentile_is_nearest_rank():
+    values = [0.12345, 0.2, 0.3, 0.4, 10.0]
+    assert percentile([], 50) is None
+    assert percentile(values, 0) == 0.1235
+    assert percentile(values, 0, digits=2) == 0.12
+    assert percentile(values, 50) == 0.3
+    assert percentile(values, 99) == 10.0
+
+
+def test_records_outcomes_tokens_and_percentiles():
+    metrics = LLMMetrics(count_tokens=lambda text: len(text.split()))
+    for latency in (0.1, 0.2, 0.3, 0.4, 10.0):
+        metrics.record("chat", latency, prompt="one two", completion="three")
+    metrics.record("chat", 1.0, "fallback", prompt="one two")
+    metrics.record_cache("chat", hit=True)
+    metrics.record_cache("chat", hit=False)
+    chat = metrics.snapshot()["sections"]["chat"]
+    assert (chat["calls"], chat["ok"], chat["fallback"]) == (6, 5, 1)
+    assert chat["error_rate"] == pytest.approx(1 / 6, abs=1e-4)
+    assert chat["latency_p50_s"] == 0.3
+    assert chat["latency_p99_s"] == 10.0
+    assert (chat["prompt_tokens"], chat["completion_tokens"]) == (12, 5)
+    assert chat["cache_hit_rate"] == 0.5
+
+
+def test_timed_and_track_stream():
+    metrics = LLMMetrics()
+    assert metrics.timed("symptoms", "p", lambda: "answer") == "answer"
+    with pytest.raises(ValueError):
+        metrics.timed("symptoms", "p", lambda: (_ for _ in ()).throw(ValueError("bad")))
+    assert list(metrics.track_stream("chat", "p", iter(["", "a", "b"]))) == ["", "a", "b"]
+    snapshot = metrics.snapshot()["sections"]
+    assert (snapshot["symptoms"]["ok"], snapshot["symptoms"]["error"]) == (1, 1)
+    assert snapshot["chat"]["streams"] == 1
+    assert snapshot["chat"]["ttft_p50_s"] is not None
+
+
+def test_prometheus_histogram_is_cumulative():
+    metrics = LLMMetrics()
+    metrics.record("chat", 0.05)
+    metrics.record("chat", 0.3)
+    metrics.record("chat", 100)
+    text = metrics.prometheus()
+    assert 'healthai_llm_latency_seconds_bucket{section="chat",le="0.1"} 1' in text
+    assert 'healthai_llm_latency_seconds_bucket{section="chat",le="0.5"} 2' in text
+    assert 'healthai_llm_latency_seconds_bucket{section="chat",le="+Inf"} 3' in text
+    assert 'healthai_llm_latency_seconds_count{section="chat"} 3' in text
+    assert 'healthai_llm_requests_total{section="chat",outcome="ok"} 3' in text
+
+
+def test_jsonl_is_rotated_by_size(tmp_path):
+    path = tmp_path / "logs" / "llm_metrics.jsonl"
+    metrics = LLMMetrics(str(path), max_bytes=600, backups=2)
+    for i in range(20):
+        metrics.record("chat", 0.1, prompt=f"prompt {i}")
+    files = sorted(p.name for p in path.parent.iterdir())
+    assert files == ["llm_metrics.jsonl", "llm_metrics.jsonl.1", "llm_metrics.jsonl.2"]
+    for p in path.parent.iterdir():
+        assert p.stat().st_size <= 600
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert events[-1]["section"] == "chat"
+    assert metrics.jsonl_errors == 0
+
+    # a new process picks up the size of the existing file
+    assert LLMMetrics(str(path), max_bytes=600)._jsonl_size == path.stat().st_size
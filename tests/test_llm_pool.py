@@ -0,0 +1,42 @@
+import sys
+import types
+
+from llm_pool import LLMClientPool, freeze_params
+
+
+def test_freeze_params_is_order_independent_and_hashable():
+    a = freeze_params({"max_new_tokens": 300, "stop_sequences": ["Human:"], "decoding_method": "greedy"})
+    b = freeze_params({"decoding_method": "greedy", "stop_sequences": ("Human:",), "max_new_tokens": 300})
+    assert a == b
+    assert hash(a) == hash(b)
+
+
+def test_get_reuses_one_client_per_model_and_params(monkeypatch):
+    created = []
+
+    class FakeWatsonxLLM:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+
+    monkeypatch.setitem(sys.modules, "langchain_ibm", types.SimpleNamespace(WatsonxLLM=FakeWatsonxLLM))
+    pool = LLMClientPool({"url": "https://example"}, "project")
+    api_client = object()
+    monkeypatch.setattr(pool, "_get_api_client", lambda: api_client)
+
+    first = pool.get("granite", {"max_new_tokens": 300})
+    assert pool.get("granite", {"max_new_tokens": 300}) is first
+    assert pool.get("granite", {"max_new_tokens": 100}) is not first
+    assert pool.get("other", {"max_new_tokens": 300}) is not first
+
+    assert len(created) == 3
+    assert all(kwargs["watsonx_client"] is api_client for kwargs in created)
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"], stats["clients"]) == (1, 3, 3)
+    assert stats["hit_rate"] == 0.25
+
+
+def test_close_drops_clients():
+    pool = LLMClientPool({}, "project")
+    pool._clients[("m", ())] = object()
+    pool.close()
+    assert pool.stats()["clients"] == 0
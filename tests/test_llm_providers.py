@@ -0,0 +1,76 @@
+import pytest
+
+from llm_providers import (
+    LlamaCppProvider, ProviderRegistry, Recorder, StubProvider, backend_model_id,
+)
+
+
+def test_backend_model_ids_are_distinct_per_backend():
+    assert backend_model_id("watsonx", "ibm/granite") == "ibm/granite"
+    assert backend_model_id("stub", "ibm/granite") == "stub/ibm/granite"
+    assert backend_model_id("local", "ibm/granite", "/models/granite-q4.gguf") == "local/granite-q4.gguf"
+    with pytest.raises(ValueError):
+        backend_model_id("openai", "gpt")
+
+
+def test_registry_creates_backends_on_first_use():
+    created = []
+
+    def make_stub():
+        created.append("stub")
+        return StubProvider()
+
+    registry = ProviderRegistry({"stub": make_stub, "local": lambda: 1 / 0})
+    assert created == []
+    first = registry.get("stub", "m", {})
+    registry.get("stub", "m", {})
+    assert created == ["stub"]
+    assert first.invoke("hi") == first.invoke("hi")
+    assert registry.stats()["stub"]["requests"] == 2
+    with pytest.raises(ValueError):
+        registry.get("openai", "m", {})
+
+
+class FakeLlama:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt, stream, **options):
+        self.calls.append(options)
+        for text in ("Hel", "", "lo"):
+            yield {"choices": [{"text": text}]}
+
+
+def test_llama_cpp_client_maps_watsonx_params():
+    provider = LlamaCppProvider("/models/granite.gguf")
+    provider._model = FakeLlama()  # skip loading llama.cpp
+    greedy = provider.get("m", {"decoding_method": "greedy", "max_new_tokens": 50})
+    assert provider.get("m", {"max_new_tokens": 50, "decoding_method": "greedy"}) is greedy
+    assert greedy.invoke("prompt") == "Hello"
+    sampled = provider.get("m", {"decoding_method": "sample", "temperature": 0.3,
+                                 "stop_sequences": ["\n\n"]})
+    assert list(sampled.stream("prompt")) == ["Hel", "lo"]
+    greedy_options, sampled_options = provider._model.calls
+    assert greedy_options == {"max_tokens": 50, "stop": None, "temperature": 0.0, "top_k": 1}
+    assert sampled_options == {"max_tokens": 300, "stop": ["\n\n"], "temperature": 0.3}
+    assert provider.stats()["requests"] == 2
+
+
+def test_recorded_responses_replay_through_the_stub(tmp_path):
+    path = str(tmp_path / "rec" / "recording.jsonl")
+    recorder = Recorder(path)
+    live = ProviderRegistry({"watsonx": lambda: StubProvider(latency=0)}, recorder=recorder)
+    llm = live.get("watsonx", "ibm/granite", {})
+    answer = llm.invoke("What is HbA1c?")
+    streamed = "".join(llm.stream("Is 120/80 normal?"))
+    abandoned = llm.stream("never finished")
+    next(abandoned)
+    abandoned.close()  # partial streams are not recorded
+    assert recorder.records == 2
+    assert live.stats()["recorded"]["records"] == 2
+
+    replay = StubProvider(replay_path=path).get("other-model", {})
+    assert replay.invoke("What is HbA1c?") == answer
+    assert "".join(replay.stream("Is 120/80 normal?")) == streamed
+    assert "other-model" in replay.invoke("never finished")
+    assert replay.provider.stats()["replayed"] == 2
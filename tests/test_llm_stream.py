@@ -0,0 +1,33 @@
+from llm_stream import TimedStream
+
+
+def test_skips_empty_chunks_and_keeps_the_text():
+    stream = TimedStream(iter(["", "Hello", "", " world"]), section="chat")
+    assert list(stream) == ["Hello", " world"]
+    assert stream.text == "Hello world"
+    assert stream.ttft is not None and stream.total >= stream.ttft
+
+
+def test_iter_text_yields_accumulated_text_and_ends_with_the_full_text():
+    stream = TimedStream(iter(["a", "b", "c"]))
+    updates = list(stream.iter_text(min_interval=0))
+    assert updates[0] == "a"
+    assert updates[-1] == "abc"
+    assert all(updates[i + 1].startswith(updates[i]) for i in range(len(updates) - 1))
+
+
+def test_iter_text_throttles_updates():
+    stream = TimedStream(iter(["x"] * 100))
+    updates = list(stream.iter_text(min_interval=60))
+    # The first chunk and the final text only
+    assert updates == ["x", "x" * 100]
+
+
+def test_timing_before_and_after_the_stream():
+    stream = TimedStream(iter(["hi"]), section="reports")
+    assert stream.timing()["ttft_s"] is None
+    list(stream)
+    timing = stream.timing()
+    assert timing["section"] == "reports"
+    assert timing["chars"] == 2
+    assert timing["total_s"] is not None
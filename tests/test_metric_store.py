@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from metric_store import EventLog, MetricStore
+
+
+def test_missing_readings_keep_columns_aligned():
+    store = MetricStore(capacity=1)  # forces the buffers to grow
+    store.append(datetime(2026, 1, 1), heart_rates=70, glucose_levels=90)
+    store.append("2026-01-02", peak_flow=410.5)
+    store.append("2026-01-03", heart_rates=72.0, glucose_levels=float("nan"))
+    assert len(store) == 3
+    assert store.version == 3
+    assert store.count("heart_rates") == 2
+    assert store.count("glucose_levels") == 1
+    assert store.recent("heart_rates", 5) == [70, 72]
+    frame = store.to_frame()
+    assert list(frame["peak_flow"].isna()) == [True, False, True]
+
+
+def test_latest_reading_has_the_date_of_its_own_row():
+    store = MetricStore()
+    store.append("2026-01-01", heart_rates=70, peak_flow=400, hba1c=5.6)
+    store.append("2026-02-01", heart_rates=0, glucose_levels=95)  # partial row
+    assert store.latest_reading("heart_rates") == ("2026-02-01", 0)
+    assert store.latest_reading("peak_flow") == ("2026-01-01", 400)
+    assert store.latest_reading("hba1c") == ("2026-01-01", 5.6)
+    store2 = MetricStore()
+    assert store2.latest_reading("hba1c") == (None, None)
+    assert store2.latest("hba1c") is None
+
+
+def test_extend_matches_append_and_rejects_bad_input():
+    store = MetricStore()
+    store.extend(["2026-01-01", "2026-01-02"], heart_rates=[70, None], glucose_levels=["88", "n/a"])
+    assert store.version == 1
+    days, columns = store.rows_since(0)
+    assert days == ["2026-01-01", "2026-01-02"]
+    assert columns["heart_rates"] == [70.0, None]
+    assert columns["glucose_levels"] == [88.0, None]
+    assert columns["hba1c"] == [None, None]
+    assert store.rows_since(1)[0] == ["2026-01-02"]
+    with pytest.raises(ValueError):
+        store.extend(["2026-01-03"], heart_rates=[1, 2])
+    with pytest.raises(KeyError):
+        store.append("2026-01-03", weight=80)
+
+
+def test_dates_view_is_read_only():
+    store = MetricStore()
+    store.append("2026-01-01", heart_rates=70)
+    with pytest.raises(ValueError):
+        store.dates[0] = np.datetime64("2020-01-01")
+
+
+def test_event_log_bumps_version_on_every_change():
+    log = EventLog([{"glucose": 90}])
+    log.append({"glucose": 100})
+    log.extend([{"glucose": 110}])
+    del log[0]
+    assert log.version == 3
+    assert [e["glucose"] for e in log] == [100, 110]
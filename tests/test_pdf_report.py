@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from metric_store import MetricStore
+from pdf_report import PDFExporter, pdf_text, render_report, report_record, summary_hash
+
+
+def test_pdf_text_maps_symbols_and_drops_emoji():
+    assert pdf_text("• up ↑ – ok 🎉 ") == "- up up - ok"
+
+
+def test_report_record_and_render():
+    store = MetricStore()
+    store.append("2026-01-01", heart_rates=70, peak_flow=400)
+    store.append("2026-01-02", heart_rates=74)
+    record = report_record({"name": "Ana", "age": ""}, store, ai_summary="## Fine • overall")
+    assert record["latest"]["heart_rates"] == ("2026-01-02", 74)
+    assert record["latest"]["hba1c"] == (None, None)
+    assert set(record["trends"]) == {"heart_rates", "peak_flow"}
+    data = render_report(record)
+    assert data.startswith(b"%PDF")
+
+
+def test_summary_hash_is_stable_and_short():
+    assert summary_hash(None) == summary_hash("")
+    assert len(summary_hash("text")) == 16
+    assert summary_hash("a") != summary_hash("b")
+
+
+def test_exporter_builds_each_key_once_and_retries_failures():
+    calls = []
+    gate = threading.Event()
+
+    def render(record):
+        gate.wait(5)
+        calls.append(record)
+        if record == "bad":
+            raise ValueError(record)
+        return b"pdf:" + record.encode()
+
+    exporter = PDFExporter(max_workers=1, max_entries=2, render=render)
+    try:
+        first = exporter.submit("k1", "one")
+        assert exporter.submit("k1", "one") is first
+        assert exporter.peek("k2") is None
+        gate.set()
+        assert first.result(5) == b"pdf:one"
+
+        failed = exporter.submit("k2", "bad")
+        with pytest.raises(ValueError):
+            failed.result(5)
+        retry = exporter.submit("k2", "bad")
+        assert retry is not failed
+
+        exporter.submit("k3", "three").result(5)
+        assert exporter.peek("k1") is None  # evicted, oldest first
+        stats = exporter.stats()
+        assert stats["builds"] == 4
+        assert stats["hits"] == 1
+        assert stats["failures"] >= 1
+        assert stats["evictions"] == 1
+    finally:
+        exporter.close()
@@ -0,0 +1,40 @@
+import pytest
+
+from prompts import PROMPTS, ProfileFragments, PromptRegistry, PromptTemplate
+
+
+def test_template_prefix_and_fields():
+    template = PromptTemplate("t", 1, "Intro text\n{a} and {b}, {a} again")
+    assert template.prefix == "Intro text\n"
+    assert template.fields == {"a", "b"}
+    assert template.render(a=1, b="x") == "Intro text\n1 and x, 1 again"
+    with pytest.raises(KeyError, match="missing field"):
+        template.render(a=1)
+    with pytest.raises(ValueError):
+        PromptTemplate("t", 1, "{value:.2f}")
+
+
+def test_registry_picks_latest_version_and_records_sizes():
+    registry = PromptRegistry(count_tokens=len)
+    registry.register("greet", 1, "Hello {who}")
+    registry.register("greet", 2, "Hi {who}!")
+    prompt = registry.render("greet", who="Ann")
+    assert prompt == "Hi Ann!"
+    assert (prompt.name, prompt.version, prompt.tokens) == ("greet", 2, 7)
+    assert registry.render("greet", version=1, who="Bo") == "Hello Bo"
+    registry.render("greet", who="Annabelle")
+    stats = registry.stats()
+    assert stats["greet@v2"]["renders"] == 2
+    assert stats["greet@v2"]["chars_max"] == 13
+    assert stats["greet@v2"]["chars_avg"] == 10.0
+    assert stats["greet@v1"]["prefix_chars"] == len("Hello ")
+
+
+def test_app_templates_render_with_profile_fragments():
+    fragments = ProfileFragments({"name": "Ann", "age": 30})
+    prompt = PROMPTS.render("symptoms", profile_basic=fragments["basic"], symptoms="cough")
+    assert "Name: Ann\nAge: 30\nGender: Unknown" in prompt
+    assert fragments["lines"] == "Name: Ann\nAge: 30"
+    assert fragments["json"] is fragments["json"]  # built once
+    assert fragments.matches({"name": "Ann", "age": 30})
+    assert not fragments.matches({"name": "Ann", "age": 31})
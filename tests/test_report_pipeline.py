@@ -0,0 +1,54 @@
+import threading
+import time
+
+from report_pipeline import REPORT_METRICS, analyze_metrics, build_synthesis_prompt, fallback_summary
+
+
+SERIES = {key: f"{label} trend" for key, label, _ in REPORT_METRICS}
+
+
+def label_in(prompt):
+    return next(label for _, label, _ in REPORT_METRICS if label in prompt)
+
+
+def test_one_request_per_metric_in_parallel():
+    barrier = threading.Barrier(len(REPORT_METRICS), timeout=5)
+
+    def invoke(prompt):
+        barrier.wait()  # only passes if all metric requests run at once
+        return f"  {label_in(prompt)} looks fine.  "
+
+    analyses, errors, timings = analyze_metrics(invoke, "Age 40", SERIES, max_workers=len(REPORT_METRICS))
+    assert errors == {}
+    assert analyses == {key: f"{label} looks fine." for key, label, _ in REPORT_METRICS}
+    assert set(timings) == {key for key, _, _ in REPORT_METRICS} | {"total"}
+
+
+def test_failures_empty_answers_and_timeouts_only_drop_their_metric():
+    def invoke(prompt):
+        label = label_in(prompt)
+        if label == "Heart Rate":
+            raise RuntimeError("503 Service Unavailable")
+        if label == "Peak Flow":
+            return "   "
+        if label == "HbA1c":
+            time.sleep(1)
+        return "ok"
+
+    analyses, errors, _ = analyze_metrics(invoke, "Age 40", SERIES, timeout=0.3)
+    assert analyses == {"glucose_levels": "ok"}
+    assert errors["heart_rates"] == "503 Service Unavailable"
+    assert errors["peak_flow"] == "empty response"
+    assert errors["hba1c"].startswith("timed out")
+
+
+def test_synthesis_uses_statistics_for_missing_analyses():
+    prompt = build_synthesis_prompt("Age 40", {"heart_rates": "Steady around 70 bpm."}, {"hba1c": None})
+    assert "Heart Rate analysis:\nSteady around 70 bpm." in prompt
+    assert "HbA1c (%) trend statistics: No readings recorded." in prompt
+
+
+def test_fallback_summary_marks_missing_metrics():
+    summary = fallback_summary({"glucose_levels": "Within range."})
+    assert "**Blood Glucose:** Within range." in summary
+    assert "**Heart Rate:** Analysis unavailable." in summary
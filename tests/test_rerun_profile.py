@@ -0,0 +1,63 @@
+import time
+import tracemalloc
+
+from rerun_profile import ProfileLog, RerunProfile
+
+
+def report(total_ms, **phases):
+    return {"total_ms": total_ms, "at": "2026-01-01 00:00:00",
+            "phases": {name: {"ms": ms, "calls": 1, "depth": 0} for name, ms in phases.items()}}
+
+
+def test_disabled_profile_records_nothing():
+    profile = RerunProfile()
+    profile.lap("css")
+    with profile.phase("charts"):
+        pass
+    assert profile.finish() is None
+    assert profile.finished
+    assert profile.phases == {}
+
+
+def test_laps_nested_and_repeated_phases():
+    profile = RerunProfile(enabled=True)
+    profile.lap("navbar")
+    profile.lap("section")
+    for _ in range(2):
+        with profile.phase("chart"):
+            time.sleep(0.005)
+    profile.lap("footer")
+    result = profile.finish()
+    phases = result["phases"]
+    assert list(phases) == ["navbar", "chart", "section", "footer"]
+    assert phases["chart"]["calls"] == 2
+    assert phases["chart"]["depth"] == 1
+    assert phases["section"]["depth"] == 0
+    assert phases["section"]["ms"] >= phases["chart"]["ms"] >= 10
+    assert result["total_ms"] >= phases["section"]["ms"]
+
+
+def test_allocation_tracing():
+    profile = RerunProfile(enabled=True, trace_allocations=True)
+    try:
+        with profile.phase("alloc"):
+            data = [bytes(1024) for _ in range(200)]
+        result = profile.finish()
+    finally:
+        tracemalloc.stop()
+    assert result["phases"]["alloc"]["peak_kb"] >= 200
+    assert data
+
+
+def test_log_checks_budgets_and_keeps_distributions(caplog):
+    log = ProfileLog(budget_ms=100, phase_budgets_ms={"charts": 30})
+    assert log.add(report(50, charts=20, css=5)) == []
+    warnings = log.add(report(150, charts=120, css=10), section="Reports")
+    assert warnings == ["Rerun took 150 ms (budget 100 ms), mostly charts (120 ms)",
+                        "charts took 120 ms (budget 30 ms)"]
+    assert "render budget exceeded (Reports)" in caplog.text
+    stats = log.stats()
+    assert (stats["reruns"], stats["over_budget"]) == (2, 1)
+    assert stats["total_ms"]["max"] == 150
+    assert list(stats["phases_ms"]) == ["charts", "css"]  # slowest first
+    assert stats["recent"][-1]["section"] == "Reports"
@@ -0,0 +1,222 @@
+import threading
+import time
+
+import pytest
+
+import resilience
+from resilience import (
+    CircuitBreaker, CircuitOpen, Fallback, ResilientCaller, ServiceUnavailable, is_retryable,
+)
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock.monotonic)
+    return clock
+
+
+@pytest.fixture
+def make_caller():
+    callers = []
+
+    def make(**kwargs):
+        kwargs.setdefault("base_delay", 0)
+        caller = ResilientCaller(**kwargs)
+        callers.append(caller)
+        return caller
+
+    yield make
+    for caller in callers:
+        caller._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Flaky:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_is_retryable():
+    assert is_retryable(TimeoutError())
+    assert is_retryable(ConnectionError())
+    assert is_retryable(RuntimeError("HTTP 503 Service Unavailable"))
+    assert not is_retryable(ValueError("invalid prompt"))
+    error = RuntimeError("bad request")
+    error.status_code = 400
+    assert not is_retryable(error)
+
+
+def test_breaker_state_machine(clock):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_time=30)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert (breaker.state, breaker.trips) == ("open", 1)
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()  # the one trial call
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_failure()  # trial failed: straight back to open
+    assert (breaker.state, breaker.trips) == ("open", 2)
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert (breaker.state, breaker.consecutive_failures) == ("closed", 0)
+
+
+def test_released_trial_lets_the_next_call_try(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=5)
+    breaker.record_failure()
+    clock.now += 5
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_retries_transient_errors_then_succeeds(make_caller):
+    caller = make_caller(max_attempts=3)
+    fn = Flaky(ConnectionError("reset"), TimeoutError(), "ok")
+    assert caller.call(fn) == "ok"
+    health = caller.health()
+    assert (fn.calls, health["retries"], health["failures"], health["successes"]) == (3, 2, 2, 1)
+    assert health["status"] == "healthy"
+
+
+def test_permanent_errors_are_not_retried(make_caller):
+    caller = make_caller(max_attempts=3)
+    fn = Flaky(ValueError("invalid prompt"), "unused")
+    with pytest.raises(ServiceUnavailable, match="invalid prompt"):
+        caller.call(fn)
+    assert fn.calls == 1
+    assert caller.call(Flaky(ValueError("x")), fallback=lambda: Fallback("canned")) == "canned"
+    assert caller.health()["fallbacks"] == 1
+
+
+def test_open_circuit_short_circuits(make_caller):
+    caller = make_caller(max_attempts=1, failure_threshold=1, recovery_time=60)
+    with pytest.raises(ServiceUnavailable):
+        caller.call(Flaky(ConnectionError("down")))
+    fn = Flaky("ok")
+    with pytest.raises(CircuitOpen):
+        caller.call(fn)
+    assert fn.calls == 0
+    assert caller.health()["status"] == "down"
+
+
+def test_passthrough_errors_do_not_count_against_the_provider(make_caller):
+    caller = make_caller(failure_threshold=1, passthrough=(KeyError,))
+    with pytest.raises(KeyError):
+        caller.call(Flaky(KeyError("rate limited")))
+    assert caller.breaker.state == "closed"
+    assert caller.health()["failures"] == 0
+
+
+def test_deadline_cancels_queued_attempts(make_caller):
+    caller = make_caller(max_workers=1, timeout=0.2)
+    release = threading.Event()
+    blocker = caller._executor.submit(release.wait, 5)  # occupies the only worker
+    fn = Flaky("late")
+    started = time.monotonic()
+    with pytest.raises(ServiceUnavailable, match="did not respond"):
+        caller.call(fn)
+    assert time.monotonic() - started < 1
+    release.set()
+    blocker.result(5)
+    caller._executor.submit(lambda: None).result(5)
+    assert fn.calls == 0  # the abandoned attempt never reached the provider
+    assert caller.health()["timeouts"] == 1
+
+
+def test_stream_success_and_failure_are_recorded(make_caller):
+    caller = make_caller(failure_threshold=1)
+    assert list(caller.guard_stream(iter(["a", "b"]))) == ["a", "b"]
+    assert caller.health()["successes"] == 1
+
+    def broken():
+        yield "a"
+        raise ConnectionError("dropped")
+
+    with pytest.raises(ConnectionError):
+        list(caller.guard_stream(broken()))
+    assert caller.breaker.state == "open"
+    with pytest.raises(CircuitOpen):
+        next(caller.guard_stream(iter(["a"])))
+
+
+def test_abandoned_stream_releases_the_trial_and_closes_the_source(make_caller, clock):
+    caller = make_caller(failure_threshold=1, recovery_time=5)
+    caller.breaker.record_failure()
+    clock.now += 5
+    closed = threading.Event()
+
+    def source():
+        try:
+            yield "a"
+            yield "b"
+        finally:
+            closed.set()
+
+    stream = caller.guard_stream(source(), first_chunk_timeout=5, timeout=5)
+    assert next(stream) == "a"
+    stream.close()
+    assert closed.wait(5)
+    assert caller.breaker.state == "half_open"
+    assert caller.breaker.allow()  # the trial slot is free again
+
+
+def test_stream_deadlines(make_caller):
+    caller = make_caller(failure_threshold=10)
+    release = threading.Event()
+
+    def stalls_before_first_chunk():
+        release.wait(5)
+        yield "late"
+
+    with pytest.raises(ServiceUnavailable, match="start streaming within 0.1s"):
+        list(caller.guard_stream(stalls_before_first_chunk(), first_chunk_timeout=0.1, timeout=5))
+    release.set()
+
+    def stalls_midway():
+        yield "a"
+        time.sleep(0.5)
+        yield "b"
+
+    chunks = []
+    with pytest.raises(ServiceUnavailable, match="finish streaming within 0.2s"):
+        for chunk in caller.guard_stream(stalls_midway(), first_chunk_timeout=5, timeout=0.2):
+            chunks.append(chunk)
+    assert chunks == ["a"]
+    assert caller.health()["timeouts"] == 2
+
+
+def test_provider_timeout_in_a_stream_is_not_reported_as_our_deadline(make_caller):
+    caller = make_caller()
+
+    def times_out():
+        raise TimeoutError("read timed out")
+        yield
+
+    with pytest.raises(TimeoutError, match="read timed out"):
+        list(caller.guard_stream(times_out()))
+    assert caller.health()["timeouts"] == 0
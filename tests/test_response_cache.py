@@ -0,0 +1,85 @@
+import pytest
+
+import response_cache
+from response_cache import MemoryBackend, ResponseCache, SQLiteBackend, fingerprint
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemoryBackend(**kwargs)
+        return SQLiteBackend(str(tmp_path / "cache.sqlite3"), **kwargs)
+    return make
+
+
+def test_fingerprint_ignores_case_and_whitespace():
+    assert fingerprint("m", "Chest  pain\n") == fingerprint("m", "chest pain")
+    assert fingerprint("m", "chest pain") != fingerprint("m", "no chest pain")
+
+
+def test_entries_expire_after_ttl(make_backend, clock):
+    backend = make_backend(ttl=60)
+    backend.set("k", "v")
+    clock.now += 59
+    assert backend.get("k") == "v"
+    clock.now += 2
+    assert backend.get("k") is None
+    assert backend.evictions == 1
+
+
+def test_least_recently_used_entry_is_evicted(make_backend, clock):
+    backend = make_backend(max_entries=2, ttl=None)
+    backend.set("a", "1")
+    clock.now += 1
+    backend.set("b", "2")
+    clock.now += 1
+    assert backend.get("a") == "1"  # a is now more recent than b
+    clock.now += 1
+    backend.set("c", "3")
+    assert backend.get("b") is None
+    assert backend.get("a") == "1"
+    assert backend.get("c") == "3"
+    assert len(backend) == 2
+    assert backend.evictions == 1
+
+
+def test_exact_prompt_hits_only_by_default():
+    cache = ResponseCache(MemoryBackend(), similarity_threshold=0.5)
+    cache.put("Symptoms: chest pain", "answer", "model", {"max_new_tokens": 300},
+              scope=("symptoms",), text="chest pain")
+    assert cache.get("symptoms:  CHEST PAIN", "model", {"max_new_tokens": 300}) == "answer"
+    # Without an injected embedding there is no near-match tier
+    assert not cache.semantic
+    assert cache.get("Symptoms: no chest pain", "model", {"max_new_tokens": 300},
+                     scope=("symptoms",), text="no chest pain") is None
+    # Model and params are part of the key
+    assert cache.get("Symptoms: chest pain", "other", {"max_new_tokens": 300}) is None
+    assert cache.get("Symptoms: chest pain", "model", {"max_new_tokens": 100}) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["semantic_hits"], stats["misses"]) == (1, 0, 3)
+
+
+def test_semantic_tier_needs_an_injected_embedding_and_stays_in_scope():
+    vectors = {"headache": [1.0, 0.0], "head ache": [0.96, 0.28], "rash": [0.0, 1.0]}
+    cache = ResponseCache(MemoryBackend(), similarity_threshold=0.9, embed_fn=vectors.__getitem__)
+    cache.put("p1", "answer", "m", {}, scope=("chat", "u1"), text="headache")
+    assert cache.get("p2", "m", {}, scope=("chat", "u1"), text="head ache") == "answer"
+    assert cache.get("p3", "m", {}, scope=("chat", "u1"), text="rash") is None
+    assert cache.get("p2", "m", {}, scope=("chat", "u2"), text="head ache") is None
+    assert cache.stats()["semantic_hits"] == 1
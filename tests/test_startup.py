@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+
+from benchmark import HEAVY_MODULES, parse_importtime
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_helper_modules_import_without_heavy_dependencies():
+    # Modules app.py imports at the top; the heavy ones must stay lazy
+    code = (
+        "import json, sys\n"
+        "import charts, llm_pool, metric_store, pdf_report, storage, trend_stats\n"
+        f"print(json.dumps([m for m in {list(HEAVY_MODULES)!r} if m in sys.modules]))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         check=True, cwd=ROOT)
+    assert json.loads(out.stdout) == []
+
+
+def test_parse_importtime_sums_self_time_per_package():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   numpy.core\n"
+        "import time:        30 |        150 | numpy\n"
+        "import time:        50 |         50 | json\n"
+        "unrelated warning\n"
+    )
+    total, packages = parse_importtime(stderr)
+    assert total == 200
+    assert packages == {"numpy": 150, "json": 50}
@@ -0,0 +1,64 @@
+import pytest
+
+from storage import HealthDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = HealthDatabase(str(tmp_path / "data" / "health.sqlite3"), pool_size=2)
+    yield db
+    db.close()
+
+
+def test_profiles_round_trip(db):
+    assert db.load_profile("u1") is None
+    db.save_profile("u1", {"name": "A", "age": 40})
+    db.save_profile("u1", {"name": "A", "age": 41})
+    db.save_profile("u0", {"name": "B"})
+    assert db.load_profile("u1") == {"name": "A", "age": 41}
+    assert db.list_users() == ["u0", "u1"]
+
+
+def test_metric_rows_keep_alignment_and_order(db):
+    db.add_metric_rows("u1", ["2026-01-01", "2026-01-02"],
+                       {"heart_rates": [70, None], "peak_flow": [float("nan"), 400]})
+    db.add_metric_rows("u1", ["2025-12-31"], {"heart_rates": [68]})
+    db.add_metric_rows("u2", ["2026-01-01"], {"heart_rates": [90]})
+    dates, columns = db.load_metric_rows("u1")
+    assert dates == ["2026-01-01", "2026-01-02", "2025-12-31"]  # insertion order
+    assert columns == {"heart_rates": [70.0, None, 68.0], "peak_flow": [None, 400.0, None]}
+    dates, columns = db.load_metric_rows("u1", since="2026-01-02")
+    assert dates == ["2026-01-02"]
+    assert columns == {"peak_flow": [400.0]}
+
+
+def test_logs_and_messages_return_the_most_recent_oldest_first(db):
+    for i in range(5):
+        db.add_log_entry("u1", "glucose", {"date": f"2026-01-0{i + 1}", "value": i})
+    db.add_log_entry("u1", "bp", {"date": "2026-01-01", "value": 120})
+    assert [e["value"] for e in db.load_log("u1", "glucose", limit=3)] == [2, 3, 4]
+    db.add_messages("u1", [("user", "hi"), ("assistant", "hello"), ("user", "thanks")])
+    assert db.load_messages("u1", limit=2) == [("assistant", "hello"), ("user", "thanks")]
+
+
+def test_delete_user_removes_only_that_user(db):
+    for user in ("u1", "u2"):
+        db.save_profile(user, {"name": user})
+        db.add_metric_rows(user, ["2026-01-01"], {"heart_rates": [70]})
+        db.add_log_entry(user, "bp", {"date": "2026-01-01"})
+        db.add_messages(user, [("user", "hi")])
+    db.delete_user("u1")
+    assert db.load_profile("u1") is None
+    assert db.load_metric_rows("u1") == ([], {})
+    assert db.load_log("u1", "bp") == []
+    assert db.load_messages("u1") == []
+    assert db.load_profile("u2") == {"name": "u2"}
+    assert db.load_metric_rows("u2")[0] == ["2026-01-01"]
+
+
+def test_failed_transaction_is_rolled_back(db):
+    with pytest.raises(RuntimeError):
+        with db.connection() as conn:
+            conn.execute("INSERT INTO profiles (user_id, profile, updated) VALUES ('u9', '{}', 0)")
+            raise RuntimeError("boom")
+    assert db.load_profile("u9") is None
@@ -0,0 +1,60 @@
+import os
+
+from theme import STATIC_DIR, HtmlFragment, ThemeAssets, minify_css
+
+
+CSS = """
+/* Card */
+.card > h2 {
+    color: #6a0dad;
+    margin: 0 0 8px 0;
+}
+
+a, b { font-weight:  bold; }
+"""
+
+
+def test_minify_css():
+    assert minify_css(CSS) == ".card>h2{color:#6a0dad;margin:0 0 8px 0}a,b{font-weight:bold}"
+
+
+def test_assets_link_to_a_versioned_copy(tmp_path):
+    (tmp_path / "theme.css").write_text(CSS)
+    assets = ThemeAssets(static_dir=str(tmp_path))
+    assert (tmp_path / "theme.min.css").read_text() == assets.css
+    assert assets.markup() == f'<link rel="stylesheet" href="app/static/theme.min.css?v={assets.version}">'
+    assert assets.markup(static_serving=False) == f"<style>{assets.css}</style>"
+    assert ThemeAssets(static_dir=str(tmp_path)).version == assets.version
+
+
+def test_assets_inline_when_the_copy_cannot_be_written(tmp_path):
+    (tmp_path / "theme.css").write_text(CSS)
+    os.mkdir(tmp_path / "theme.min.css")  # makes the write fail
+    assets = ThemeAssets(static_dir=str(tmp_path))
+    assert not assets.written
+    assert assets.markup().startswith("<style>")
+    assert assets.stats()["served_from"] == "inline"
+
+
+def test_shipped_theme_is_minified_and_up_to_date():
+    assets = ThemeAssets()
+    assert assets.written
+    with open(os.path.join(STATIC_DIR, "theme.min.css"), encoding="utf-8") as f:
+        assert f.read() == assets.css
+    assert assets.stats()["minified_bytes"] < assets.stats()["source_bytes"]
+
+
+def test_html_fragment_sends_one_element():
+    class Container:
+        def __init__(self):
+            self.calls = []
+
+        def markdown(self, body, unsafe_allow_html=False):
+            self.calls.append((body, unsafe_allow_html))
+
+    container = Container()
+    fragment = HtmlFragment("<b>a</b>").add("<i>b</i>")
+    assert len(fragment) == 2
+    fragment.render(container)
+    fragment.render(container)  # nothing left to send
+    assert container.calls == [("<b>a</b><i>b</i>", True)]
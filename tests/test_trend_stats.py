@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from trend_stats import MetricTrend, RollingWindow, TrendEngine, describe_trend
+
+
+def test_rolling_window_drops_readings_older_than_the_window():
+    window = RollingWindow(7)
+    for x, y in [(0, 10.0), (1, 1.0), (2, 4.0), (8, 7.0)]:
+        window.push(x, y)
+    # day 0 and day 1 fall out when day 8 arrives
+    assert window.n == 2
+    assert window.mean == pytest.approx(5.5)
+    summary = window.summary()
+    assert (summary["min"], summary["max"]) == (4.0, 7.0)
+    assert window.std == pytest.approx(np.std([4.0, 7.0], ddof=1))
+
+
+def test_slope_is_least_squares_change_per_day():
+    window = RollingWindow(30)
+    window.push(0, 100.0)
+    assert window.slope is None
+    for x in range(1, 10):
+        window.push(x, 100.0 + 2 * x)
+    assert window.slope == pytest.approx(2.0)
+
+
+def test_direction_and_anomaly():
+    trend = MetricTrend(windows=(7, 30))
+    for x in range(10):
+        trend.push(x, 100.0 + (x % 2))
+    assert trend.direction() == "Stable"
+    assert not trend.is_anomaly()
+    trend.push(10, 160.0)
+    assert trend.is_anomaly()
+    assert trend.summary()["anomalies"] == 1
+    assert trend.direction() == "Increasing"
+
+
+def _days(*dates):
+    return np.array(dates, dtype="datetime64[D]")
+
+
+def test_engine_sync_is_incremental_and_rebuilds_on_backfill():
+    engine = TrendEngine(["glucose_levels"], windows=(7,))
+    dates = _days("2026-01-02", "2026-01-03")
+    values = {"glucose_levels": np.array([90.0, np.nan])}
+    masks = {"glucose_levels": np.array([False, True])}
+    engine.sync(dates, values, masks)
+    assert engine.summary("glucose_levels")["count"] == 1
+
+    # a reading dated before the last one seen forces a rebuild, not a double count
+    dates = _days("2026-01-02", "2026-01-03", "2026-01-01")
+    values = {"glucose_levels": np.array([90.0, np.nan, 80.0])}
+    masks = {"glucose_levels": np.array([False, True, False])}
+    engine.sync(dates, values, masks)
+    summary = engine.summary("glucose_levels")
+    assert summary["count"] == 2
+    assert summary["latest"] == 90.0
+    assert engine.synced_rows == 3
+
+
+def test_describe_trend():
+    trend = MetricTrend(windows=(7,))
+    assert describe_trend(trend.summary()) == "No readings recorded."
+    trend.push(0, 90.0)
+    trend.push(1, 99.0)
+    text = describe_trend(trend.summary(), unit="mg/dL")
+    assert text.startswith("Latest 99 mg/dL (2 readings).")
+    assert "7-day: mean 94.5" in text
+    assert "Short-term trend: Increasing." in text
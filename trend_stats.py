@@ -0,0 +1,236 @@
+# Incremental trend statistics
+#
+# Keeps rolling aggregates per metric (mean, std, min/max, EWMA, least-squares
+# slope) over day-based windows, updated in O(1) amortized time per reading.
+# The Trend Analysis card, the PDF export and the AI summary prompt all read
+# these instead of rescanning the raw readings.
+
+
+import math
+from collections import deque
+
+import numpy as np
+
+
+TREND_WINDOWS = (7, 30, 90)
+ANOMALY_Z = 3.0
+ANOMALY_MIN_POINTS = 5
+# Change over the window smaller than this fraction of the mean counts as stable
+STABLE_FRACTION = 0.02
+
+
+class RollingWindow:
+    """Aggregates over the readings of the last ``days`` days."""
+
+    def __init__(self, days):
+        self.days = days
+        self.alpha = 2.0 / (days + 1)
+        self.points = deque()  # (x, value)
+        self.mins = deque()    # monotonic increasing values
+        self.maxs = deque()    # monotonic decreasing values
+        self.n = 0
+        self.sum_y = self.sum_yy = 0.0
+        self.sum_x = self.sum_xx = self.sum_xy = 0.0
+        self.ewma = None
+
+    def push(self, x, y):
+        cutoff = x - self.days
+        while self.points and self.points[0][0] <= cutoff:
+            old_x, old_y = self.points.popleft()
+            self._remove(old_x, old_y)
+        while self.mins and self.mins[0][0] <= cutoff:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] <= cutoff:
+            self.maxs.popleft()
+
+        self.points.append((x, y))
+        self.n += 1
+        self.sum_y += y
+        self.sum_yy += y * y
+        self.sum_x += x
+        self.sum_xx += x * x
+        self.sum_xy += x * y
+        while self.mins and self.mins[-1][1] >= y:
+            self.mins.pop()
+        self.mins.append((x, y))
+        while self.maxs and self.maxs[-1][1] <= y:
+            self.maxs.pop()
+        self.maxs.append((x, y))
+        self.ewma = y if self.ewma is None else self.alpha * y + (1 - self.alpha) * self.ewma
+
+    def _remove(self, x, y):
+        self.n -= 1
+        self.sum_y -= y
+        self.sum_yy -= y * y
+        self.sum_x -= x
+        self.sum_xx -= x * x
+        self.sum_xy -= x * y
+
+    @property
+    def mean(self):
+        return self.sum_y / self.n if self.n else None
+
+    @property
+    def std(self):
+        if self.n < 2:
+            return None
+        var = (self.sum_yy - self.sum_y * self.sum_y / self.n) / (self.n - 1)
+        return math.sqrt(max(var, 0.0))
+
+    @property
+    def slope(self):
+        """Least-squares change per day, or None with fewer than two distinct days."""
+        denom = self.n * self.sum_xx - self.sum_x * self.sum_x
+        if self.n < 2 or abs(denom) < 1e-9:
+            return None
+        return (self.n * self.sum_xy - self.sum_x * self.sum_y) / denom
+
+    def summary(self):
+        return {
+            "count": self.n,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.mins[0][1] if self.mins else None,
+            "max": self.maxs[0][1] if self.maxs else None,
+            "ewma": self.ewma,
+            "slope_per_day": self.slope,
+        }
+
+
+class MetricTrend:
+    """Rolling windows and anomaly tracking for one metric."""
+
+    def __init__(self, windows=TREND_WINDOWS, z_threshold=ANOMALY_Z):
+        self.z_threshold = z_threshold
+        self.windows = {days: RollingWindow(days) for days in windows}
+        self.baseline_days = max(windows)
+        self.latest = None
+        self.previous = None
+        self.latest_z = None
+        self.anomalies = 0
+        self.count = 0
+
+    def push(self, x, y):
+        # z-score of the new reading against the longest window *before* it
+        base = self.windows[self.baseline_days]
+        std = base.std
+        if base.n >= ANOMALY_MIN_POINTS and std:
+            self.latest_z = (y - base.mean) / std
+            if abs(self.latest_z) >= self.z_threshold:
+                self.anomalies += 1
+        else:
+            self.latest_z = None
+        for window in self.windows.values():
+            window.push(x, y)
+        self.previous, self.latest = self.latest, y
+        self.count += 1
+
+    def direction(self, days=None):
+        """'Increasing', 'Decreasing' or 'Stable' over the window (None if unknown)."""
+        window = self.windows[days or min(self.windows)]
+        slope, mean = window.slope, window.mean
+        if slope is None:
+            if self.previous is None:
+                return None
+            slope, mean, span = self.latest - self.previous, self.latest, 1
+        else:
+            span = window.days
+        if abs(slope * span) <= STABLE_FRACTION * abs(mean or 0):
+            return "Stable"
+        return "Increasing" if slope > 0 else "Decreasing"
+
+    def is_anomaly(self):
+        return self.latest_z is not None and abs(self.latest_z) >= self.z_threshold
+
+    def summary(self):
+        return {
+            "latest": self.latest,
+            "count": self.count,
+            "z_score": self.latest_z,
+            "anomaly": self.is_anomaly(),
+            "anomalies": self.anomalies,
+            "direction": self.direction(),
+            "windows": {days: w.summary() for days, w in self.windows.items()},
+        }
+
+
+class TrendEngine:
+    """Per-metric trends kept in sync with a MetricStore.
+
+    ``sync`` only processes rows appended since the last call, in date order.
+    If new rows are dated before rows already seen (e.g. a back-filled bulk
+    entry), the engine is rebuilt from the sorted columns once.
+    """
+
+    def __init__(self, metrics, windows=TREND_WINDOWS):
+        self.metrics = tuple(metrics)
+        self.windows = tuple(windows)
+        self._reset()
+
+    def _reset(self):
+        self.trends = {m: MetricTrend(self.windows) for m in self.metrics}
+        self.synced_rows = 0
+        self.last_x = None
+        self.anchor = None  # x is days since the first reading, to keep sums small
+
+    def sync(self, dates, values, masks):
+        """Feed rows ``synced_rows:`` of the store's columns.
+
+        ``dates`` is datetime64, ``values``/``masks`` map metric -> arrays.
+        """
+        n = len(dates)
+        if n < self.synced_rows:
+            self._reset()
+        if n == self.synced_rows:
+            return
+
+        days = dates.astype("datetime64[D]").astype(np.int64)
+        new_days = days[self.synced_rows:]
+        if self.last_x is not None and new_days.min() < self.last_x:
+            self._reset()
+            new_days = days
+        if self.anchor is None:
+            self.anchor = int(new_days.min())
+        start = n - len(new_days)
+        order = np.argsort(new_days, kind="stable") + start
+        xs = days - self.anchor
+
+        for m in self.metrics:
+            trend = self.trends[m]
+            present = order[~masks[m][order]]
+            for x, y in zip(xs[present].tolist(), values[m][present].tolist()):
+                trend.push(x, y)
+        self.last_x = int(days[order[-1]])
+        self.synced_rows = n
+
+    def summary(self, metric):
+        return self.trends[metric].summary()
+
+
+def _fmt(value, digits=1):
+    if value is None:
+        return "n/a"
+    value = round(value, digits)
+    return f"{value:g}"
+
+
+def describe_trend(summary, unit=""):
+    """One-paragraph, numbers-only description used in prompts and the PDF."""
+    if not summary["count"]:
+        return "No readings recorded."
+    unit = f" {unit}" if unit else ""
+    parts = [f"Latest {_fmt(summary['latest'])}{unit} ({summary['count']} readings)."]
+    for days, w in summary["windows"].items():
+        if not w["count"]:
+            continue
+        slope = w["slope_per_day"]
+        slope_text = f", slope {slope:+.2f}{unit}/day" if slope is not None else ""
+        parts.append(
+            f"{days}-day: mean {_fmt(w['mean'])}, EWMA {_fmt(w['ewma'])}, "
+            f"range {_fmt(w['min'])}-{_fmt(w['max'])}{slope_text}."
+        )
+    if summary["direction"]:
+        parts.append(f"Short-term trend: {summary['direction']}.")
+    if summary["anomaly"]:
+        parts.append(f"Latest reading is unusual (z-score {summary['z_score']:+.1f}).")
+    return " ".join(parts)